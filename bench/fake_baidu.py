@@ -0,0 +1,218 @@
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# =========================================================
+# 百度人脸接口本地模拟服务 (仅用于压测，不做任何人脸计算)
+# =========================================================
+# 实现接口:
+#   POST /oauth/2.0/token                        返回固定有效期的 access_token
+#   POST /rest/2.0/face/v3/faceset/user/add      注册人员 (action_type=REPLACE 时覆盖)
+#   POST /rest/2.0/face/v3/faceset/user/update   更新人员
+#   POST /rest/2.0/face/v3/search                按 match_rate 随机返回一个已注册人员
+#   POST /bench/users                            压测脚本预置人员 {"user_ids": [...]}
+#   GET  /bench/stats                            各接口调用次数
+# 可配置延迟 (latency ± jitter 毫秒)、随机错误率 (返回 282000) 和 QPS 上限 (超出返回 18)。
+
+FACE_PREFIX = '/rest/2.0/face/v3/'
+
+
+class FakeBaidu:
+    def __init__(self, host='127.0.0.1', port=8900, latency=80, jitter=30, error_rate=0.0, qps=0, match_rate=0.9):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.qps = qps
+        self.match_rate = match_rate
+        self.token = uuid.uuid4().hex
+        self.users = {}
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._window = (0, 0)  # (秒, 该秒内已接受的请求数)
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def config(self):
+        return {
+            'latency_ms': self.latency,
+            'jitter_ms': self.jitter,
+            'error_rate': self.error_rate,
+            'qps': self.qps,
+            'match_rate': self.match_rate,
+        }
+
+    # ---------------- 模拟行为 ----------------
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def _over_qps(self):
+        if not self.qps:
+            return False
+        second = int(time.time())
+        with self._lock:
+            current, count = self._window
+            if current != second:
+                current, count = second, 0
+            self._window = (current, count + 1)
+            return count >= self.qps
+
+    def _sleep(self):
+        delay = random.uniform(self.latency - self.jitter, self.latency + self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def handle(self, path, query, body):
+        """返回 (HTTP 状态码, JSON 对象)"""
+        if path == '/oauth/2.0/token':
+            self._count('token')
+            return 200, {'access_token': self.token, 'expires_in': 2592000}
+        if path == '/bench/users':
+            ids = body.get('user_ids', [])
+            with self._lock:
+                self.users.update(dict.fromkeys(ids, ''))
+            return 200, {'error_code': 0, 'count': len(self.users)}
+        if path == '/bench/stats':
+            with self._lock:
+                return 200, {'calls': dict(self.stats), 'users': len(self.users), 'config': self.config()}
+        if not path.startswith(FACE_PREFIX):
+            return 404, {'error_code': 3, 'error_msg': 'Unsupported openapi method'}
+
+        api = path[len(FACE_PREFIX):]
+        self._count(api)
+        if query.get('access_token', [''])[0] != self.token:
+            return 200, {'error_code': 110, 'error_msg': 'Access token invalid or no longer valid'}
+        if self._over_qps():
+            self._count('qps_limited')
+            return 200, {'error_code': 18, 'error_msg': 'Open api qps request limit reached'}
+        self._sleep()
+        if self.error_rate and random.random() < self.error_rate:
+            self._count('errors')
+            return 200, {'error_code': 282000, 'error_msg': 'internal error'}
+
+        if api == 'faceset/user/add':
+            user_id = body.get('user_id')
+            with self._lock:
+                if user_id in self.users and body.get('action_type') != 'REPLACE':
+                    return 200, {'error_code': 223105, 'error_msg': 'user is already exist'}
+                self.users[user_id] = body.get('user_info', '')
+            return 200, self._ok({'face_token': uuid.uuid4().hex})
+        if api == 'faceset/user/update':
+            user_id = body.get('user_id')
+            with self._lock:
+                if user_id not in self.users:
+                    return 200, {'error_code': 223103, 'error_msg': 'user is not exist'}
+                self.users[user_id] = body.get('user_info', '')
+            return 200, self._ok({'face_token': uuid.uuid4().hex})
+        if api == 'search':
+            with self._lock:
+                candidates = list(self.users) if self.users and random.random() < self.match_rate else None
+            if not candidates:
+                return 200, {'error_code': 222207, 'error_msg': 'match user is not found'}
+            user_id = random.choice(candidates)
+            return 200, self._ok({
+                'face_token': uuid.uuid4().hex,
+                'user_list': [{'group_id': body.get('group_id_list', ''), 'user_id': user_id, 'user_info': '', 'score': 92.5}],
+            })
+        return 200, {'error_code': 3, 'error_msg': 'Unsupported openapi method'}
+
+    @staticmethod
+    def _ok(result):
+        return {'error_code': 0, 'error_msg': 'SUCCESS', 'log_id': random.getrandbits(48), 'result': result}
+
+    # ---------------- 服务 ----------------
+    def start(self):
+        """在后台线程中启动 (压测脚本内嵌使用)"""
+        self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-baidu', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def serve_forever(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._server.serve_forever()
+
+
+def _handler_for(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 保持长连接，与真实百度接口一致
+
+        def _dispatch(self):
+            parsed = urlparse(self.path)
+            length = int(self.headers.get('Content-Length') or 0)
+            raw = self.rfile.read(length) if length else b''
+            try:
+                body = json.loads(raw) if raw and 'json' in (self.headers.get('Content-Type') or '') else {}
+            except ValueError:
+                body = {}
+            status, data = fake.handle(parsed.path, parse_qs(parsed.query), body)
+            payload = json.dumps(data).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = _dispatch
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def add_arguments(parser):
+    parser.add_argument('--fake-latency', type=float, default=80, help='模拟百度接口平均延迟(毫秒)')
+    parser.add_argument('--fake-jitter', type=float, default=30, help='延迟随机波动范围(毫秒)')
+    parser.add_argument('--fake-error-rate', type=float, default=0.0, help='随机返回服务端错误的比例 0~1')
+    parser.add_argument('--fake-qps', type=int, default=0, help='模拟账号 QPS 上限，0 为不限')
+    parser.add_argument('--fake-match-rate', type=float, default=0.9, help='搜索命中已注册人员的比例 0~1')
+
+
+def from_arguments(options, host='127.0.0.1', port=0):
+    return FakeBaidu(
+        host=host,
+        port=port,
+        latency=options.fake_latency,
+        jitter=options.fake_jitter,
+        error_rate=options.fake_error_rate,
+        qps=options.fake_qps,
+        match_rate=options.fake_match_rate,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='百度人脸接口本地模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    add_arguments(parser)
+    options = parser.parse_args()
+    fake = from_arguments(options, options.host, options.port)
+    print(f"fake baidu listening on {fake.url} {fake.config()}")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
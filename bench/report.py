@@ -0,0 +1,121 @@
+import argparse
+import json
+import sys
+
+# =========================================================
+# 压测结果汇总与基线对比
+# =========================================================
+# 结果文件结构:
+#   {"meta": {...}, "results": [{"scenario", "concurrency", "count", "errors", "statuses",
+#                               "elapsed", "throughput", "p50_ms", "p95_ms", "p99_ms", "max_ms"}, ...]}
+# 与基线对比时按 (scenario, concurrency) 匹配，吞吐下降或 p95/p99 上升超过容差即视为退化。
+
+
+def percentile(sorted_values, pct):
+    """线性插值百分位 (sorted_values 已升序)"""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * pct / 100
+    low = int(pos)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (pos - low)
+
+
+def summarize(scenario, concurrency, samples, elapsed, unit='req', units=None):
+    """
+    samples: [(耗时秒, 状态)]，状态为 'ok' 以外的计为错误
+    units: 吞吐量按处理量计算时传入 (如导入行数)，默认为样本数
+    """
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    statuses = {}
+    for _, status in samples:
+        statuses[status] = statuses.get(status, 0) + 1
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'count': len(samples),
+        'unit': unit,
+        'errors': len(samples) - statuses.get('ok', 0),
+        'statuses': statuses,
+        'elapsed': round(elapsed, 3),
+        'throughput': round((len(samples) if units is None else units) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def format_table(results):
+    header = f"{'scenario':<10}{'conc':>6}{'count':>8}{'errors':>8}{'throughput':>16}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    lines = [header, '-' * len(header)]
+    for r in results:
+        throughput = f"{r['throughput']:.1f} {r.get('unit', 'req')}/s"
+        lines.append(
+            f"{r['scenario']:<10}{r['concurrency']:>6}{r['count']:>8}{r['errors']:>8}{throughput:>16}"
+            f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['max_ms']:>10.1f}"
+        )
+    return '\n'.join(lines)
+
+
+def _change(new, old):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(current, baseline, tolerance=20.0):
+    """返回 (对比行, 是否存在退化)；tolerance 为允许的变化百分比"""
+    old = {(r['scenario'], r['concurrency']): r for r in baseline['results']}
+    rows, regressed = [], False
+    for r in current['results']:
+        base = old.get((r['scenario'], r['concurrency']))
+        if base is None:
+            continue
+        throughput = _change(r['throughput'], base['throughput'])
+        p95 = _change(r['p95_ms'], base['p95_ms'])
+        p99 = _change(r['p99_ms'], base['p99_ms'])
+        bad = throughput < -tolerance or p95 > tolerance or p99 > tolerance
+        regressed |= bad
+        rows.append({
+            'scenario': r['scenario'],
+            'concurrency': r['concurrency'],
+            'throughput_change': round(throughput, 1),
+            'p95_change': round(p95, 1),
+            'p99_change': round(p99, 1),
+            'regressed': bad,
+        })
+    return rows, regressed
+
+
+def format_comparison(rows, baseline_meta):
+    lines = [f"对比基线: commit {baseline_meta.get('commit', '?')} ({baseline_meta.get('time', '?')})"]
+    header = f"{'scenario':<10}{'conc':>6}{'throughput':>12}{'p95':>10}{'p99':>10}"
+    lines += [header, '-' * len(header)]
+    for row in rows:
+        lines.append(
+            f"{row['scenario']:<10}{row['concurrency']:>6}{row['throughput_change']:>+11.1f}%"
+            f"{row['p95_change']:>+9.1f}%{row['p99_change']:>+9.1f}%"
+            + ('  <-- 退化' if row['regressed'] else '')
+        )
+    return '\n'.join(lines)
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比两次压测结果')
+    parser.add_argument('current', help='本次结果 JSON')
+    parser.add_argument('--baseline', required=True, help='基线结果 JSON')
+    parser.add_argument('--tolerance', type=float, default=20.0, help='允许的变化百分比')
+    options = parser.parse_args()
+
+    current, baseline = load(options.current), load(options.baseline)
+    rows, regressed = compare(current, baseline, options.tolerance)
+    print(format_comparison(rows, baseline['meta']))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+from . import fake_baidu
+from .report import compare, format_comparison, format_table, load, summarize
+
+# =========================================================
+# 压测入口
+# =========================================================
+# python -m bench.run --scenarios search,import,sync --concurrency 1,4,16,32
+#   search  并发 POST /api/search/ (multipart 图片，每次内容不同，不命中结果缓存)
+#   import  并发上传 csv 到后台流式导入页面，按行数统计吞吐，延迟为上传到导入完成 (进程内模式同时启动导入消费线程)
+#   sync    批量入队人脸同步，按并发数启动消费线程 (与 run_face_worker 相同的处理流程)
+# 默认在进程内启动应用 (wsgiref 多线程) 和百度模拟服务；--target 指向已部署的服务时，
+# 需使用与其相同的数据库和 Redis (BENCH_DATABASE=mysql BENCH_REDIS=real)。
+
+BENCH_DIR = Path(__file__).resolve().parent
+ID_PREFIX = 'BENCH'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='人脸识别系统压测')
+    parser.add_argument('--scenarios', default='search,import,sync', help='压测场景，逗号分隔 (search, import, sync)')
+    parser.add_argument('--concurrency', default='1,4,16,32', help='并发梯度，逗号分隔')
+    parser.add_argument('--requests', type=int, default=300, help='search: 每个并发梯度的请求数')
+    parser.add_argument('--persons', type=int, default=1000, help='预置人员数 (search 命中、sync 同步对象)')
+    parser.add_argument('--import-rows', type=int, default=2000, help='import: 每个文件的行数')
+    parser.add_argument('--sync-jobs', type=int, default=300, help='sync: 每个并发梯度的同步任务数')
+    parser.add_argument('--target', default='', help='已部署服务地址，为空时在进程内启动')
+    parser.add_argument('--fake-url', default='', help='使用外部百度模拟服务，为空时在进程内启动')
+    parser.add_argument('--fake-host', default='127.0.0.1', help='内置模拟服务监听地址 (--target 为其他机器时改为 0.0.0.0)')
+    parser.add_argument('--fake-port', type=int, default=0, help='内置模拟服务端口，0 为随机')
+    fake_baidu.add_arguments(parser)
+    parser.add_argument('--keep-db', action='store_true', help='保留上次的 SQLite 数据库')
+    parser.add_argument('--output', default='', help='结果 JSON 路径，默认 bench/results/<commit>.json')
+    parser.add_argument('--baseline', default='', help='基线结果 JSON，给出时输出对比并在退化时返回非零')
+    parser.add_argument('--tolerance', type=float, default=20.0, help='允许的变化百分比')
+    return parser.parse_args()
+
+
+def _git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR, text=True).strip()
+        dirty = subprocess.call(['git', 'diff', '--quiet', 'HEAD'], cwd=BENCH_DIR)
+        return commit + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ---------------- 测试数据 ----------------
+def make_images(count=32):
+    """生成一组内容不同的 JPEG 照片"""
+    from PIL import Image, ImageDraw
+
+    images = []
+    for i in range(count):
+        rng = random.Random(i)
+        img = Image.new('RGB', (480, 640), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(img)
+        for _ in range(12):
+            x, y = rng.randrange(480), rng.randrange(640)
+            draw.ellipse((x, y, x + rng.randrange(40, 200), y + rng.randrange(40, 200)),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+def unique_image(images):
+    # JPEG 结束标记后追加随机字节：图片不变，但摘要不同，不会命中结果缓存
+    return random.choice(images) + os.urandom(8)
+
+
+def seed_persons(count, images):
+    """预置人员及照片文件 (bulk_create 不触发同步信号)"""
+    from django.conf import settings
+    from core.imaging import content_hash
+    from core.models import Person
+
+    Person.objects.filter(id_card__startswith=ID_PREFIX).delete()
+    faces = Path(settings.MEDIA_ROOT) / 'faces'
+    faces.mkdir(parents=True, exist_ok=True)
+    persons = []
+    for i in range(count):
+        id_card = f"{ID_PREFIX}{i:012d}"
+        data = images[i % len(images)]
+        (faces / f"{id_card}.jpg").write_bytes(data)
+        persons.append(Person(
+            name=f"压测{i}",
+            class_name=f"{i % 30}班",
+            user_type='学生',
+            id_card=id_card,
+            face_image=f"faces/{id_card}.jpg",
+            face_hash=content_hash(data),
+        ))
+    Person.objects.bulk_create(persons, batch_size=1000)
+    return [p.id_card for p in persons]
+
+
+def staff_session():
+    """创建压测管理员并返回其会话 cookie"""
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    user, _ = get_user_model().objects.get_or_create(
+        username='bench', defaults={'is_staff': True, 'is_superuser': True}
+    )
+    client = Client()
+    client.force_login(user)
+    return {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+
+
+# ---------------- 进程内应用 ----------------
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_app():
+    from django.core.wsgi import get_wsgi_application
+
+    server = make_server('127.0.0.1', 0, get_wsgi_application(),
+                         server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def _run_parallel(concurrency, worker):
+    """启动 concurrency 个线程执行 worker()，返回 (合并的样本, 墙钟耗时)"""
+    samples, lock = [], threading.Lock()
+
+    def run():
+        local = worker()
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(run) for _ in range(concurrency)]:
+            future.result()
+    return samples, time.perf_counter() - started
+
+
+# ---------------- 场景 ----------------
+def bench_search(base_url, cookies, images, concurrency, total):
+    url = f"{base_url}/api/search/"
+    remaining = iter(range(total))
+    counter_lock = threading.Lock()
+
+    def take():
+        with counter_lock:
+            return next(remaining, None) is not None
+
+    def worker():
+        session = requests.Session()
+        session.cookies.update(cookies)
+        local = []
+        while take():
+            files = {'image': ('frame.jpg', unique_image(images), 'image/jpeg')}
+            started = time.perf_counter()
+            try:
+                resp = session.post(url, files=files, timeout=30)
+                status = _search_status(resp)
+            except requests.RequestException:
+                status = 'exception'
+            local.append((time.perf_counter() - started, status))
+        return local
+
+    samples, elapsed = _run_parallel(concurrency, worker)
+    return summarize('search', concurrency, samples, elapsed)
+
+
+def _search_status(resp):
+    try:
+        status = resp.json().get('status')
+    except ValueError:
+        status = None
+    if resp.status_code == 200 and status in ('success', 'fail'):
+        return 'ok'  # 命中和未命中都是正常结果
+    return status or f"http_{resp.status_code}"
+
+
+def _start_import_consumer():
+    """进程内模式没有 run_face_worker，启动一个与其相同的导入消费线程，返回停止用的 Event"""
+    from django.db import close_old_connections, connection
+    from core.importers import import_queue, run_import_job
+
+    stop = threading.Event()
+
+    def consume():
+        while not stop.is_set():
+            keys = import_queue.claim(1)
+            if not keys:
+                stop.wait(0.05)
+                continue
+            close_old_connections()
+            run_import_job(keys[0])
+            import_queue.ack(keys[0])
+        connection.close()
+
+    threading.Thread(target=consume, name='bench-import', daemon=True).start()
+    return stop
+
+
+def bench_import(base_url, cookies, concurrency, rows, in_process=True):
+    from core.importers import get_import_job
+
+    url = f"{base_url}/admin/core/person/stream-import/"
+    files = iter(range(concurrency))
+    lock = threading.Lock()
+
+    def worker():
+        with lock:
+            index = next(files)
+        lines = ['姓名,班级,用户类型,身份证号']
+        lines += [f"导入{i},{i % 30}班,学生,I{concurrency:03d}{index:03d}{i:09d}" for i in range(rows)]
+        payload = ('\n'.join(lines) + '\n').encode('utf-8')
+
+        session = requests.Session()
+        session.cookies.update(cookies)
+        started = time.perf_counter()
+        try:
+            session.get(url, timeout=30)  # 取得 csrftoken
+            resp = session.post(
+                url,
+                files={'file': (f"bench_{concurrency}_{index}.csv", payload, 'text/csv')},
+                headers={'X-CSRFToken': session.cookies.get('csrftoken', ''), 'Referer': url},
+                allow_redirects=False,
+                timeout=60,
+            )
+            match = re.search(r'/stream-import/([0-9a-f]+)/', resp.headers.get('Location', ''))
+            if not match:
+                return [(time.perf_counter() - started, f"http_{resp.status_code}")]
+            while True:
+                job = get_import_job(match.group(1)) or {}
+                if job.get('status') not in ('queued', 'running'):
+                    break
+                time.sleep(0.05)
+            status = 'ok' if job.get('status') == 'done' and not job['stats']['failed'] else job.get('status', 'lost')
+        except requests.RequestException:
+            status = 'exception'
+        return [(time.perf_counter() - started, status)]
+
+    consumer = _start_import_consumer() if in_process else None
+    try:
+        samples, elapsed = _run_parallel(concurrency, worker)
+    finally:
+        if consumer:
+            consumer.set()
+    return summarize('import', concurrency, samples, elapsed, unit='rows', units=rows * concurrency)
+
+
+def bench_sync(id_cards, concurrency, jobs):
+    from django.db import close_old_connections, connection
+    from core.models import Person
+    from core.tasks import enqueue_face_sync, face_sync_queue, handle_face_sync
+
+    batch = id_cards[:jobs]
+    # 清除上次同步记录，使这批人员重新需要同步
+    Person.objects.filter(id_card__in=batch).update(synced_hash='', sync_status=Person.SYNC_PENDING)
+    enqueue_face_sync(batch)
+
+    def worker():
+        local = []
+        close_old_connections()
+        try:
+            while True:
+                keys = face_sync_queue.claim(1)
+                if not keys:
+                    break
+                started = time.perf_counter()
+                try:
+                    ok, _ = handle_face_sync(keys[0])
+                except Exception:
+                    ok = False
+                # 压测不重试失败任务，只计入错误
+                face_sync_queue.ack(keys[0])
+                local.append((time.perf_counter() - started, 'ok' if ok else 'failed'))
+        finally:
+            connection.close()
+        return local
+
+    samples, elapsed = _run_parallel(concurrency, worker)
+    return summarize('sync', concurrency, samples, elapsed, unit='jobs')
+
+
+# ---------------- 主流程 ----------------
+def main():
+    options = parse_args()
+    scenarios = [s.strip() for s in options.scenarios.split(',') if s.strip()]
+    levels = [int(c) for c in options.concurrency.split(',') if c.strip()]
+
+    fake = None
+    if options.fake_url:
+        fake_url = options.fake_url.rstrip('/')
+    else:
+        fake = fake_baidu.from_arguments(options, options.fake_host, options.fake_port).start()
+        fake_url = fake.url
+    os.environ['FACE_API_BASE_URL'] = fake_url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bench.settings')
+
+    if options.target and os.getenv('BENCH_REDIS', 'fake') == 'fake':
+        sys.exit("--target 模式下压测脚本需与被测服务共用 Redis，请设置 BENCH_REDIS=real")
+    if not options.keep_db and not options.target and os.getenv('BENCH_DATABASE', 'sqlite') == 'sqlite':
+        for path in (BENCH_DIR / 'data').glob('bench.sqlite3*'):
+            path.unlink()
+
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.management import call_command
+
+    call_command('migrate', verbosity=0, interactive=False)
+    images = make_images()
+    id_cards = seed_persons(options.persons, images)
+    requests.post(f"{fake_url}/bench/users", json={'user_ids': id_cards}, timeout=10)
+    cookies = staff_session()
+
+    server = None
+    if options.target:
+        base_url = options.target.rstrip('/')
+    else:
+        server, base_url = start_app()
+
+    results = []
+    try:
+        # 预热：建立连接、获取 access_token
+        requests.post(f"{base_url}/api/search/", cookies=cookies, timeout=30,
+                      files={'image': ('frame.jpg', unique_image(images), 'image/jpeg')})
+        for concurrency in levels:
+            for scenario in scenarios:
+                if scenario == 'search':
+                    result = bench_search(base_url, cookies, images, concurrency, options.requests)
+                elif scenario == 'import':
+                    result = bench_import(base_url, cookies, concurrency, options.import_rows, in_process=not options.target)
+                elif scenario == 'sync':
+                    result = bench_sync(id_cards, concurrency, options.sync_jobs)
+                else:
+                    sys.exit(f"未知场景: {scenario}")
+                results.append(result)
+                print(format_table([result]).splitlines()[-1], flush=True)
+    finally:
+        if server:
+            server.shutdown()
+        try:
+            fake_stats = requests.get(f"{fake_url}/bench/stats", timeout=10).json()
+        except (requests.RequestException, ValueError):
+            fake_stats = {}
+        if fake:
+            fake.stop()
+
+    commit = _git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+            'redis': os.getenv('BENCH_REDIS', 'fake'),
+            'target': options.target or 'in-process',
+            'fake_baidu': fake_stats,
+            'settings': {
+                'FACE_API_QPS': settings.FACE_API_QPS,
+                'FACE_SEARCH_BACKEND': settings.FACE_SEARCH_BACKEND,
+                'FACE_SEARCH_CACHE_MODE': settings.FACE_SEARCH_CACHE_MODE,
+            },
+            'options': vars(options),
+        },
+        'results': sorted(results, key=lambda r: (r['scenario'], r['concurrency'])),
+    }
+
+    output = Path(options.output) if options.output else BENCH_DIR / 'results' / f"{commit}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print()
+    print(format_table(report['results']))
+    print(f"\n结果已保存: {output}")
+
+    if options.baseline:
+        baseline = load(options.baseline)
+        rows, regressed = compare(report, baseline, options.tolerance)
+        print()
+        print(format_comparison(rows, baseline['meta']))
+        if regressed:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import os
+
+from config.settings import *  # noqa: F401,F403
+from config.settings import BASE_DIR, CACHES, DATABASES, str_to_bool
+
+# =========================================================
+# 压测专用配置 (python -m bench.run 默认使用)
+# =========================================================
+# 数据库: BENCH_DATABASE=sqlite (默认，每次压测重建) 或 mysql (使用 .env 中的 MySQL 连接，库名 BENCH_MYSQL_DATABASE)
+# Redis:  BENCH_REDIS=fake (默认，进程内 fakeredis，需要 pip install -r bench/requirements.txt) 或 real (REDIS_URL)
+# 百度接口指向本地模拟服务，由 bench.run 启动后写入 FACE_API_BASE_URL
+
+BENCH_ROOT = BASE_DIR / 'bench' / 'data'
+BENCH_ROOT.mkdir(parents=True, exist_ok=True)
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+
+BENCH_DATABASE = os.getenv('BENCH_DATABASE', 'sqlite')
+if BENCH_DATABASE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BENCH_ROOT / 'bench.sqlite3',
+            'OPTIONS': {
+                # 多线程并发写入时等待锁而不是直接报错
+                'timeout': 30,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
+        }
+    }
+else:
+    DATABASES['default']['NAME'] = os.getenv('BENCH_MYSQL_DATABASE', 'face_bench')
+
+BENCH_REDIS = os.getenv('BENCH_REDIS', 'fake')
+if BENCH_REDIS == 'fake':
+    import fakeredis
+
+    # 所有连接共用同一个内存实例，效果等同于单个 Redis 服务；
+    # Redis 计时连接池对内存实例没有意义，使用 django-redis 默认连接池
+    CACHES['default']['OPTIONS'].pop('CONNECTION_POOL_CLASS', None)
+    CACHES['default']['OPTIONS']['CONNECTION_POOL_KWARGS'] = {
+        'connection_class': fakeredis.FakeConnection,
+        'server': fakeredis.FakeServer(),
+    }
+
+MEDIA_ROOT = BENCH_ROOT / 'media'
+MEDIA_ROOT.mkdir(parents=True, exist_ok=True)
+LOG_ROOT = BENCH_ROOT / 'logs'
+FACE_INDEX_DIR = BENCH_ROOT / 'face_index'
+FACE_INDEX_EMBEDDER = os.getenv('FACE_INDEX_EMBEDDER', 'core.face_index.HashEmbedder')  # 压测图片为随机字节，用替身 embedder 即可
+
+FACE_API_BASE_URL = os.getenv('FACE_API_BASE_URL', 'http://127.0.0.1:8900').rstrip('/')
+FACE_API_KEY = 'bench'
+FACE_SECRET_KEY = 'bench'
+FACE_GROUP_ID = 'bench'
+FACE_API_QPS = float(os.getenv('FACE_API_QPS', 200))
+FACE_SEARCH_CACHE_MODE = os.getenv('FACE_SEARCH_CACHE_MODE', 'exact')
+FACE_SLOW_REQUEST_MS = int(os.getenv('FACE_SLOW_REQUEST_MS', 60000))  # 压测时不刷慢请求日志
+FACE_SERVER_TIMING = str_to_bool(os.getenv('FACE_SERVER_TIMING', 'True'))
+
+# 压测账号不受登录失败锁定影响
+AXES_ENABLED = False
@@ -46,21 +46,28 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     # 1. 修正 IP (必须在最前)
     'core.middleware.RealIPMiddleware',
+    # 请求ID/耗时，业务日志自动关联
+    'core.middleware.RequestContextMiddleware',
+    # 分阶段计时 (需在 Session 之前，才能计入会话保存的耗时)
+    'core.middleware.RequestTimingMiddleware',
     
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    # core.middleware 中的 Session/Auth/Auditlog/Message 为原中间件的子类，
+    # 设备接口 (FACE_DEVICE_API_PREFIX) 直接跳过，其余请求行为不变。
+    # Axes 中间件只在登录后端标记锁定时才处理响应，设备接口不会触发，保留原路径 (axes 系统检查按路径识别)
+    'core.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.AuthenticationMiddleware',
 
     # === 新增中间件 (位置很重要) ===
     # Axes 必须在 Auth 之后 (虽然主要靠 Backend，但中间件处理锁定页面)
     'axes.middleware.AxesMiddleware',
     # Auditlog 必须在 Auth 之后，以便获取 request.user
-    'auditlog.middleware.AuditlogMiddleware',
+    'core.middleware.AuditlogMiddleware',
     # =============================
 
-    'django.contrib.messages.middleware.MessageMiddleware',
+    'core.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     
     # 2. 导出操作审计 (记录到文件日志)
@@ -86,6 +93,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 # ===================== 数据库与缓存 =====================
 DATABASES = {
@@ -109,6 +117,8 @@ CACHES = {
         'LOCATION': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # 统计请求内 Redis 耗时 (Server-Timing 的 cache 阶段)
+            'CONNECTION_POOL_CLASS': 'core.timing.TimedConnectionPool',
         }
     }
 }
@@ -168,6 +178,9 @@ if not MEDIA_ROOT.exists():
 # =========== 初始化全局日志系统 ===========
 LOG_ROOT = BASE_DIR / 'logs'
 LOGS_DAYS = int(os.getenv('LOGS_DAYS', 180))
+# 业务日志写盘缓冲字节数：默认 1 按行写入，tail/query_business_log 可实时看到；
+# 调大可合并写入，但凑满缓冲前事件不落盘，进程被强制结束时会丢失
+BUSINESS_LOG_BUFFERING = int(os.getenv('BUSINESS_LOG_BUFFERING', 1))
 
 
 # ===================== Django原生日志 (降级为控制台输出) =====================
@@ -194,6 +207,132 @@ LOGOUT_REDIRECT_URL = '/admin/login/'
 FACE_API_KEY = os.getenv('FACE_API_KEY')
 FACE_SECRET_KEY = os.getenv('FACE_SECRET_KEY')
 FACE_GROUP_ID = os.getenv('FACE_GROUP_ID')
+FACE_API_QPS = float(os.getenv('FACE_API_QPS', 10))  # 百度账号 QPS 配额
+# 百度接口地址，压测时指向本地模拟服务 (bench/fake_baidu.py)
+FACE_API_BASE_URL = os.getenv('FACE_API_BASE_URL', 'https://aip.baidubce.com').rstrip('/')
+
+# ===================== 百度接口限流与熔断 =====================
+# 所有进程通过 Redis 令牌桶共享 FACE_API_QPS；实时识别优先，后台同步另受 FACE_API_BACKGROUND_QPS 限制，
+# 且不能占用为实时识别预留的令牌
+FACE_API_BURST = float(os.getenv('FACE_API_BURST', 0)) or None                      # 令牌桶容量，默认等于 QPS
+FACE_API_BACKGROUND_QPS = float(os.getenv('FACE_API_BACKGROUND_QPS', 0)) or None    # 默认为 QPS 的 60%
+FACE_API_SEARCH_RESERVE = float(os.getenv('FACE_API_SEARCH_RESERVE', 2))            # 为实时识别预留的令牌数
+FACE_API_SEARCH_MAX_WAIT = float(os.getenv('FACE_API_SEARCH_MAX_WAIT', 2))          # 实时识别最多排队秒数，超过返回"繁忙"
+FACE_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('FACE_CIRCUIT_FAILURE_THRESHOLD', 5))  # 连续失败次数达到后熔断
+FACE_CIRCUIT_COOLDOWN = int(os.getenv('FACE_CIRCUIT_COOLDOWN', 30))                  # 熔断冷却秒数，之后放行探测请求
+
+# access_token 共享存放在 Redis，剩余有效期不足 FACE_TOKEN_REFRESH_BEFORE 秒时提前刷新 (百度 token 有效期 30 天)
+FACE_TOKEN_REFRESH_BEFORE = int(os.getenv('FACE_TOKEN_REFRESH_BEFORE', 86400))
+FACE_TOKEN_CHECK_INTERVAL = int(os.getenv('FACE_TOKEN_CHECK_INTERVAL', 300))  # run_face_worker 检查间隔(秒)
+
+# ===================== 人脸搜索后端 =====================
+# baidu: 仅百度；local: 仅本地特征索引；local-then-baidu: 本地未命中时回退百度
+FACE_SEARCH_BACKEND = os.getenv('FACE_SEARCH_BACKEND', 'baidu')
+FACE_INDEX_DIR = BASE_DIR / 'face_index'                              # 内存映射索引文件目录 (与 media 同级)
+FACE_INDEX_EMBEDDER = os.getenv('FACE_INDEX_EMBEDDER', '')                   # 特征模型类路径，local 后端必填 (HashEmbedder 仅供测试)
+FACE_LOCAL_MIN_SCORE = float(os.getenv('FACE_LOCAL_MIN_SCORE', 80))   # 本地结果最低可信分数 (0~100)
+
+# ===================== 异步识别接口 =====================
+# 使用 uvicorn worker (ASGI) 部署时开启，/api/search/ 将使用异步视图
+FACE_SEARCH_ASYNC = str_to_bool(os.getenv('FACE_SEARCH_ASYNC', 'False'))
+
+# ===================== 识别图片上传限制 =====================
+# 扫描页在浏览器端先缩放、重新压缩为 JPEG 再上传；服务端按解码后的图片大小兜底校验
+FACE_UPLOAD_MAX_DIMENSION = int(os.getenv('FACE_UPLOAD_MAX_DIMENSION', 800))     # 长边最大像素
+FACE_UPLOAD_QUALITY = float(os.getenv('FACE_UPLOAD_QUALITY', 0.85))              # JPEG 质量 (0~1)
+FACE_SEARCH_MAX_BYTES = int(os.getenv('FACE_SEARCH_MAX_BYTES', 2 * 1024 * 1024))  # 单张图片上限(字节)
+
+# ===================== 扫描页连续识别 (闸机模式) =====================
+# 摄像头画面在浏览器端缩成灰度小图做帧差，变化面积达到人脸大小且画面稳定后才发送识别请求
+FACE_KIOSK_MAX_RPS = float(os.getenv('FACE_KIOSK_MAX_RPS', 2))                 # 每个终端每秒最多识别次数
+FACE_KIOSK_CHANGE_RATIO = float(os.getenv('FACE_KIOSK_CHANGE_RATIO', 0.06))    # 与上次发送的画面相比变化像素占比阈值
+FACE_KIOSK_PIXEL_DELTA = int(os.getenv('FACE_KIOSK_PIXEL_DELTA', 24))          # 灰度差超过该值才算变化 (过滤噪点/光线抖动)
+FACE_KIOSK_TIMEOUT_MS = int(os.getenv('FACE_KIOSK_TIMEOUT_MS', 4000))          # 单次识别超时，超时取消请求
+FACE_KIOSK_RESULT_HOLD_MS = int(os.getenv('FACE_KIOSK_RESULT_HOLD_MS', 3000))  # 识别结果保留显示时长
+
+# ===================== 人员照片标准化 =====================
+# 上传/下载的照片统一摆正、去除 EXIF、限制分辨率并重新压缩为 JPEG
+FACE_IMAGE_MAX_DIMENSION = int(os.getenv('FACE_IMAGE_MAX_DIMENSION', 1024))  # 长边最大像素
+FACE_IMAGE_QUALITY = int(os.getenv('FACE_IMAGE_QUALITY', 85))                # JPEG 质量 (1~95)
+# 后台缩略图尺寸 (长边像素)，small 用于列表页，large 用于详情页
+FACE_THUMBNAIL_SIZES = {
+    'small': 100,
+    'large': 400,
+}
+
+# ===================== 批量识别 (合影点名) =====================
+FACE_BATCH_MAX_IMAGES = int(os.getenv('FACE_BATCH_MAX_IMAGES', 50))    # 单次请求最多图片数
+FACE_BATCH_MAX_FACES = int(os.getenv('FACE_BATCH_MAX_FACES', 60))      # 单张合影最多识别人脸数
+FACE_BATCH_CONCURRENCY = int(os.getenv('FACE_BATCH_CONCURRENCY', 8))   # 并发搜索线程数 (进程内共享)
+FACE_BATCH_MAX_BYTES = int(os.getenv('FACE_BATCH_MAX_BYTES', 10 * 1024 * 1024))  # 单次请求图片总大小上限 (base64 解码在内存中进行，勿设过大)
+
+# ===================== 搜索结果缓存 =====================
+# exact: 按图片字节摘要缓存；phash: 额外按感知哈希识别近似重复图片；off: 关闭
+FACE_SEARCH_CACHE_MODE = os.getenv('FACE_SEARCH_CACHE_MODE', 'exact')
+FACE_SEARCH_CACHE_TTL = int(os.getenv('FACE_SEARCH_CACHE_TTL', 10))            # 缓存有效期(秒)
+FACE_SEARCH_PHASH_DISTANCE = int(os.getenv('FACE_SEARCH_PHASH_DISTANCE', 6))  # 近似模式允许的最大汉明距离 (0~64)
+PERSON_PROFILE_CACHE_TTL = int(os.getenv('PERSON_PROFILE_CACHE_TTL', 86400))  # 人员资料缓存有效期(秒)，由信号保持一致
+
+# ===================== HTTP 连接池配置 =====================
+# 百度接口与图片下载共用进程级连接池 (core/http_client.py)
+FACE_HTTP_POOL_CONNECTIONS = int(os.getenv('FACE_HTTP_POOL_CONNECTIONS', 4))   # 缓存的主机连接池数量
+FACE_HTTP_POOL_MAXSIZE = int(os.getenv('FACE_HTTP_POOL_MAXSIZE', 20))          # 每个主机最大保持连接数
+FACE_HTTP_RETRIES = int(os.getenv('FACE_HTTP_RETRIES', 2))                     # 连接失败/网关错误重试次数
+FACE_HTTP_BACKOFF = float(os.getenv('FACE_HTTP_BACKOFF', 0.3))                 # 重试退避系数(秒)
+# 各接口超时 (连接超时, 读取超时)
+FACE_HTTP_TIMEOUTS = {
+    'token': (3, 5),
+    'search': (3, 10),
+    'sync': (3, 10),
+    'download': (3, 10),
+}
+
+# ===================== 识别记录 =====================
+# 识别结果先写入 Redis 缓冲区，run_face_worker 定时批量插入 ScanEvent 并更新小时统计
+FACE_SCAN_FLUSH_INTERVAL = float(os.getenv('FACE_SCAN_FLUSH_INTERVAL', 2))        # 批量写入间隔(秒)
+FACE_SCAN_ROLLUP_INTERVAL = int(os.getenv('FACE_SCAN_ROLLUP_INTERVAL', 60))       # 小时统计刷新间隔(秒)
+FACE_SCAN_RETENTION_DAYS = int(os.getenv('FACE_SCAN_RETENTION_DAYS', 180))        # 明细保留天数 (purge_scan_events)
+FACE_SCAN_STATS_RETENTION_DAYS = int(os.getenv('FACE_SCAN_STATS_RETENTION_DAYS', 0))  # 小时统计保留天数，0 为永久
+
+# ===================== 监控指标 =====================
+# 请求分阶段计时：Server-Timing 响应头、慢请求日志、抽样 cProfile (保存到 logs/profiles/)
+FACE_SERVER_TIMING = str_to_bool(os.getenv('FACE_SERVER_TIMING', 'True'))
+FACE_SLOW_REQUEST_MS = int(os.getenv('FACE_SLOW_REQUEST_MS', 1000))
+FACE_PROFILE_SAMPLE_RATE = float(os.getenv('FACE_PROFILE_SAMPLE_RATE', 0))  # 0~1，0 为关闭
+FACE_PROFILE_MAX_FILES = int(os.getenv('FACE_PROFILE_MAX_FILES', 200))
+# /metrics 抓取凭证：Prometheus 配置 authorization.credentials 为此值 (留空则仅后台管理员可访问)
+FACE_METRICS_TOKEN = os.getenv('FACE_METRICS_TOKEN', '')
+
+# ===================== 后台任务队列配置 =====================
+# 人脸同步任务存放在 Redis (CACHES['default'])，由 `manage.py run_face_worker` 消费
+FACE_SYNC_MAX_ATTEMPTS = int(os.getenv('FACE_SYNC_MAX_ATTEMPTS', 5))     # 超过后进入死信
+FACE_SYNC_RETRY_BACKOFF = int(os.getenv('FACE_SYNC_RETRY_BACKOFF', 10))  # 首次重试间隔(秒)，之后指数递增
+
+# 源图片下载任务同样存放在 Redis，由 run_face_worker 消费
+FACE_DOWNLOAD_CONCURRENCY = int(os.getenv('FACE_DOWNLOAD_CONCURRENCY', 8))      # worker 并发下载数
+FACE_DOWNLOAD_PER_HOST = int(os.getenv('FACE_DOWNLOAD_PER_HOST', 4))            # 同一图片主机最大并发
+FACE_DOWNLOAD_MAX_PENDING = int(os.getenv('FACE_DOWNLOAD_MAX_PENDING', 20000))  # 积压上限，超过后批量导入等待
+FACE_DOWNLOAD_MAX_ATTEMPTS = int(os.getenv('FACE_DOWNLOAD_MAX_ATTEMPTS', 5))
+FACE_DOWNLOAD_RETRY_BACKOFF = int(os.getenv('FACE_DOWNLOAD_RETRY_BACKOFF', 30))
+FACE_DOWNLOAD_MAX_BYTES = int(os.getenv('FACE_DOWNLOAD_MAX_BYTES', 20 * 1024 * 1024))  # 单张源图片上限
+
+# 后台流式导入同样由 run_face_worker 执行，上传文件暂存在 web 与 worker 共享的 media 目录
+FACE_IMPORT_DIR = MEDIA_ROOT / 'imports'
+FACE_IMPORT_HEARTBEAT = int(os.getenv('FACE_IMPORT_HEARTBEAT', 15))          # 执行中心跳/续租间隔(秒)
+FACE_IMPORT_STALE_SECONDS = int(os.getenv('FACE_IMPORT_STALE_SECONDS', 300))  # 心跳超时后状态页标记为失败
+
+# ===================== 设备接口 =====================
+# 闸机/自助终端使用设备密钥调用 /api/device/search/ (后台"设备密钥"中创建)，不走会话和 CSRF
+FACE_DEVICE_API_PREFIX = '/api/device/'
+FACE_DEVICE_KEY_CACHE_TTL = int(os.getenv('FACE_DEVICE_KEY_CACHE_TTL', 60))            # 密钥校验结果缓存(秒)，停用后最长延迟生效时间
+FACE_DEVICE_TOUCH_INTERVAL = int(os.getenv('FACE_DEVICE_TOUCH_INTERVAL', 60))          # 最近使用时间写库间隔(秒)
+FACE_DEVICE_AUTH_MAX_FAILURES = int(os.getenv('FACE_DEVICE_AUTH_MAX_FAILURES', 20))    # 同一 IP 认证失败上限
+FACE_DEVICE_AUTH_LOCKOUT = int(os.getenv('FACE_DEVICE_AUTH_LOCKOUT', 300))             # 失败计数窗口/锁定时长(秒)
+
+# ===================== 后台列表性能 =====================
+FACE_ADMIN_COUNT_CACHE_TTL = int(os.getenv('FACE_ADMIN_COUNT_CACHE_TTL', 60))                # 分页总数缓存(秒)
+FACE_ADMIN_ESTIMATE_COUNT_ABOVE = int(os.getenv('FACE_ADMIN_ESTIMATE_COUNT_ABOVE', 100000))  # 无筛选时超过该行数改用估算值，0 为关闭
+FACE_ADMIN_FILTER_CACHE_TTL = int(os.getenv('FACE_ADMIN_FILTER_CACHE_TTL', 300))             # 用户类型/班级筛选项缓存(秒)
 
 # ===================== SimpleUI后台美化配置 =====================
 SIMPLEUI_HOME_INFO = False
@@ -240,6 +379,21 @@ SIMPLEUI_CONFIG = {
                     'name': '开始识别',
                     'url': '/face-scan/',
                     'icon': 'fas fa-search'
+                },
+                {
+                    'name': '识别统计',
+                    'url': '/admin/core/scanevent/dashboard/',
+                    'icon': 'fas fa-chart-bar'
+                },
+                {
+                    'name': '识别记录',
+                    'url': '/admin/core/scanevent/',
+                    'icon': 'fas fa-list'
+                },
+                {
+                    'name': '任务队列',
+                    'url': '/admin/core/person/queue-status/',
+                    'icon': 'fas fa-tasks'
                 }
             ]
         },
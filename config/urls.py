@@ -14,7 +14,15 @@ urlpatterns = [
 
     # 3. 原有配置保持不变
     path('admin/', admin.site.urls),
-    path('api/search/', views.api_search_face, name='api_search_face'),
+    # ASGI 部署时 (FACE_SEARCH_ASYNC=True) 识别接口切换为异步版本
+    path('api/search/', views.api_search_face_async if settings.FACE_SEARCH_ASYNC else views.api_search_face, name='api_search_face'),
+    path('api/search/async/', views.api_search_face_async, name='api_search_face_async'),
+    path('api/search/batch/', views.api_search_batch, name='api_search_batch'),
+    path('api/search/stats/', views.api_search_stats, name='api_search_stats'),
+    # 闸机/自助终端：设备密钥认证，不走会话 (路径前缀见 FACE_DEVICE_API_PREFIX)
+    path('api/device/search/', views.api_device_search_async if settings.FACE_SEARCH_ASYNC else views.api_device_search, name='api_device_search'),
+    # Prometheus 指标 (需 FACE_METRICS_TOKEN 或后台管理员登录)
+    path('metrics', views.metrics_view, name='metrics'),
 ]
 
 
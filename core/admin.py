@@ -1,22 +1,44 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
 from django.utils.html import format_html
-from django.urls import reverse
-from django.http import HttpResponseRedirect
+from django.urls import reverse, path
+from django.http import HttpResponseRedirect, Http404
+from django.template.response import TemplateResponse
+from django.contrib.admin.options import IncorrectLookupParameters
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.forms import UserChangeForm
 from django.contrib.auth.password_validation import validate_password
 from django import forms
-from django.core.exceptions import ValidationError
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, PermissionDenied, ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.cache import add_never_cache_headers
+from django.utils.functional import cached_property
+from django.conf import settings
+import datetime
+import hashlib
+import os
+import re
+import tempfile
 
 # 第三方库
 from import_export.admin import ImportExportModelAdmin
 from import_export import resources, fields
 
 # 本地模型
-from .models import User, Person, FaceScan
+from .models import User, Person, FaceScan, ScanEvent, ScanHourlyStat, DeviceKey
 from .services import ImageDownloadService
+from .tasks import enqueue_face_sync, face_sync_queue
+from . import metrics
+from .circuit import baidu_breaker
 from .log_utils import log_system_error
+from .importers import start_import_job, get_import_job, import_upload_dir
+from .exporters import export_persons
+from .imaging import thumbnail_url
+from .utils import get_client_ip
+from . import devices
 
 # =========================================================
 # 标准化配置
@@ -112,29 +134,236 @@ class PersonResource(resources.ModelResource):
             except Exception as e:
                 log_system_error(f"导入触发下载失败: {e}")
 
+# ---------------- 大表列表性能 ----------------
+class CachedCountPaginator(Paginator):
+    """
+    分页总数缓存 FACE_ADMIN_COUNT_CACHE_TTL 秒 (按查询 SQL 区分)
+    MySQL 下无筛选条件且表行数超过 FACE_ADMIN_ESTIMATE_COUNT_ABOVE 时直接使用统计信息中的估算行数
+    """
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        estimate = self._estimate(queryset)
+        if estimate is not None:
+            return estimate
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = 'admin_count:' + hashlib.md5(f"{sql}{params}".encode('utf-8')).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, getattr(settings, 'FACE_ADMIN_COUNT_CACHE_TTL', 60))
+        return count
+
+    @staticmethod
+    def _estimate(queryset):
+        threshold = getattr(settings, 'FACE_ADMIN_ESTIMATE_COUNT_ABOVE', 100000)
+        connection = connections[queryset.db]
+        if not threshold or connection.vendor != 'mysql' or queryset.query.has_filters():
+            return None
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] and row[0] >= threshold else None
+
+
+class CachedValuesFieldListFilter(admin.AllValuesFieldListFilter):
+    """筛选项候选值缓存 FACE_ADMIN_FILTER_CACHE_TTL 秒，避免每次打开列表都对全表 DISTINCT"""
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        key = f"admin_filter:{model._meta.label_lower}:{field_path}"
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.lookup_choices)
+            cache.set(key, choices, getattr(settings, 'FACE_ADMIN_FILTER_CACHE_TTL', 300))
+        self.lookup_choices = choices
+
+
+class StreamImportForm(forms.Form):
+    file = forms.FileField(label="导入文件", help_text="支持 csv / xlsx，表头：姓名、班级、用户类型、身份证号、source_image_url")
+
+
 class PersonAdmin(ImportExportModelAdmin):
     resource_class = PersonResource
-    list_display = ('name', 'id_card', 'class_name', 'user_type', 'update_time', 'face_preview')
-    list_filter = ('user_type', 'class_name')
-    search_fields = ('name', 'id_card')
+    change_list_template = 'admin/core/person/change_list.html'
+    list_display = ('name', 'id_card', 'class_name', 'user_type', 'sync_status', 'update_time', 'face_preview')
+    list_filter = (
+        ('user_type', CachedValuesFieldListFilter),
+        ('class_name', CachedValuesFieldListFilter),
+        'sync_status',
+    )
+    # 实际匹配规则见 get_search_results
+    search_fields = ('^name', '^id_card')
+    search_help_text = "输入姓名(前缀)或身份证号(前缀，满 18 位时精确匹配)"
     list_per_page = 20
-    readonly_fields = ('face_preview_large', 'create_time', 'update_time')
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    readonly_fields = ('face_preview_large', 'create_time', 'update_time', 'sync_status', 'sync_message', 'sync_time', 'synced_at')
+    actions = ['resync_dirty_faces', 'resync_faces']
     
     fieldsets = (
         ('基本信息', {'fields': ('name', 'id_card', 'class_name', 'user_type')}),
         ('人脸信息', {'fields': ('face_image', 'face_preview_large', 'source_image_url')}),
+        ('同步状态', {'fields': ('sync_status', 'sync_message', 'sync_time', 'synced_at')}),
         ('时间记录', {'fields': ('create_time', 'update_time')}),
     )
 
+    ID_CARD_SEARCH_RE = re.compile(r'^\d+[Xx]?$')
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        数字按身份证号前缀匹配 (满 18 位精确匹配)，其余按姓名前缀匹配
+        只查一列且不带前导通配符，均可走索引
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        if self.ID_CARD_SEARCH_RE.match(term):
+            term = term.upper()
+            if len(term) == 18:
+                return queryset.filter(id_card=term), False
+            return queryset.filter(id_card__istartswith=term), False
+        return queryset.filter(name__istartswith=term), False
+
+    @admin.action(description="同步有变化的人员 (照片或姓名已修改)")
+    def resync_dirty_faces(self, request, queryset):
+        id_cards = list(queryset.sync_dirty().values_list('id_card', flat=True))
+        queryset.filter(id_card__in=id_cards).update(sync_status=Person.SYNC_PENDING)
+        count = enqueue_face_sync(id_cards)
+        self.message_user(request, f"选中人员中 {len(id_cards)} 人有变化，已加入同步队列 {count} 人")
+
+    @admin.action(description="强制重新同步到百度人脸库")
+    def resync_faces(self, request, queryset):
+        id_cards = list(queryset.exclude(face_image='').values_list('id_card', flat=True))
+        # 清除已同步哈希，worker 不会因"未变化"跳过
+        queryset.filter(id_card__in=id_cards).update(sync_status=Person.SYNC_PENDING, synced_hash='')
+        count = enqueue_face_sync(id_cards)
+        self.message_user(request, f"已加入同步队列 {count} 人")
+
+    def get_urls(self):
+        urls = [
+            path('stream-import/', self.admin_site.admin_view(self.stream_import_view), name='core_person_stream_import'),
+            path('stream-import/<str:job_id>/', self.admin_site.admin_view(self.stream_import_status_view), name='core_person_stream_import_status'),
+            path('export/stream/', self.admin_site.admin_view(self.stream_export_view), name='core_person_stream_export'),
+            path('queue-status/', self.admin_site.admin_view(self.queue_status_view), name='core_person_queue_status'),
+        ]
+        return urls + super().get_urls()
+
+    def stream_import_view(self, request):
+        """大文件流式导入：上传后在后台分块写入"""
+        if not self.has_add_permission(request):
+            raise Http404
+        form = StreamImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            ext = os.path.splitext(upload.name)[1].lower()
+            if ext not in ('.csv', '.xlsx', '.xlsm'):
+                form.add_error('file', "仅支持 csv / xlsx 文件")
+            else:
+                with tempfile.NamedTemporaryFile(delete=False, suffix=ext, dir=import_upload_dir()) as tmp:
+                    for chunk in upload.chunks():
+                        tmp.write(chunk)
+                job_id = start_import_job(tmp.name, upload.name, request.user.username, get_client_ip(request))
+                messages.info(request, f"已提交导入任务 {upload.name}，由后台 worker 执行")
+                return HttpResponseRedirect(reverse('admin:core_person_stream_import_status', args=[job_id]))
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '流式导入人员档案',
+            'opts': self.model._meta,
+            'form': form,
+            'job': None,
+        }
+        return TemplateResponse(request, 'admin/core/person/stream_import.html', context)
+
+    def stream_import_status_view(self, request, job_id):
+        job = get_import_job(job_id)
+        if job is None:
+            raise Http404
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '流式导入人员档案',
+            'opts': self.model._meta,
+            'form': None,
+            'job': job,
+        }
+        return TemplateResponse(request, 'admin/core/person/stream_import.html', context)
+
+    def stream_export_view(self, request):
+        """大数据量流式导出 (csv/xlsx)，导出范围与列表页当前的筛选/搜索条件一致"""
+        if not self.has_export_permission(request):
+            raise Http404
+        params = request.GET.copy()
+        fmt = params.pop('format', ['csv'])[-1]
+        # format 不是列表页参数，去掉后再按列表页规则解析筛选条件
+        request.GET = params
+        try:
+            cl = self.get_changelist_instance(request)
+        except IncorrectLookupParameters:
+            return HttpResponseRedirect(reverse('admin:core_person_changelist') + '?e=1')
+        return export_persons(fmt, cl.get_queryset(request))
+
+    def queue_status_view(self, request):
+        """后台任务队列状态：积压/处理中/死信数量、下载统计、最近失败记录"""
+        queues = {'face_sync': face_sync_queue, 'image_download': ImageDownloadService.queue}
+        if request.method == 'POST':
+            # 死信重新入队会再次调用百度/下载图片，需要修改权限
+            if not self.has_change_permission(request):
+                raise PermissionDenied
+            queue = queues.get(request.POST.get('queue'))
+            if queue:
+                count = queue.requeue_dead()
+                messages.success(request, f"已重新入队 {count} 个任务")
+            return HttpResponseRedirect(request.path)
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        counters = metrics.get_counters()
+        breaker_state, _ = baidu_breaker.state()
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '后台任务队列',
+            'opts': self.model._meta,
+            'can_requeue': self.has_change_permission(request),
+            'queues': [
+                {
+                    'name': name,
+                    'label': '人脸同步' if name == 'face_sync' else '图片下载',
+                    'stats': queue.stats(),
+                    'dead_letters': queue.dead_letters(20),
+                }
+                for name, queue in queues.items()
+            ],
+            'download_counters': {
+                '下载成功': counters.get('download_success', 0),
+                '未变化(304)': counters.get('download_not_modified', 0),
+                '下载失败': counters.get('download_failed', 0),
+            },
+            'baidu_status': {
+                '熔断器状态': dict(closed='正常', open='熔断中', half_open='恢复探测中').get(breaker_state, breaker_state),
+                '熔断次数': counters.get('circuit_baidu_open', 0),
+                '繁忙/限流拒绝': counters.get('baidu_busy', 0),
+                '实时识别排队次数': counters.get('ratelimit_search_waited', 0),
+                '实时识别排队总时长(ms)': counters.get('ratelimit_search_wait_ms', 0),
+                '后台同步排队总时长(ms)': counters.get('ratelimit_background_wait_ms', 0),
+            },
+        }
+        return TemplateResponse(request, 'admin/core/person/queue_status.html', context)
+
     def face_preview(self, obj):
         if obj.face_image:
-            return format_html('<img src="{}" style="max-height:50px; border-radius:4px;" />', obj.face_image.url)
+            return format_html('<img src="{}" style="max-height:50px; border-radius:4px;" loading="lazy" />', thumbnail_url(obj.face_image, 'small'))
         return "-"
     face_preview.short_description = "照片"
 
     def face_preview_large(self, obj):
         if obj.face_image:
-            return format_html('<img src="{}" style="max-width:200px;" />', obj.face_image.url)
+            return format_html('<a href="{}" target="_blank"><img src="{}" style="max-width:200px;" /></a>', obj.face_image.url, thumbnail_url(obj.face_image, 'large'))
         return "暂无照片"
     face_preview_large.short_description = "照片预览"
 
@@ -158,6 +387,129 @@ class FaceScanAdmin(admin.ModelAdmin):
 
 
 
+# =========================================================
+# 识别记录与统计看板 (ScanEvent)
+# =========================================================
+@admin.register(ScanEvent)
+class ScanEventAdmin(admin.ModelAdmin):
+    change_list_template = 'admin/core/scanevent/change_list.html'
+    list_display = ('scanned_at', 'person', 'id_card', 'outcome', 'score', 'operator', 'ip', 'latency_ms', 'cached')
+    list_filter = ('outcome', 'scanned_at', 'cached')
+    search_fields = ('id_card', 'operator')
+    list_select_related = ('person',)
+    list_per_page = 50
+    # 大表不做精确总数统计
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def get_urls(self):
+        urls = [
+            path('dashboard/', self.admin_site.admin_view(self.dashboard_view), name='core_scanevent_dashboard'),
+        ]
+        return urls + super().get_urls()
+
+    def dashboard_view(self, request):
+        """识别统计看板：读取按小时预聚合的 ScanHourlyStat，不扫描明细表"""
+        try:
+            day = datetime.date.fromisoformat(request.GET.get('date', ''))
+        except ValueError:
+            day = datetime.date.today()
+        start = datetime.datetime.combine(day, datetime.time.min)
+
+        hours = {
+            h: {'hour': start + datetime.timedelta(hours=h), 'match': 0, 'no_match': 0, 'busy': 0, 'persons': 0, 'latency': 0}
+            for h in range(24)
+        }
+        for stat in ScanHourlyStat.objects.filter(hour__gte=start, hour__lt=start + datetime.timedelta(days=1)):
+            row = hours[stat.hour.hour]
+            row[stat.outcome] = stat.count
+            row['latency'] += stat.total_latency_ms
+            if stat.outcome == ScanEvent.OUTCOME_MATCH:
+                row['persons'] = stat.persons
+        max_total = max([r['match'] + r['no_match'] + r['busy'] for r in hours.values()] + [1])
+        for row in hours.values():
+            row['total'] = row['match'] + row['no_match'] + row['busy']
+            row['avg_latency'] = round(row['latency'] / row['total']) if row['total'] else None
+            row['bar'] = round(row['total'] * 100 / max_total)
+
+        days_start = start - datetime.timedelta(days=13)
+        days = {days_start.date() + datetime.timedelta(days=i): {'match': 0, 'no_match': 0, 'busy': 0} for i in range(14)}
+        for stat in ScanHourlyStat.objects.filter(hour__gte=days_start, hour__lt=start + datetime.timedelta(days=1)):
+            days[stat.hour.date()][stat.outcome] += stat.count
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '识别统计',
+            'opts': self.model._meta,
+            'day': day,
+            'prev_day': day - datetime.timedelta(days=1),
+            'next_day': day + datetime.timedelta(days=1),
+            'hours': list(hours.values()),
+            'days': [{'date': d, **v, 'total': sum(v.values())} for d, v in sorted(days.items(), reverse=True)],
+            'summary': {
+                'match': sum(r['match'] for r in hours.values()),
+                'no_match': sum(r['no_match'] for r in hours.values()),
+                'busy': sum(r['busy'] for r in hours.values()),
+            },
+        }
+        return TemplateResponse(request, 'admin/core/scanevent/dashboard.html', context)
+
+
+# =========================================================
+# 设备密钥 (闸机/自助终端调用 /api/device/ 接口)
+# =========================================================
+@admin.register(DeviceKey)
+class DeviceKeyAdmin(admin.ModelAdmin):
+    list_display = ('name', 'user', 'key_prefix', 'is_active', 'last_used_at', 'last_used_ip', 'created_at')
+    list_filter = ('is_active',)
+    search_fields = ('name', 'key_prefix', 'user__username')
+    list_select_related = ('user',)
+    autocomplete_fields = ('user',)
+    fields = ('name', 'user', 'is_active', 'key_prefix', 'last_used_at', 'last_used_ip', 'created_at')
+    readonly_fields = ('key_prefix', 'last_used_at', 'last_used_ip', 'created_at')
+    actions = ['regenerate_keys']
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            # 明文暂存在本次请求上，由 response_add 直接渲染，不进 messages (会写入 cookie/会话)
+            request._device_key = obj.generate_key()
+        super().save_model(request, obj, form, change)
+
+    def response_add(self, request, obj, post_url_continue=None):
+        key = getattr(request, '_device_key', None)
+        if key:
+            return self._show_keys(request, [(obj, key)])
+        return super().response_add(request, obj, post_url_continue)
+
+    @admin.action(description="重置密钥 (旧密钥立即失效)")
+    def regenerate_keys(self, request, queryset):
+        device_keys = []
+        for device in queryset:
+            old_hash = device.key_hash
+            key = device.generate_key()
+            device.save(update_fields=['key_prefix', 'key_hash'])
+            devices.invalidate(old_hash)
+            device_keys.append((device, key))
+        return self._show_keys(request, device_keys)
+
+    def _show_keys(self, request, device_keys):
+        """明文只在本次响应中显示一次，数据库中仅保存哈希"""
+        context = {
+            **self.admin_site.each_context(request),
+            'title': '设备密钥',
+            'opts': self.model._meta,
+            'device_keys': device_keys,
+        }
+        response = TemplateResponse(request, 'admin/core/devicekey/show_keys.html', context)
+        add_never_cache_headers(response)
+        return response
+
+
 # =========================================================
 # 4. auditlog显示IP
 # =========================================================
@@ -45,6 +45,11 @@ class CoreConfig(AppConfig):
         self.rename_axes_app()
         self.rename_auditlog_app()
 
+        # 5. 本地人脸索引后端未配置特征模型时启动即报错
+        from .face_index import local_index_enabled, check_embedder_configured
+        if local_index_enabled():
+            check_embedder_configured()
+
     def rename_axes_app(self):
         """汉化 Axes (用户锁定与访问日志)"""
         try:
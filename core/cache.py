@@ -0,0 +1,269 @@
+import hashlib
+import io
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from . import metrics
+from .log_utils import log_system_error
+
+# =========================================================
+# 人脸搜索结果缓存
+# =========================================================
+# 闸机摄像头经常在几秒内重复触发同一张脸，短时间内命中缓存则不再调用百度。
+#   face_search:exact:<sha256>    精确模式：按解码后图片字节的摘要缓存
+#   face_search:phash:<dhash>     近似模式：按感知哈希缓存，汉明距离不超过阈值即视为同一张图
+#   face_search:recent            ZSET 最近的感知哈希 (分值=过期时间)，用于近似查找
+#   face_search:person:<身份证号>  SET 该人员关联的缓存键，人员更新/删除时一并清除
+
+
+def dhash(image_bytes, size=8):
+    """64 位差值哈希 (dHash)"""
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        pixels = list(img.convert('L').resize((size + 1, size)).getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+class SearchResultCache:
+    PREFIX = 'face_search'
+    RECENT_LIMIT = 256
+
+    @classmethod
+    def _mode(cls):
+        return getattr(settings, 'FACE_SEARCH_CACHE_MODE', 'exact')
+
+    @classmethod
+    def _ttl(cls):
+        return getattr(settings, 'FACE_SEARCH_CACHE_TTL', 10)
+
+    @classmethod
+    def get(cls, image_bytes):
+        """返回缓存的匹配结果，未命中返回 None"""
+        mode = cls._mode()
+        if mode == 'off':
+            return None
+        try:
+            r = get_redis_connection('default')
+            raw = r.get(f"{cls.PREFIX}:exact:{hashlib.sha256(image_bytes).hexdigest()}")
+            if raw is None and mode == 'phash':
+                raw = cls._get_near(r, dhash(image_bytes))
+        except Exception as e:
+            log_system_error(f"搜索缓存读取失败: {e}")
+            return None
+
+        metrics.incr('search_cache_hit' if raw is not None else 'search_cache_miss')
+        return json.loads(raw) if raw is not None else None
+
+    @classmethod
+    def _get_near(cls, r, value):
+        now = time.time()
+        r.zremrangebyscore(f"{cls.PREFIX}:recent", '-inf', now)
+        threshold = getattr(settings, 'FACE_SEARCH_PHASH_DISTANCE', 6)
+        best, best_distance = None, threshold + 1
+        for member in r.zrange(f"{cls.PREFIX}:recent", 0, -1):
+            distance = bin(int(member, 16) ^ value).count('1')
+            if distance < best_distance:
+                best, best_distance = member.decode('utf-8'), distance
+        return r.get(f"{cls.PREFIX}:phash:{best}") if best else None
+
+    @classmethod
+    def set(cls, image_bytes, data):
+        """缓存匹配结果，data 中必须包含 id_card"""
+        mode = cls._mode()
+        if mode == 'off':
+            return
+        ttl = cls._ttl()
+        payload = json.dumps(data, ensure_ascii=False)
+        person_key = f"{cls.PREFIX}:person:{data['id_card']}"
+        try:
+            r = get_redis_connection('default')
+            keys = [f"{cls.PREFIX}:exact:{hashlib.sha256(image_bytes).hexdigest()}"]
+            pipe = r.pipeline()
+            if mode == 'phash':
+                value = f"{dhash(image_bytes):016x}"
+                keys.append(f"{cls.PREFIX}:phash:{value}")
+                pipe.zadd(f"{cls.PREFIX}:recent", {value: time.time() + ttl})
+                pipe.zremrangebyrank(f"{cls.PREFIX}:recent", 0, -cls.RECENT_LIMIT - 1)
+            for key in keys:
+                pipe.set(key, payload, ex=ttl)
+            pipe.sadd(person_key, *keys)
+            pipe.expire(person_key, ttl)
+            pipe.execute()
+        except Exception as e:
+            log_system_error(f"搜索缓存写入失败: {e}")
+
+    @classmethod
+    def invalidate_person(cls, id_card):
+        """人员更新或删除后清除其相关缓存"""
+        person_key = f"{cls.PREFIX}:person:{id_card}"
+        try:
+            r = get_redis_connection('default')
+            keys = r.smembers(person_key)
+            r.delete(person_key, *keys)
+        except Exception as e:
+            log_system_error(f"搜索缓存清除失败: {e}")
+
+    @classmethod
+    def stats(cls):
+        counters = metrics.get_counters()
+        hits = counters.get('search_cache_hit', 0)
+        misses = counters.get('search_cache_miss', 0)
+        total = hits + misses
+        return {
+            'mode': cls._mode(),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+        }
+
+
+# =========================================================
+# 人员资料缓存 (识别热路径不再查询 MySQL)
+# =========================================================
+#   person_profile:<身份证号>  JSON {name, class_name, user_type, photo_url}
+#   人员不存在时写入空对象并设置较短有效期，防止反复穿透到数据库
+
+
+class PersonProfileCache:
+    PREFIX = 'person_profile'
+    MISSING_TTL = 60
+
+    @classmethod
+    def _key(cls, id_card):
+        return f"{cls.PREFIX}:{id_card}"
+
+    @classmethod
+    def _ttl(cls):
+        return getattr(settings, 'PERSON_PROFILE_CACHE_TTL', 86400)
+
+    @staticmethod
+    def build(person):
+        return {
+            'name': person.name,
+            'class_name': person.class_name or '',
+            'user_type': person.user_type or '',
+            'photo_url': person.face_image.url if person.face_image else '',
+        }
+
+    @classmethod
+    def get(cls, id_card):
+        """按身份证号读取资料，未缓存时回源数据库；人员不存在返回 None"""
+        return cls.get_many([id_card]).get(id_card)
+
+    @classmethod
+    def get_many(cls, id_cards):
+        """批量读取，返回 {身份证号: 资料}；缓存未命中的一次性 in_bulk 回源"""
+        from .models import Person
+
+        id_cards = list(dict.fromkeys(id_cards))
+        if not id_cards:
+            return {}
+        result, missing = {}, []
+        try:
+            r = get_redis_connection('default')
+            values = r.mget([cls._key(i) for i in id_cards])
+        except Exception as e:
+            log_system_error(f"人员资料缓存读取失败: {e}")
+            values = [None] * len(id_cards)
+
+        for id_card, raw in zip(id_cards, values):
+            if raw is None:
+                missing.append(id_card)
+                continue
+            profile = json.loads(raw)
+            if profile:
+                result[id_card] = profile
+
+        metrics.incr('profile_cache_hit', len(id_cards) - len(missing))
+        if not missing:
+            return result
+        metrics.incr('profile_cache_miss', len(missing))
+
+        persons = Person.objects.only('name', 'class_name', 'user_type', 'id_card', 'face_image').in_bulk(missing, field_name='id_card')
+        loaded = {id_card: cls.build(p) for id_card, p in persons.items()}
+        result.update(loaded)
+        try:
+            pipe = get_redis_connection('default').pipeline()
+            for id_card in missing:
+                if id_card in loaded:
+                    pipe.set(cls._key(id_card), json.dumps(loaded[id_card], ensure_ascii=False), ex=cls._ttl())
+                else:
+                    pipe.set(cls._key(id_card), '{}', ex=cls.MISSING_TTL)
+            pipe.execute()
+        except Exception as e:
+            log_system_error(f"人员资料缓存写入失败: {e}")
+        return result
+
+    @classmethod
+    def _get_cached(cls, id_card):
+        """只读缓存，返回 (是否命中, 资料)"""
+        try:
+            raw = get_redis_connection('default').get(cls._key(id_card))
+        except Exception as e:
+            log_system_error(f"人员资料缓存读取失败: {e}")
+            raw = None
+        if raw is None:
+            metrics.incr('profile_cache_miss')
+            return False, None
+        metrics.incr('profile_cache_hit')
+        return True, json.loads(raw) or None
+
+    @classmethod
+    def _store(cls, id_card, profile):
+        try:
+            if profile:
+                get_redis_connection('default').set(cls._key(id_card), json.dumps(profile, ensure_ascii=False), ex=cls._ttl())
+            else:
+                get_redis_connection('default').set(cls._key(id_card), '{}', ex=cls.MISSING_TTL)
+        except Exception as e:
+            log_system_error(f"人员资料缓存写入失败: {e}")
+
+    @classmethod
+    async def aget(cls, id_card):
+        """异步版本：Redis 读写放到线程池，不阻塞事件循环；缓存未命中时使用异步 ORM 回源"""
+        from .models import Person
+
+        hit, profile = await sync_to_async(cls._get_cached, thread_sensitive=False)(id_card)
+        if hit:
+            return profile
+        person = await Person.objects.only('name', 'class_name', 'user_type', 'id_card', 'face_image').filter(id_card=id_card).afirst()
+        profile = cls.build(person) if person else None
+        await sync_to_async(cls._store, thread_sensitive=False)(id_card, profile)
+        return profile
+
+    @classmethod
+    def set_many(cls, persons):
+        pipe = get_redis_connection('default').pipeline()
+        for person in persons:
+            pipe.set(cls._key(person.id_card), json.dumps(cls.build(person), ensure_ascii=False), ex=cls._ttl())
+        return len(pipe.execute())
+
+    @classmethod
+    def refresh(cls, person):
+        try:
+            cls.set_many([person])
+        except Exception as e:
+            log_system_error(f"人员资料缓存更新失败: {e}")
+
+    @classmethod
+    def delete(cls, id_card):
+        cls.delete_many([id_card])
+
+    @classmethod
+    def delete_many(cls, id_cards):
+        keys = [cls._key(i) for i in id_cards]
+        if not keys:
+            return
+        try:
+            get_redis_connection('default').delete(*keys)
+        except Exception as e:
+            log_system_error(f"人员资料缓存删除失败: {e}")
@@ -0,0 +1,139 @@
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_redis import get_redis_connection
+from loguru import logger
+
+from . import metrics
+from .log_utils import log_system_error
+
+# =========================================================
+# 熔断器 (状态存放在 Redis，所有进程共享)
+# =========================================================
+# closed     正常调用；连续失败达到阈值后转为 open
+# open       冷却期内直接失败，不再请求百度
+# half_open  冷却结束后只放行一个探测请求：成功则恢复 closed，失败则重新 open
+
+
+class CircuitOpen(Exception):
+    """熔断中，暂停调用"""
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=None, cooldown=None, probe_timeout=15):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._cooldown = cooldown
+        self.probe_timeout = probe_timeout
+        self.state_key = f"circuit:{name}:state"
+        self.failures_key = f"circuit:{name}:failures"
+        self.probe_key = f"circuit:{name}:probe"
+
+    @property
+    def failure_threshold(self):
+        return self._failure_threshold or getattr(settings, 'FACE_CIRCUIT_FAILURE_THRESHOLD', 5)
+
+    @property
+    def cooldown(self):
+        return self._cooldown or getattr(settings, 'FACE_CIRCUIT_COOLDOWN', 30)
+
+    @property
+    def redis(self):
+        return get_redis_connection('default')
+
+    def _transition(self, state, reason=''):
+        pipe = self.redis.pipeline()
+        pipe.hset(self.state_key, mapping={'state': state, 'since': time.time(), 'until': time.time() + self.cooldown})
+        if state == self.CLOSED:
+            pipe.delete(self.failures_key, self.probe_key)
+        elif state == self.OPEN:
+            pipe.delete(self.probe_key)
+        pipe.execute()
+        metrics.incr(f'circuit_{self.name}_{state}')
+        if state == self.OPEN:
+            log_system_error(f"熔断器 {self.name} 打开，{self.cooldown}s 内暂停调用: {reason}")
+        else:
+            logger.warning(f"熔断器 {self.name} 转为 {state}")
+
+    def state(self):
+        """返回 (状态, 打开状态的截止时间)"""
+        state, until = self.redis.hmget(self.state_key, 'state', 'until')
+        return _decode(state) or self.CLOSED, float(until or 0)
+
+    def allow(self):
+        """
+        调用前检查，熔断中抛出 CircuitOpen；Redis 不可用时放行
+        返回 True 表示本次调用占用了探测名额，未真正发出请求时须调用 release_probe 归还
+        """
+        try:
+            state, until = self.state()
+            if state == self.CLOSED:
+                return False
+            if state == self.OPEN and time.time() < until:
+                raise CircuitOpen(f"{self.name} 熔断中")
+            # 冷却结束 (或上一个探测请求超时)：只放行一个探测请求
+            if self.redis.set(self.probe_key, 1, nx=True, ex=self.probe_timeout):
+                if state == self.OPEN:
+                    self._transition(self.HALF_OPEN)
+                return True
+            raise CircuitOpen(f"{self.name} 熔断恢复探测中")
+        except CircuitOpen:
+            metrics.incr(f'circuit_{self.name}_rejected')
+            raise
+        except Exception as e:
+            log_system_error(f"熔断器状态读取失败: {e}")
+            return False
+
+    async def aallow(self):
+        """异步版本：Redis 调用在线程池中执行"""
+        return await sync_to_async(self.allow, thread_sensitive=False)()
+
+    def release_probe(self):
+        """探测请求没有发出 (如限流排队超时)：归还探测名额，下一个请求可继续探测"""
+        try:
+            self.redis.delete(self.probe_key)
+        except Exception as e:
+            log_system_error(f"熔断器状态写入失败: {e}")
+
+    async def arelease_probe(self):
+        await sync_to_async(self.release_probe, thread_sensitive=False)()
+
+    def record_success(self):
+        try:
+            state, _ = self.state()
+            if state != self.CLOSED:
+                self._transition(self.CLOSED)
+            else:
+                self.redis.delete(self.failures_key)
+        except Exception as e:
+            log_system_error(f"熔断器状态写入失败: {e}")
+
+    def record_failure(self, reason=''):
+        try:
+            state, _ = self.state()
+            if state == self.HALF_OPEN:
+                # 探测失败，重新进入冷却
+                self._transition(self.OPEN, reason)
+                return
+            if state == self.OPEN:
+                return
+            pipe = self.redis.pipeline()
+            pipe.incr(self.failures_key)
+            pipe.expire(self.failures_key, self.cooldown * 4)
+            failures, _ = pipe.execute()
+            # INCR 是原子的，恰好等于阈值的那次调用负责打开熔断器
+            if failures == self.failure_threshold:
+                self._transition(self.OPEN, reason)
+        except Exception as e:
+            log_system_error(f"熔断器状态写入失败: {e}")
+
+
+baidu_breaker = CircuitBreaker('baidu')
@@ -0,0 +1,98 @@
+import datetime
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from .models import DeviceKey
+from .utils import get_client_ip
+from .log_utils import log_system_error
+from . import metrics
+
+# =========================================================
+# 设备密钥认证 (闸机/自助终端调用 FACE_DEVICE_API_PREFIX 下的接口)
+# =========================================================
+# 请求头: Authorization: Device <密钥>  或  X-Device-Key: <密钥>
+# 该路径不经过会话/登录/Auditlog 中间件，每次识别不再读写会话；认证失败按 IP 单独计数锁定 (不走 Axes)。
+#   device_key:<sha256>         缓存的 DeviceKey (含绑定用户)，避免每次识别查库
+#   device_key:touched:<id>     最近使用时间节流，间隔内只写一次库
+#   device_key:failures:<ip>    认证失败计数，超过上限后该 IP 暂时拒绝
+
+PREFIX = 'device_key'
+
+
+class DeviceAuthError(Exception):
+    """设备密钥认证失败 (status 为返回的 HTTP 状态码)"""
+    def __init__(self, message, status=401):
+        super().__init__(message)
+        self.status = status
+
+
+def is_device_api(request):
+    return request.path_info.startswith(getattr(settings, 'FACE_DEVICE_API_PREFIX', '/api/device/'))
+
+
+def _request_key(request):
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if auth[:7].lower() == 'device ':
+        return auth[7:].strip()
+    return request.META.get('HTTP_X_DEVICE_KEY', '').strip()
+
+
+def invalidate(key_hash):
+    cache.delete(f"{PREFIX}:{key_hash}")
+
+
+def _lookup(key_hash):
+    device = cache.get(f"{PREFIX}:{key_hash}")
+    if device is None:
+        device = DeviceKey.objects.select_related('user').filter(key_hash=key_hash).first()
+        if device:
+            cache.set(f"{PREFIX}:{key_hash}", device, getattr(settings, 'FACE_DEVICE_KEY_CACHE_TTL', 60))
+    return device
+
+
+def _failures_key(ip):
+    return f"{PREFIX}:failures:{ip}"
+
+
+def _locked_out(ip):
+    limit = getattr(settings, 'FACE_DEVICE_AUTH_MAX_FAILURES', 20)
+    try:
+        return int(get_redis_connection('default').get(_failures_key(ip)) or 0) >= limit
+    except Exception as e:
+        log_system_error(f"设备认证失败计数读取失败: {e}")
+        return False
+
+
+def _record_failure(ip):
+    metrics.incr('device_auth_failed')
+    try:
+        r = get_redis_connection('default')
+        if r.incr(_failures_key(ip)) == 1:
+            r.expire(_failures_key(ip), getattr(settings, 'FACE_DEVICE_AUTH_LOCKOUT', 300))
+    except Exception as e:
+        log_system_error(f"设备认证失败计数写入失败: {e}")
+
+
+def _touch(device, ip):
+    """记录最近使用时间/IP，FACE_DEVICE_TOUCH_INTERVAL 秒内只写一次库"""
+    if not cache.add(f"{PREFIX}:touched:{device.pk}", 1, getattr(settings, 'FACE_DEVICE_TOUCH_INTERVAL', 60)):
+        return
+    DeviceKey.objects.filter(pk=device.pk).update(last_used_at=datetime.datetime.now(), last_used_ip=ip)
+
+
+def authenticate_device(request):
+    """校验请求中的设备密钥，返回 DeviceKey；失败抛出 DeviceAuthError"""
+    ip = get_client_ip(request)
+    if _locked_out(ip):
+        raise DeviceAuthError('认证失败次数过多，请稍后再试', status=429)
+    key = _request_key(request)
+    if not key:
+        _record_failure(ip)
+        raise DeviceAuthError('缺少设备密钥')
+    device = _lookup(DeviceKey.hash_key(key))
+    if not device or not device.is_active or not device.user.is_active:
+        _record_failure(ip)
+        raise DeviceAuthError('设备密钥无效或已停用')
+    _touch(device, ip)
+    return device
@@ -0,0 +1,232 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+# =========================================================
+# 本地人脸特征索引
+# =========================================================
+# 每个 Person 对应一行 float32 单位向量，存放在 FACE_INDEX_DIR 下的内存映射文件中:
+#   vectors.f32  (capacity, dim) 矩阵，按行追加，容量不足时翻倍扩容
+#   ids.json     {"dim": 128, "ids": [身份证号 或 null(已删除)]}，行号即向量所在行
+# 写入方 (worker/信号) 通过文件锁串行化；读取方检测 ids.json 的修改时间自动重新加载。
+
+
+class HashEmbedder:
+    """
+    确定性替身 embedder：相同图片字节得到相同的单位向量。
+    不具备真实的人脸特征能力，仅用于测试和联调；生产环境通过 FACE_INDEX_EMBEDDER 替换为真实模型。
+    """
+    dim = 128
+
+    def embed(self, image_bytes):
+        seed = int.from_bytes(hashlib.sha256(image_bytes).digest()[:8], 'little')
+        vec = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return vec / np.linalg.norm(vec)
+
+
+class FaceIndex:
+    VECTORS_FILE = 'vectors.f32'
+    META_FILE = 'ids.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, path, dim):
+        self.path = Path(path)
+        self.dim = dim
+        self._ids = []
+        self._rows = {}
+        self._matrix = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    # ---------------- 文件读写 ----------------
+    def _meta_path(self):
+        return self.path / self.META_FILE
+
+    def _vectors_path(self):
+        return self.path / self.VECTORS_FILE
+
+    def _load(self, mode='r'):
+        meta_path = self._meta_path()
+        if not meta_path.exists():
+            self._ids, self._rows, self._matrix, self._mtime = [], {}, None, None
+            return
+        meta = json.loads(meta_path.read_text(encoding='utf-8'))
+        if meta.get('dim') != self.dim:
+            raise ValueError(f"索引维度 {meta.get('dim')} 与 embedder 维度 {self.dim} 不一致，请重建索引")
+        self._ids = meta['ids']
+        self._rows = {id_card: row for row, id_card in enumerate(self._ids) if id_card}
+        vectors_path = self._vectors_path()
+        capacity = os.path.getsize(vectors_path) // (4 * self.dim) if vectors_path.exists() else 0
+        self._matrix = np.memmap(vectors_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim)) if capacity else None
+        self._mtime = meta_path.stat().st_mtime_ns
+
+    def _refresh(self):
+        """其他进程更新过索引时重新加载"""
+        meta_path = self._meta_path()
+        mtime = meta_path.stat().st_mtime_ns if meta_path.exists() else None
+        if mtime != self._mtime:
+            self._load()
+
+    def _write_meta(self):
+        tmp = self._meta_path().with_suffix('.tmp')
+        tmp.write_text(json.dumps({'dim': self.dim, 'ids': self._ids}), encoding='utf-8')
+        os.replace(tmp, self._meta_path())
+        self._mtime = self._meta_path().stat().st_mtime_ns
+
+    def _locked(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        return _FileLock(self.path / self.LOCK_FILE)
+
+    def _ensure_capacity(self, rows):
+        capacity = self._matrix.shape[0] if self._matrix is not None else 0
+        if rows <= capacity:
+            return
+        new_capacity = max(1024, capacity * 2, rows)
+        if self._matrix is not None:
+            self._matrix.flush()
+        with open(self._vectors_path(), 'ab') as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._matrix = np.memmap(self._vectors_path(), dtype=np.float32, mode='r+', shape=(new_capacity, self.dim))
+
+    # ---------------- 写入 ----------------
+    def upsert(self, id_card, vector):
+        with self._lock, self._locked():
+            self._load(mode='r+')
+            row = self._rows.get(id_card)
+            if row is None:
+                row = len(self._ids)
+                self._ensure_capacity(row + 1)
+                self._ids.append(id_card)
+                self._rows[id_card] = row
+            self._matrix[row] = vector
+            self._matrix.flush()
+            self._write_meta()
+
+    def remove(self, id_card):
+        with self._lock, self._locked():
+            self._load(mode='r+')
+            row = self._rows.pop(id_card, None)
+            if row is None:
+                return
+            self._ids[row] = None
+            self._matrix[row] = 0
+            self._matrix.flush()
+            self._write_meta()
+
+    def rebuild(self, items):
+        """用 (身份证号, 向量) 序列整体重建索引 (会清除已删除的空行)"""
+        with self._lock, self._locked():
+            self._vectors_path().unlink(missing_ok=True)
+            self._ids, self._rows, self._matrix = [], {}, None
+            for id_card, vector in items:
+                row = len(self._ids)
+                self._ensure_capacity(row + 1)
+                self._matrix[row] = vector
+                self._ids.append(id_card)
+                self._rows[id_card] = row
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._write_meta()
+            return len(self._ids)
+
+    # ---------------- 查询 ----------------
+    def search(self, vector, top_k=5):
+        """余弦相似度 top-k，返回 [(身份证号, 相似度0~1), ...]"""
+        with self._lock:
+            self._refresh()
+            count = len(self._ids)
+            if not count or self._matrix is None:
+                return []
+            scores = self._matrix[:count] @ np.asarray(vector, dtype=np.float32)
+            k = min(top_k, count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top if self._ids[i]]
+
+    def __len__(self):
+        with self._lock:
+            self._refresh()
+            return len(self._rows)
+
+
+class _FileLock:
+    """跨进程写锁"""
+    def __init__(self, path):
+        self.path = path
+
+    def __enter__(self):
+        self._fd = open(self.path, 'w')
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._fd.close()
+
+
+# =========================================================
+# 进程级单例
+# =========================================================
+_embedder = None
+_index = None
+_init_lock = threading.Lock()
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _init_lock:
+            if _embedder is None:
+                check_embedder_configured()
+                _embedder = import_string(settings.FACE_INDEX_EMBEDDER)()
+    return _embedder
+
+
+def get_index():
+    global _index
+    if _index is None:
+        embedder = get_embedder()
+        with _init_lock:
+            if _index is None:
+                _index = FaceIndex(settings.FACE_INDEX_DIR, embedder.dim)
+    return _index
+
+
+def local_index_enabled():
+    return getattr(settings, 'FACE_SEARCH_BACKEND', 'baidu') in ('local', 'local-then-baidu')
+
+
+def check_embedder_configured():
+    """本地后端必须显式配置特征模型，不默认使用 HashEmbedder (它会把任意人脸匹配到某个人)"""
+    if not getattr(settings, 'FACE_INDEX_EMBEDDER', ''):
+        raise ImproperlyConfigured(
+            f"FACE_SEARCH_BACKEND={settings.FACE_SEARCH_BACKEND} 需要配置 FACE_INDEX_EMBEDDER (人脸特征模型类路径)"
+        )
+
+
+def index_person(person):
+    """把人员照片写入本地索引"""
+    with person.face_image.open('rb') as f:
+        vector = get_embedder().embed(f.read())
+    get_index().upsert(person.id_card, vector)
+
+
+def search_local(image_bytes, top_k=5):
+    """返回与百度 search 接口相同结构的结果，score 为 0~100"""
+    matches = get_index().search(get_embedder().embed(image_bytes), top_k=top_k)
+    return {
+        'error_code': 0,
+        'error_msg': 'SUCCESS',
+        'source': 'local',
+        'result': {
+            'user_list': [{'user_id': id_card, 'score': score * 100} for id_card, score in matches],
+        },
+    }
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import threading
+import weakref
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+from .timing import timed
+
+# =========================================================
+# 进程级共享 HTTP 连接池
+# =========================================================
+# 每个进程持有一个 requests.Session，复用到 aip.baidubce.com 的 TCP/TLS 连接。
+# gunicorn fork 出 worker 后，子进程会丢弃从父进程继承的 Session，避免多个进程共用同一批 socket。
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+DEFAULT_TIMEOUTS = {
+    'token': (3, 5),
+    'search': (3, 10),
+    'sync': (3, 10),
+    'download': (3, 10),
+}
+
+
+def _build_session():
+    retries = getattr(settings, 'FACE_HTTP_RETRIES', 2)
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,  # 请求已发出后不重试，避免重复写入百度人脸库
+        status=retries,
+        backoff_factor=getattr(settings, 'FACE_HTTP_BACKOFF', 0.3),
+        status_forcelist=(502, 503, 504),
+        # 5xx 仅对幂等方法 (图片下载 GET) 重试；百度接口均为 POST，重试可能重复注册人脸，
+        # 也会让一次限流令牌变成多次调用。连接失败 (请求未发出) 不受此限制，仍会重试。
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, 'FACE_HTTP_POOL_CONNECTIONS', 4),
+        pool_maxsize=getattr(settings, 'FACE_HTTP_POOL_MAXSIZE', 20),
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """获取当前进程的共享 Session (fork 后自动重建)"""
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def _reset_after_fork():
+    global _session, _session_pid, _session_lock
+    # 子进程中不关闭父进程的连接，仅丢弃引用
+    _session = None
+    _session_pid = None
+    _session_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_timeout(endpoint):
+    """按接口获取 (连接超时, 读取超时)"""
+    timeouts = getattr(settings, 'FACE_HTTP_TIMEOUTS', None) or {}
+    return timeouts.get(endpoint) or DEFAULT_TIMEOUTS.get(endpoint, (3, 10))
+
+
+def post(endpoint, url, **kwargs):
+    kwargs.setdefault('timeout', get_timeout(endpoint))
+    with timed('http'):
+        return get_session().post(url, **kwargs)
+
+
+def get(endpoint, url, **kwargs):
+    kwargs.setdefault('timeout', get_timeout(endpoint))
+    with timed('http'):
+        return get_session().get(url, **kwargs)
+
+
+# =========================================================
+# 异步客户端 (ASGI 部署使用)
+# =========================================================
+# httpx.AsyncClient 不能跨事件循环使用，按事件循环各建一个，循环销毁后自动释放。
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _build_async_client():
+    maxsize = getattr(settings, 'FACE_HTTP_POOL_MAXSIZE', 20)
+    transport = httpx.AsyncHTTPTransport(
+        retries=getattr(settings, 'FACE_HTTP_RETRIES', 2),  # 仅重试连接失败
+        limits=httpx.Limits(max_connections=maxsize * 5, max_keepalive_connections=maxsize),
+    )
+    return httpx.AsyncClient(transport=transport)
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = _build_async_client()
+        _async_clients[loop] = client
+    return client
+
+
+def _async_timeout(endpoint):
+    connect, read = get_timeout(endpoint)
+    return httpx.Timeout(read, connect=connect)
+
+
+async def apost(endpoint, url, **kwargs):
+    kwargs.setdefault('timeout', _async_timeout(endpoint))
+    with timed('http'):
+        return await get_async_client().post(url, **kwargs)
+
+
+async def aget(endpoint, url, **kwargs):
+    kwargs.setdefault('timeout', _async_timeout(endpoint))
+    with timed('http'):
+        return await get_async_client().get(url, **kwargs)
@@ -0,0 +1,127 @@
+import hashlib
+import io
+import math
+import os
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from .log_utils import log_system_error
+
+# =========================================================
+# 图片处理工具 (Pillow)
+# =========================================================
+
+
+def crop_faces(image_bytes, locations, margin=0.2, quality=90):
+    """
+    按人脸框裁剪出单张人脸 (JPEG 字节)
+    locations: 百度 detect 返回的 location 列表 {left, top, width, height, rotation}
+      坐标相对于上传给百度的原始像素 (不按 EXIF 方向摆正)；rotation 为人脸框绕左上角的顺时针旋转角度，
+      按旋转后人脸框的外接矩形裁剪，再转正
+    margin: 四周额外保留的比例，裁剪太紧会影响识别
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        img = img.convert('RGB')
+        crops = []
+        for loc in locations:
+            angle = math.radians(loc.get('rotation') or 0)
+            cos, sin = math.cos(angle), math.sin(angle)
+            w, h = loc['width'], loc['height']
+            xs = [loc['left'] + dx for dx in (0, w * cos, -h * sin, w * cos - h * sin)]
+            ys = [loc['top'] + dy for dy in (0, w * sin, h * cos, w * sin + h * cos)]
+            pad = max(w, h) * margin
+            box = (
+                max(0, int(min(xs) - pad)),
+                max(0, int(min(ys) - pad)),
+                min(img.width, int(max(xs) + pad)),
+                min(img.height, int(max(ys) + pad)),
+            )
+            face = img.crop(box)
+            if loc.get('rotation'):
+                # Pillow 的 rotate 为逆时针方向
+                face = face.rotate(loc['rotation'], resample=Image.BILINEAR, expand=True)
+            buf = io.BytesIO()
+            face.save(buf, format='JPEG', quality=quality)
+            crops.append(buf.getvalue())
+        return crops
+
+
+# =========================================================
+# 入库图片标准化
+# =========================================================
+# 上传/下载的照片统一：按 EXIF 方向摆正 -> 去除元数据 -> 限制分辨率 -> 重新压缩为 JPEG
+# 同时生成列表页使用的缩略图，避免后台每页加载原图。
+
+
+def normalize_image(data, max_dimension=None, quality=None):
+    """返回标准化后的 JPEG 字节；data 可以是字节或已打开的二进制文件"""
+    max_dimension = max_dimension or getattr(settings, 'FACE_IMAGE_MAX_DIMENSION', 1024)
+    quality = quality or getattr(settings, 'FACE_IMAGE_QUALITY', 85)
+    source = io.BytesIO(data) if isinstance(data, (bytes, bytearray)) else data
+    with Image.open(source) as img:
+        # draft 让 JPEG 在解码阶段直接按比例缩小，大图可节省大量内存和时间
+        img.draft('RGB', (max_dimension, max_dimension))
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        buf = io.BytesIO()
+        # 不传 exif 参数，保存时即丢弃全部元数据
+        img.save(buf, format='JPEG', quality=quality, optimize=True)
+        return buf.getvalue()
+
+
+def thumbnail_name(name, size_key):
+    """faces/xxx.jpg -> thumbs/small/faces/xxx.jpg"""
+    return f"thumbs/{size_key}/{os.path.splitext(name)[0]}.jpg"
+
+
+def _render_thumbnail(data, size):
+    with Image.open(io.BytesIO(data)) as img:
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        img.thumbnail((size, size), Image.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, format='JPEG', quality=80)
+        return buf.getvalue()
+
+
+def make_thumbnails(storage, name, data):
+    """根据原图字节生成全部尺寸的缩略图 (覆盖旧文件)"""
+    for size_key, size in getattr(settings, 'FACE_THUMBNAIL_SIZES', {}).items():
+        thumb = thumbnail_name(name, size_key)
+        if storage.exists(thumb):
+            storage.delete(thumb)
+        storage.save(thumb, ContentFile(_render_thumbnail(data, size)))
+
+
+def thumbnail_url(field, size_key):
+    """返回缩略图地址；缩略图不存在或比原图旧时现场生成，失败则退回原图"""
+    storage = field.storage
+    thumb = thumbnail_name(field.name, size_key)
+    try:
+        if not storage.exists(thumb) or storage.get_modified_time(thumb) < storage.get_modified_time(field.name):
+            size = settings.FACE_THUMBNAIL_SIZES[size_key]
+            with field.open('rb') as f:
+                data = _render_thumbnail(f.read(), size)
+            if storage.exists(thumb):
+                storage.delete(thumb)
+            storage.save(thumb, ContentFile(data))
+        return storage.url(thumb)
+    except Exception as e:
+        log_system_error(f"缩略图生成失败 [{field.name}]: {e}")
+        return field.url
+
+
+# =========================================================
+# 照片内容哈希 (判断照片是否需要重新同步到百度)
+# =========================================================
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(field):
+    """按块计算已存储照片的哈希，不把整个文件读入内存"""
+    digest = hashlib.sha256()
+    with field.open('rb') as f:
+        for chunk in f.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
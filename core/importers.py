@@ -0,0 +1,294 @@
+import csv
+import io
+import os
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Person
+from .services import ImageDownloadService
+from .tasks import enqueue_face_sync
+from .queue import RedisJobQueue
+from .cache import PersonProfileCache
+from .log_utils import log_business, log_system_error
+
+# =========================================================
+# 人员档案流式导入
+# =========================================================
+# 逐行读取 csv/xlsx，按块 bulk_create(update_conflicts=True) 按身份证号批量 upsert。
+# bulk_create 不触发 post_save，因此每块结束后统一提交一次图片下载和人脸同步。
+
+# 表头 -> 字段 (与 PersonResource 保持一致)
+COLUMN_MAP = {
+    '姓名': 'name',
+    '班级': 'class_name',
+    '用户类型': 'user_type',
+    '身份证号': 'id_card',
+    'source_image_url': 'source_image_url',
+}
+UPDATE_FIELDS = ['name', 'class_name', 'user_type', 'source_image_url', 'update_time']
+MAX_ERRORS = 50
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    # Excel 中的长数字(身份证号)可能被读成浮点数
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _iter_csv(fileobj):
+    reader = csv.reader(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''))
+    yield from reader
+
+
+def _iter_xlsx(fileobj):
+    from openpyxl import load_workbook
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_rows(fileobj, filename):
+    """逐行返回 {字段: 值}，不会把整个文件载入内存"""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        rows = _iter_csv(fileobj)
+    elif ext in ('.xlsx', '.xlsm'):
+        rows = _iter_xlsx(fileobj)
+    else:
+        raise ValueError(f"不支持的文件格式: {ext}，仅支持 csv/xlsx")
+
+    header = next(rows, None)
+    if not header:
+        return
+    columns = [COLUMN_MAP.get(_cell(h)) for h in header]
+    if 'id_card' not in columns or 'name' not in columns:
+        raise ValueError("缺少必需列：姓名、身份证号")
+
+    for line_no, values in enumerate(rows, start=2):
+        row = {field: _cell(v) for field, v in zip(columns, values) if field}
+        if any(row.values()):
+            yield line_no, row
+
+
+def _import_chunk(chunk, stats):
+    rows = {}
+    for line_no, row in chunk:
+        if not row.get('id_card') or not row.get('name'):
+            stats['failed'] += 1
+            if len(stats['errors']) < MAX_ERRORS:
+                stats['errors'].append(f"第{line_no}行: 姓名或身份证号为空")
+            continue
+        rows[row['id_card']] = row  # 同一块内重复的身份证号以最后一行为准
+
+    if not rows:
+        return
+
+    existing = {
+        id_card: (name, url, face_image)
+        for id_card, name, url, face_image in Person.objects.filter(id_card__in=rows.keys())
+        .values_list('id_card', 'name', 'source_image_url', 'face_image')
+    }
+
+    objs = [
+        Person(
+            name=row['name'],
+            class_name=row.get('class_name', ''),
+            user_type=row.get('user_type', ''),
+            id_card=id_card,
+            source_image_url=row.get('source_image_url', ''),
+        )
+        for id_card, row in rows.items()
+    ]
+
+    download_ids, sync_ids = [], []
+    for id_card, row in rows.items():
+        old = existing.get(id_card)
+        url = row.get('source_image_url', '')
+        if url and (old is None or not old[2] or old[1] != url):
+            download_ids.append(id_card)
+        elif old and old[2] and old[0] != row['name']:
+            # 照片不变但百度 user_info(姓名) 变了
+            sync_ids.append(id_card)
+
+    # MySQL 的 ON DUPLICATE KEY UPDATE 不支持指定冲突字段
+    unique_fields = ['id_card'] if connection.features.supports_update_conflicts_with_target else None
+    with transaction.atomic():
+        Person.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=UPDATE_FIELDS,
+        )
+        if download_ids:
+            jobs = [
+                (pk, rows[id_card]['source_image_url'])
+                for id_card, pk in Person.objects.filter(id_card__in=download_ids).values_list('id_card', 'pk')
+            ]
+            ImageDownloadService.trigger_download_many(jobs)
+        if sync_ids:
+            transaction.on_commit(lambda: enqueue_face_sync(sync_ids))
+        # bulk_create 不触发信号，资料缓存需手动失效；新增人员也可能有识别时写入的"无档案"缓存
+        imported_ids = list(rows)
+        transaction.on_commit(lambda: PersonProfileCache.delete_many(imported_ids))
+
+    stats['created'] += sum(1 for id_card in rows if id_card not in existing)
+    stats['updated'] += sum(1 for id_card in rows if id_card in existing)
+    stats['downloads'] += len(download_ids)
+
+
+def import_persons(fileobj, filename, chunk_size=1000, progress=None):
+    """
+    流式导入人员档案
+    progress: 每处理完一块回调一次 progress(stats)
+    """
+    stats = {'rows': 0, 'created': 0, 'updated': 0, 'failed': 0, 'downloads': 0, 'errors': [], 'elapsed': 0.0}
+    started = time.monotonic()
+    chunk = []
+    for line_no, row in iter_rows(fileobj, filename):
+        chunk.append((line_no, row))
+        stats['rows'] += 1
+        if len(chunk) >= chunk_size:
+            # 下载队列积压过多时先等 worker 消化，避免一次导入堆积海量任务
+            ImageDownloadService.wait_for_capacity()
+            _import_chunk(chunk, stats)
+            chunk = []
+            stats['elapsed'] = time.monotonic() - started
+            if progress:
+                progress(stats)
+    if chunk:
+        _import_chunk(chunk, stats)
+    stats['elapsed'] = time.monotonic() - started
+    if progress:
+        progress(stats)
+    return stats
+
+
+# =========================================================
+# 后台导入任务 (后台页面上传后入队，由 `manage.py run_face_worker` 执行，进度存放在 Redis)
+# =========================================================
+# 上传文件保存在 FACE_IMPORT_DIR (web 与 worker 共享的 media 目录)。
+# 执行期间每 FACE_IMPORT_HEARTBEAT 秒写一次心跳并续租：worker 被杀后租约过期，任务由其他 worker 重新领取，
+# 从头执行 (按身份证号 upsert，重复执行无副作用)；心跳超过 FACE_IMPORT_STALE_SECONDS 仍无人接手时标记为失败。
+IMPORT_JOB_TIMEOUT = 24 * 3600
+IMPORT_MAX_ATTEMPTS = 3
+
+import_queue = RedisJobQueue(
+    'person_import',
+    max_attempts=IMPORT_MAX_ATTEMPTS,
+    lease=getattr(settings, 'FACE_IMPORT_HEARTBEAT', 15) * 4,
+)
+
+
+def _job_key(job_id):
+    return f"person_import:{job_id}"
+
+
+def _save_job(job_id, job):
+    cache.set(_job_key(job_id), job, IMPORT_JOB_TIMEOUT)
+
+
+def _remove_file(path):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def import_upload_dir():
+    path = settings.FACE_IMPORT_DIR
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_import_job(job_id):
+    """查询任务状态；执行中但心跳过期 (worker 已退出且无人接手) 的任务标记为失败"""
+    job = cache.get(_job_key(job_id))
+    if job and job['status'] == 'running' and time.time() - job.get('heartbeat', 0) > getattr(settings, 'FACE_IMPORT_STALE_SECONDS', 300):
+        job.update(status='error', error='后台 worker 已中断，请重新导入')
+        _save_job(job_id, job)
+        import_queue.ack(job_id)
+        _remove_file(job.get('path'))
+        log_system_error(f"流式导入中断 [{job['filename']}]: 心跳超时")
+    return job
+
+
+def run_import_job(job_id):
+    """worker 执行导入任务 (任务不存在或已结束时直接跳过)"""
+    job = cache.get(_job_key(job_id))
+    if not job or job['status'] not in ('queued', 'running'):
+        return
+    filename = job['filename']
+    job['attempt'] = job.get('attempt', 0) + 1
+    if job['attempt'] > IMPORT_MAX_ATTEMPTS:
+        # 每次执行都导致 worker 退出 (如内存不足)，不再重试
+        job.update(status='error', error='导入多次中断，请拆分文件后重试')
+        _save_job(job_id, job)
+        _remove_file(job['path'])
+        log_system_error(f"流式导入多次中断 [{filename}]")
+        return
+
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def save(**fields):
+        with lock:
+            job.update(fields)
+            _save_job(job_id, job)
+
+    def heartbeat():
+        while not stop.wait(getattr(settings, 'FACE_IMPORT_HEARTBEAT', 15)):
+            try:
+                save(heartbeat=time.time())
+                import_queue.extend(job_id)
+            except Exception as e:
+                log_system_error(f"流式导入心跳写入失败 [{filename}]: {e}")
+
+    save(status='running', heartbeat=time.time())
+    beat = threading.Thread(target=heartbeat, name='import-heartbeat', daemon=True)
+    beat.start()
+    try:
+        with open(job['path'], 'rb') as f:
+            stats = import_persons(f, filename, progress=lambda stats: save(stats=stats, heartbeat=time.time()))
+        result = {'status': 'done', 'stats': stats}
+        log_business(
+            user=job['username'],
+            ip=job['ip'],
+            action="数据导入",
+            obj="人员档案",
+            detail=f"流式导入 {filename}: 共{stats['rows']}行，新增{stats['created']}，更新{stats['updated']}，失败{stats['failed']}",
+        )
+    except Exception as e:
+        result = {'status': 'error', 'error': str(e)}
+        log_system_error(f"流式导入失败 [{filename}]: {e}")
+    finally:
+        stop.set()
+        beat.join()
+    save(**result)
+    _remove_file(job['path'])
+
+
+def start_import_job(path, filename, username, ip):
+    """提交后台导入任务，返回任务ID"""
+    job_id = uuid.uuid4().hex
+    _save_job(job_id, {
+        'status': 'queued',
+        'filename': filename,
+        'path': str(path),
+        'username': username,
+        'ip': ip,
+        'stats': None,
+        'heartbeat': time.time(),
+    })
+    import_queue.enqueue(job_id)
+    return job_id
@@ -1,9 +1,17 @@
+import datetime
+import json
 import os
 import sys
+import time
+from contextvars import ContextVar
 from loguru import logger
 from django.conf import settings
 import logging
 
+# 当前请求的上下文 (由 RequestContextMiddleware 设置)，业务日志自动带上请求ID和耗时
+request_id_var = ContextVar('request_id', default=None)
+request_started_var = ContextVar('request_started', default=None)
+
 
 class InterceptHandler(logging.Handler):
     """
@@ -24,6 +32,17 @@ class InterceptHandler(logging.Handler):
             level, record.getMessage()
         )
 
+def _purge_legacy_logs(log_root, days):
+    """旧版文本业务日志 access.*.log 不匹配新的文件名，loguru 的 retention 不会清理，按修改时间自行删除"""
+    cutoff = time.time() - days * 86400
+    for entry in os.scandir(log_root):
+        if entry.name.startswith('access.') and entry.name.endswith('.log'):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
+
 def configure_logging():
     """配置统一日志系统"""
     # 从 settings 获取配置，如果没配则使用默认值
@@ -39,17 +58,21 @@ def configure_logging():
 
     logger.remove()
 
-    # 1. 访问日志
+    _purge_legacy_logs(log_root, logs_days)
+
+    # 1. 业务日志 (JSON Lines，每行一个事件)
+    # 只接收 log_business 写入的记录，第三方库的 INFO 日志不会混入；
+    # enqueue 由后台线程写盘，默认按行写入 (BUSINESS_LOG_BUFFERING 调大后合并写入)
     logger.add(
-        sink=os.path.join(log_root, "access.{time:YYYY-MM-DD}.log"),
+        sink=os.path.join(log_root, "access.{time:YYYY-MM-DD}.jsonl"),
         rotation="00:00",
         retention=f"{logs_days} days",
         encoding="utf-8",
-        format="{message}",
-        filter=lambda record: record["level"].name == "INFO",
+        format="{extra[event]}",
+        filter=lambda record: "event" in record["extra"],
         enqueue=True,
+        buffering=getattr(settings, 'BUSINESS_LOG_BUFFERING', 1),
         mode="a", 
-        backtrace=True,
     )
 
     # 2. 错误日志
@@ -70,26 +93,35 @@ def configure_logging():
     # === 拦截 Django 原生日志 ===
     logging.basicConfig(handlers=[InterceptHandler()], level=0, force=True)
 
-def log_business(user, ip, action, obj, detail=""):
+def log_business(user, ip, action, obj, detail="", latency=None, **extra):
     """
-    统一业务日志写入函数
+    统一业务日志写入函数，写入 access.YYYY-MM-DD.jsonl:
+    {"ts", "user", "ip", "action", "obj", "detail", "latency_ms", "request_id", ...extra}
+    latency: 耗时(秒)，不传时在请求内自动取请求开始至今的耗时
     """
     try:
-        import datetime
-        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
         user_str = str(user.username) if hasattr(user, 'username') else str(user)
         if user_str == 'None' or user_str == '':
             user_str = 'System/Anonymous'
 
-        ip_str = str(ip)
+        if latency is None and request_started_var.get() is not None:
+            latency = time.perf_counter() - request_started_var.get()
 
-        msg = f"{now} | INFO     | 用户:{user_str} | IP:{ip_str} | 动作:{action} | 对象:{obj} | 详情:{detail}"
-        
-        # ================= 关键修改 =================
-        # 使用 .opt(depth=1) 让 Loguru 往回找一层堆栈。
-        # 这样控制台显示的就不会是 log_business:xx，而是调用 log_business 的代码位置（例如 views.py:50）
-        logger.opt(depth=1).info(msg)
+        event = {
+            'ts': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            'user': user_str,
+            'ip': str(ip),
+            'action': action,
+            'obj': str(obj),
+            'detail': str(detail),
+            'latency_ms': round(latency * 1000, 1) if latency is not None else None,
+            'request_id': request_id_var.get(),
+            **extra,
+        }
+        # .opt(depth=1) 让控制台显示调用 log_business 的代码位置（例如 views.py:50）
+        logger.opt(depth=1).bind(event=json.dumps(event, ensure_ascii=False, default=str)).info(
+            "{action} | {obj} | {detail}", action=action, obj=obj, detail=detail
+        )
     except Exception as e:
         # 降级处理，保证日志系统不搞崩主程序
         logger.error(f"日志记录失败: {str(e)}")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importers import import_persons
+
+
+class Command(BaseCommand):
+    help = "流式导入人员档案 (csv/xlsx)，按块批量写入，不会把整个文件载入内存"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='csv 或 xlsx 文件路径')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='每批写入的行数')
+
+    def handle(self, *args, **options):
+        path = options['path']
+
+        def progress(stats):
+            rate = stats['rows'] / stats['elapsed'] if stats['elapsed'] else 0
+            self.stdout.write(
+                f"已处理 {stats['rows']} 行 | 新增 {stats['created']} | 更新 {stats['updated']} | "
+                f"失败 {stats['failed']} | {rate:.0f} 行/秒"
+            )
+
+        try:
+            with open(path, 'rb') as f:
+                stats = import_persons(f, path, chunk_size=options['chunk_size'], progress=progress)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"导入完成: 共 {stats['rows']} 行，新增 {stats['created']}，更新 {stats['updated']}，"
+            f"失败 {stats['failed']}，待下载图片 {stats['downloads']}，耗时 {stats['elapsed']:.1f}s"
+        ))
+        for error in stats['errors']:
+            self.stdout.write(self.style.ERROR(f"  {error}"))
@@ -0,0 +1,56 @@
+import datetime
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import ScanEvent, ScanHourlyStat
+
+
+class Command(BaseCommand):
+    help = "按天分批清理过期的识别记录明细 (小时统计默认永久保留)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='明细保留天数，默认取 FACE_SCAN_RETENTION_DAYS')
+        parser.add_argument('--stats-days', type=int, default=None, help='小时统计保留天数，默认取 FACE_SCAN_STATS_RETENTION_DAYS (0 为永久)')
+        parser.add_argument('--batch', type=int, default=5000, help='每次删除的行数，避免长事务锁表')
+        parser.add_argument('--dry-run', action='store_true', help='只统计不删除')
+
+    def handle(self, *args, **options):
+        days = options['days'] or getattr(settings, 'FACE_SCAN_RETENTION_DAYS', 180)
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+        cutoff = today - datetime.timedelta(days=days)
+
+        oldest = ScanEvent.objects.order_by('scanned_at').values_list('scanned_at', flat=True).first()
+        total = 0
+        if oldest and oldest < cutoff:
+            # 按天推进，每天内按主键分批删除，每条 DELETE 都走 scanned_at 索引
+            day = datetime.datetime.combine(oldest.date(), datetime.time.min)
+            while day < cutoff:
+                day_end = min(day + datetime.timedelta(days=1), cutoff)
+                deleted = self._purge_range(day, day_end, options['batch'], options['dry_run'])
+                if deleted:
+                    self.stdout.write(f"{day:%Y-%m-%d}: {deleted} 条")
+                total += deleted
+                day = day_end
+
+        verb = "将删除" if options['dry_run'] else "已删除"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {cutoff:%Y-%m-%d} 之前的识别记录 {total} 条"))
+
+        stats_days = options['stats_days']
+        if stats_days is None:
+            stats_days = getattr(settings, 'FACE_SCAN_STATS_RETENTION_DAYS', 0)
+        if stats_days:
+            stats = ScanHourlyStat.objects.filter(hour__lt=today - datetime.timedelta(days=stats_days))
+            count = stats.count() if options['dry_run'] else stats.delete()[0]
+            self.stdout.write(self.style.SUCCESS(f"{verb} 小时统计 {count} 条"))
+
+    def _purge_range(self, start, end, batch, dry_run):
+        queryset = ScanEvent.objects.filter(scanned_at__gte=start, scanned_at__lt=end)
+        if dry_run:
+            return queryset.count()
+        deleted = 0
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:batch])
+            if not ids:
+                return deleted
+            ScanEvent.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
@@ -0,0 +1,96 @@
+import datetime
+import json
+from collections import Counter
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# 业务日志文件名: access.YYYY-MM-DD.jsonl (loguru 按天轮转)
+FILE_PREFIX = 'access.'
+FILE_SUFFIX = '.jsonl'
+GROUP_FIELDS = ('hour', 'day', 'user', 'ip', 'action', 'obj')
+
+
+def _parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"日期格式应为 YYYY-MM-DD: {value}")
+
+
+class Command(BaseCommand):
+    help = "查询业务日志 (JSON Lines)，支持按字段过滤和按小时/用户/动作等分组统计"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='开始日期 YYYY-MM-DD，默认今天')
+        parser.add_argument('--until', help='结束日期 YYYY-MM-DD (含)，默认同开始日期')
+        parser.add_argument('--action', help='动作，如 人脸识别、登录失败')
+        parser.add_argument('--user', help='操作用户')
+        parser.add_argument('--ip', help='客户端IP')
+        parser.add_argument('--request-id', help='请求ID')
+        parser.add_argument('--contains', help='详情中包含的文字')
+        parser.add_argument('--group-by', choices=GROUP_FIELDS, help='分组统计，不输出明细')
+        parser.add_argument('--limit', type=int, default=100, help='明细最多输出条数')
+        parser.add_argument('--log-dir', default=None, help='日志目录，默认取 LOG_ROOT')
+
+    def handle(self, *args, **options):
+        since = _parse_date(options['since']) if options['since'] else datetime.date.today()
+        until = _parse_date(options['until']) if options['until'] else since
+        if until < since:
+            raise CommandError("结束日期不能早于开始日期")
+
+        filters = {
+            field: options[key]
+            for field, key in (('action', 'action'), ('user', 'user'), ('ip', 'ip'), ('request_id', 'request_id'))
+            if options[key]
+        }
+        # 先做字符串预筛选，只有可能匹配的行才解析 JSON
+        needles = [json.dumps(v, ensure_ascii=False) for v in filters.values()]
+        if options['contains']:
+            needles.append(options['contains'])
+
+        group_by = options['group_by']
+        counts = Counter()
+        shown = 0
+        for path in self._files(Path(options['log_dir'] or settings.LOG_ROOT), since, until):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if not all(n in line for n in needles):
+                        continue
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if any(event.get(k) != v for k, v in filters.items()):
+                        continue
+                    if options['contains'] and options['contains'] not in event.get('detail', ''):
+                        continue
+
+                    if group_by:
+                        counts[self._group_key(event, group_by)] += 1
+                        continue
+                    self.stdout.write(line.rstrip('\n'))
+                    shown += 1
+                    if shown >= options['limit']:
+                        return
+
+        if group_by:
+            for key, count in sorted(counts.items()):
+                self.stdout.write(f"{key}\t{count}")
+            self.stdout.write(self.style.SUCCESS(f"合计 {sum(counts.values())} 条"))
+
+    def _files(self, log_dir, since, until):
+        day = since
+        while day <= until:
+            path = log_dir / f"{FILE_PREFIX}{day.isoformat()}{FILE_SUFFIX}"
+            if path.exists():
+                yield path
+            day += datetime.timedelta(days=1)
+
+    def _group_key(self, event, group_by):
+        ts = event.get('ts', '')
+        if group_by == 'hour':
+            return ts[:13].replace('T', ' ') + ':00'
+        if group_by == 'day':
+            return ts[:10]
+        return event.get(group_by) or '-'
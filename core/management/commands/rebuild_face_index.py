@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Person
+from core.face_index import get_embedder, get_index
+from core.log_utils import log_system_error
+
+
+class Command(BaseCommand):
+    help = "根据人员照片全量重建本地人脸特征索引"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='每批读取的人员数量')
+
+    def handle(self, *args, **options):
+        embedder = get_embedder()
+        failed = []
+
+        def items():
+            queryset = Person.objects.exclude(face_image='').order_by('pk').only('id_card', 'face_image')
+            for person in queryset.iterator(chunk_size=options['chunk_size']):
+                try:
+                    with person.face_image.open('rb') as f:
+                        yield person.id_card, embedder.embed(f.read())
+                except Exception as e:
+                    failed.append(person.id_card)
+                    log_system_error(f"本地索引读取照片失败 [{person.id_card}]: {e}")
+
+        count = get_index().rebuild(items())
+        self.stdout.write(self.style.SUCCESS(f"索引重建完成: {count} 人，失败 {len(failed)} 人"))
@@ -0,0 +1,206 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core.tasks import face_sync_queue, handle_face_sync
+from core.importers import import_queue, run_import_job
+from core.services import BaiduService, ImageDownloadService, DownloadError, HostBusy
+from core.log_utils import log_system_error
+from core import metrics
+from core.scans import flush_scan_buffer, rollup_hours, recent_hours
+
+
+class Command(BaseCommand):
+    help = "后台任务进程：消费 Redis 队列中的人脸同步、图片下载和流式导入任务"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', default='sync,download,scans,imports', help='要消费的队列，逗号分隔 (sync, download, scans, imports)')
+        parser.add_argument('--batch', type=int, default=10, help='人脸同步每次领取的任务数')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='队列为空时的轮询间隔(秒)')
+        parser.add_argument('--download-concurrency', type=int, default=None, help='并发下载数，默认取 FACE_DOWNLOAD_CONCURRENCY')
+
+    def handle(self, *args, **options):
+        self._stop = threading.Event()
+        signal.signal(signal.SIGTERM, self._on_signal)
+        signal.signal(signal.SIGINT, self._on_signal)
+
+        queues = {q.strip() for q in options['queues'].split(',') if q.strip()}
+        # 提前刷新共享的百度 access_token，web 进程的识别请求无需等待 token 获取
+        consumers = [threading.Thread(target=self._run_token_refresh, name='token-refresh')]
+        if 'sync' in queues:
+            consumers.append(threading.Thread(target=self._run_sync, args=(options,), name='face-sync'))
+        if 'download' in queues:
+            consumers.append(threading.Thread(target=self._run_download, args=(options,), name='image-download'))
+        if 'scans' in queues:
+            consumers.append(threading.Thread(target=self._run_scans, name='scan-events'))
+        if 'imports' in queues:
+            consumers.append(threading.Thread(target=self._run_imports, args=(options,), name='person-import'))
+
+        for t in consumers:
+            t.start()
+        self.stdout.write(self.style.SUCCESS(f"worker 已启动，队列: {', '.join(sorted(queues))}"))
+        while not self._stop.is_set():
+            self._stop.wait(1)
+        for t in consumers:
+            t.join()
+        self.stdout.write("worker 已退出")
+
+    def _on_signal(self, signum, frame):
+        self._stop.set()
+
+    # ==================== 百度 Token ====================
+    def _run_token_refresh(self):
+        interval = getattr(settings, 'FACE_TOKEN_CHECK_INTERVAL', 300)
+        while not self._stop.is_set():
+            try:
+                if not BaiduService.refresh_token():
+                    log_system_error("百度 Token 刷新失败，稍后重试")
+            except Exception as e:
+                log_system_error(f"百度 Token 刷新异常: {e}")
+            self._stop.wait(interval)
+
+    # ==================== 识别记录 ====================
+    def _run_scans(self):
+        interval = getattr(settings, 'FACE_SCAN_FLUSH_INTERVAL', 2)
+        rollup_interval = getattr(settings, 'FACE_SCAN_ROLLUP_INTERVAL', 60)
+        dirty_hours = set()
+        last_rollup = 0
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                # 积压较多时连续批量插入，直到缓冲区取空
+                while not self._stop.is_set():
+                    count, hours = flush_scan_buffer()
+                    dirty_hours |= hours
+                    if count < 1000:
+                        break
+                if time.monotonic() - last_rollup >= rollup_interval:
+                    rollup_hours(dirty_hours | recent_hours())
+                    dirty_hours.clear()
+                    last_rollup = time.monotonic()
+            except Exception as e:
+                log_system_error(f"识别记录写入失败: {e}")
+                self._stop.wait(5)
+            self._stop.wait(interval)
+        connection.close()
+
+    # ==================== 流式导入 ====================
+    def _run_imports(self, options):
+        # 一次只执行一个导入，执行期间由 run_import_job 续租；退出信号在当前导入结束后生效
+        while not self._stop.is_set():
+            try:
+                import_queue.requeue_stale()
+                keys = import_queue.claim(1)
+            except Exception as e:
+                log_system_error(f"导入队列读取失败: {e}")
+                self._stop.wait(5)
+                continue
+
+            if not keys:
+                self._stop.wait(options['poll_interval'])
+                continue
+
+            close_old_connections()
+            try:
+                run_import_job(keys[0])
+            except Exception as e:
+                log_system_error(f"流式导入任务异常 [{keys[0]}]: {e}")
+            import_queue.ack(keys[0])
+        connection.close()
+
+    # ==================== 人脸同步 ====================
+    def _run_sync(self, options):
+        while not self._stop.is_set():
+            try:
+                face_sync_queue.requeue_stale()
+                keys = face_sync_queue.claim(options['batch'])
+            except Exception as e:
+                log_system_error(f"任务队列读取失败: {e}")
+                self._stop.wait(5)
+                continue
+
+            if not keys:
+                self._stop.wait(options['poll_interval'])
+                continue
+
+            close_old_connections()
+            # 百度调用由 BaiduService 按后台优先级共享限流，这里无需再限速
+            for key in keys:
+                self._process_sync(key)
+        connection.close()
+
+    def _process_sync(self, key):
+        try:
+            ok, msg = handle_face_sync(key)
+        except Exception as e:
+            ok, msg = False, str(e)
+
+        if ok:
+            face_sync_queue.ack(key)
+        elif not face_sync_queue.retry(key, msg):
+            log_system_error(f"人脸同步多次失败，已转入死信 [{key}]: {msg}")
+
+    # ==================== 图片下载 ====================
+    def _run_download(self, options):
+        queue = ImageDownloadService.queue
+        concurrency = options['download_concurrency'] or getattr(settings, 'FACE_DOWNLOAD_CONCURRENCY', 8)
+        inflight = threading.Semaphore(concurrency)
+
+        def run(key):
+            try:
+                self._process_download(key)
+            finally:
+                inflight.release()
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='download') as executor:
+            while not self._stop.is_set():
+                # 只领取空闲线程能处理的数量，其余任务留在 Redis 中
+                if not inflight.acquire(timeout=1):
+                    continue
+                try:
+                    queue.requeue_stale()
+                    keys = queue.claim(1)
+                except Exception as e:
+                    inflight.release()
+                    log_system_error(f"下载队列读取失败: {e}")
+                    self._stop.wait(5)
+                    continue
+                if not keys:
+                    inflight.release()
+                    self._stop.wait(options['poll_interval'])
+                    continue
+                executor.submit(run, keys[0])
+
+    def _process_download(self, key):
+        queue = ImageDownloadService.queue
+        close_old_connections()
+        started = time.perf_counter()
+        try:
+            msg = ImageDownloadService.download(int(key))
+        except HostBusy:
+            queue.release(key, delay=1)
+            return
+        except DownloadError as e:
+            self._download_done(started, 'failed')
+            if not e.retryable:
+                queue.fail(key, str(e))
+                log_system_error(str(e))
+            elif not queue.retry(key, str(e)):
+                log_system_error(f"图片下载多次失败，已转入死信 [{key}]: {e}")
+            return
+        except Exception as e:
+            self._download_done(started, 'failed')
+            if not queue.retry(key, str(e)):
+                log_system_error(f"图片下载多次失败，已转入死信 [{key}]: {e}")
+            return
+
+        self._download_done(started, 'not_modified' if msg == "源图片未变化" else 'success')
+        queue.ack(key)
+
+    def _download_done(self, started, result):
+        metrics.incr(f'download_{result}')
+        metrics.observe('download_seconds', time.perf_counter() - started, result=result)
@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Person
+from core.tasks import run_face_sync
+from core.ratelimit import RateLimiter
+
+
+class Command(BaseCommand):
+    help = "批量同步人员档案到百度人脸库 (分块读取 + 并发 + 限流 + 断点续传)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='每批读取的人员数量')
+        parser.add_argument('--workers', type=int, default=4, help='并发线程数')
+        parser.add_argument('--qps', type=float, default=None, help='本进程额外的每秒请求上限 (所有进程共享的百度限流始终生效)')
+        parser.add_argument('--checkpoint', default=None, help='断点文件路径')
+        parser.add_argument('--reset', action='store_true', help='忽略已有断点，从头开始')
+        parser.add_argument('--dirty-only', action='store_true', help='只同步照片或姓名有变化的人员')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        qps = options['qps']
+        checkpoint = Path(options['checkpoint'] or Path(settings.LOG_ROOT) / 'sync_faces.checkpoint')
+
+        last_pk = 0
+        if checkpoint.exists() and not options['reset']:
+            last_pk = int(checkpoint.read_text().strip() or 0)
+            self.stdout.write(f"从断点继续: id > {last_pk}")
+
+        queryset = Person.objects.filter(pk__gt=last_pk).exclude(face_image='').order_by('pk')
+        if options['dirty_only']:
+            queryset = queryset.sync_dirty()
+        total = queryset.count()
+        limit_note = f"，本进程限速 {qps} QPS" if qps else ""
+        self.stdout.write(f"待同步 {total} 人，并发 {options['workers']}{limit_note} (百度接口按后台优先级共享限流)")
+
+        limiter = RateLimiter(qps) if qps else None
+        success, failures = 0, []
+        done = 0
+        started = time.monotonic()
+
+        def sync_one(person):
+            if limiter:
+                limiter.acquire()
+            # 线程池中的线程各自复用一条数据库连接，用于回写同步状态
+            return person, run_face_sync(person)
+
+        rows = queryset.only('pk', 'name', 'id_card', 'face_image', 'face_hash').iterator(chunk_size=chunk_size)
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            chunk = []
+            for person in rows:
+                chunk.append(person)
+                if len(chunk) < chunk_size:
+                    continue
+                success, done = self._run_chunk(executor, sync_one, chunk, failures, success, done)
+                self._save_checkpoint(checkpoint, chunk[-1].pk)
+                self._report(done, total, success, started)
+                chunk = []
+            if chunk:
+                success, done = self._run_chunk(executor, sync_one, chunk, failures, success, done)
+                self._save_checkpoint(checkpoint, chunk[-1].pk)
+                self._report(done, total, success, started)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"同步完成: 共 {done} 人，成功 {success}，失败 {len(failures)}，耗时 {elapsed:.1f}s"
+        ))
+        for id_card, name, msg in failures:
+            self.stdout.write(self.style.ERROR(f"  失败 {name} ({id_card}): {msg}"))
+        # 全部跑完后清除断点，失败的人员可直接重新执行命令补同步
+        checkpoint.unlink(missing_ok=True)
+
+    def _run_chunk(self, executor, sync_one, chunk, failures, success, done):
+        # 按块等待全部完成后再推进断点，保证断点之前的记录都已处理
+        for person, (ok, msg) in executor.map(sync_one, chunk):
+            done += 1
+            if ok:
+                success += 1
+            else:
+                failures.append((person.id_card, person.name, msg))
+        return success, done
+
+    def _save_checkpoint(self, checkpoint, pk):
+        checkpoint.parent.mkdir(parents=True, exist_ok=True)
+        checkpoint.write_text(str(pk))
+
+    def _report(self, done, total, success, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        rate = done / elapsed
+        eta = (total - done) / rate if rate else 0
+        self.stdout.write(
+            f"进度 {done}/{total} | 成功 {success} | {rate:.1f} 人/秒 | 预计剩余 {eta:.0f}s"
+        )
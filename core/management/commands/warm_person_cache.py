@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Person
+from core.cache import PersonProfileCache
+
+
+class Command(BaseCommand):
+    help = "批量预热人员资料缓存 (识别结果展示所需的姓名/班级/类型/照片)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='每批写入缓存的人员数量')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        queryset = Person.objects.order_by('pk').only('name', 'class_name', 'user_type', 'id_card', 'face_image')
+        total, chunk = 0, []
+        for person in queryset.iterator(chunk_size=chunk_size):
+            chunk.append(person)
+            if len(chunk) >= chunk_size:
+                total += PersonProfileCache.set_many(chunk)
+                chunk = []
+        if chunk:
+            total += PersonProfileCache.set_many(chunk)
+        self.stdout.write(self.style.SUCCESS(f"人员资料缓存预热完成: {total} 人"))
@@ -0,0 +1,133 @@
+import time
+from contextlib import contextmanager
+from django_redis import get_redis_connection
+
+# =========================================================
+# 运行指标 (Redis 计数器/直方图，多个 gunicorn worker 共享)
+# =========================================================
+# 所有进程直接累加到同一组 Redis HASH，抓取时汇总即为全局数据，无需按进程合并。
+#   metrics:counters    字段 "名称" 或 "名称\t标签"  -> 累计值
+#   metrics:histograms  字段 "名称\t标签\t上界"      -> 该区间的样本数 (非累计)，另有 sum/count 两个字段
+# 标签按 Prometheus 格式保存，如 endpoint="search",result="ok"
+COUNTERS_KEY = 'metrics:counters'
+HISTOGRAMS_KEY = 'metrics:histograms'
+METRIC_PREFIX = 'face_'
+
+# 所有直方图统一为耗时(秒)，使用同一组区间
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return ','.join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items()))
+
+
+def _field(name, labels):
+    return f"{name}\t{_labels(labels)}" if labels else name
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+def incr(name, amount=1, **labels):
+    """计数器自增；指标写入失败不影响业务"""
+    try:
+        get_redis_connection('default').hincrby(COUNTERS_KEY, _field(name, labels), amount)
+    except Exception:
+        pass
+
+
+def observe(name, seconds, **labels):
+    """记录一次耗时样本"""
+    le = next((b for b in LATENCY_BUCKETS if seconds <= b), '+Inf')
+    prefix = f"{name}\t{_labels(labels)}\t"
+    try:
+        pipe = get_redis_connection('default').pipeline(transaction=False)
+        pipe.hincrby(HISTOGRAMS_KEY, f"{prefix}{le}", 1)
+        pipe.hincrbyfloat(HISTOGRAMS_KEY, f"{prefix}sum", seconds)
+        pipe.hincrby(HISTOGRAMS_KEY, f"{prefix}count", 1)
+        pipe.execute()
+    except Exception:
+        pass
+
+
+@contextmanager
+def timer(name, **labels):
+    """with metrics.timer('xxx_seconds', endpoint='search'): ..."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def get_counters():
+    raw = get_redis_connection('default').hgetall(COUNTERS_KEY)
+    return {_decode(k): int(v) for k, v in raw.items()}
+
+
+# =========================================================
+# Prometheus 文本格式导出
+# =========================================================
+def _series(name, labels):
+    return f"{name}{{{labels}}}" if labels else name
+
+
+def _render_counters(lines, counters):
+    grouped = {}
+    for field, value in counters.items():
+        name, _, labels = field.partition('\t')
+        grouped.setdefault(name, []).append((labels, value))
+    for name in sorted(grouped):
+        metric = f"{METRIC_PREFIX}{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for labels, value in sorted(grouped[name]):
+            lines.append(f"{_series(metric, labels)} {value}")
+
+
+def _render_histograms(lines, raw):
+    grouped = {}
+    for field, value in raw.items():
+        name, labels, le = _decode(field).split('\t')
+        grouped.setdefault(name, {}).setdefault(labels, {})[le] = float(value)
+    for name in sorted(grouped):
+        metric = f"{METRIC_PREFIX}{name}"
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, values in sorted(grouped[name].items()):
+            sep = ',' if labels else ''
+            cumulative = 0
+            for le in LATENCY_BUCKETS:
+                cumulative += values.get(str(le), 0)
+                lines.append(f'{metric}_bucket{{{labels}{sep}le="{le}"}} {int(cumulative)}')
+            lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {int(values.get("count", 0))}')
+            lines.append(f"{_series(metric + '_sum', labels)} {values.get('sum', 0):.6f}")
+            lines.append(f"{_series(metric + '_count', labels)} {int(values.get('count', 0))}")
+
+
+def render_prometheus(gauges=()):
+    """
+    导出全部指标 (Prometheus text format 0.0.4)
+    gauges: 抓取时现场计算的瞬时值 [(名称, {标签}, 值), ...]，如队列积压
+    """
+    r = get_redis_connection('default')
+    pipe = r.pipeline(transaction=False)
+    pipe.hgetall(COUNTERS_KEY)
+    pipe.hgetall(HISTOGRAMS_KEY)
+    counters, histograms = pipe.execute()
+
+    lines = []
+    _render_counters(lines, {_decode(k): int(v) for k, v in counters.items()})
+    _render_histograms(lines, histograms)
+
+    declared = set()
+    for name, labels, value in gauges:
+        metric = f"{METRIC_PREFIX}{name}"
+        if metric not in declared:
+            lines.append(f"# TYPE {metric} gauge")
+            declared.add(metric)
+        lines.append(f"{_series(metric, _labels(labels))} {value}")
+    return '\n'.join(lines) + '\n'
@@ -1,6 +1,24 @@
+import cProfile
+import datetime
+import random
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as _AuthenticationMiddleware
+from django.contrib.messages.middleware import MessageMiddleware as _MessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as _SessionMiddleware
 from django.utils.deprecation import MiddlewareMixin
+from auditlog.middleware import AuditlogMiddleware as _AuditlogMiddleware
+from loguru import logger
 from .utils import get_client_ip
-from .log_utils import log_business
+from .log_utils import log_business, log_system_error, request_id_var, request_started_var
+from .timing import RequestTimings, timings_var
+from .devices import is_device_api
+from . import metrics
 
 class RealIPMiddleware(MiddlewareMixin):
     """
@@ -29,25 +47,185 @@ class RealIPMiddleware(MiddlewareMixin):
             request.META['REMOTE_ADDR'] = real_ip
             request.META['HTTP_X_REAL_IP'] = real_ip
 
+class RequestContextMiddleware(MiddlewareMixin):
+    """
+    为每个请求分配请求ID (沿用 Nginx/客户端传入的 X-Request-ID)，写入业务日志并通过响应头返回，
+    便于把一次识别的前端、Nginx、业务日志串起来
+    """
+    VALID_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+    def process_request(self, request):
+        request_id = request.META.get('HTTP_X_REQUEST_ID', '')
+        if not self.VALID_ID.match(request_id):
+            request_id = uuid.uuid4().hex
+        request.request_id = request_id
+        # 不在响应后重置：流式导出在响应返回后才写日志，下一个请求会重新设置
+        request_id_var.set(request_id)
+        request_started_var.set(time.perf_counter())
+
+    def process_response(self, request, response):
+        request_id = getattr(request, 'request_id', None)
+        if request_id:
+            response['X-Request-ID'] = request_id
+        return response
+
+
+# cProfile 在 Python 3.12+ 为解释器级别，同一时间只能有一个 profiler 启用，多线程服务下抽样请求需互斥
+_profile_lock = threading.Lock()
+
+
+class RequestTimingMiddleware(MiddlewareMixin):
+    """
+    请求分阶段计时：总耗时、数据库(次数/耗时)、对外 HTTP、Redis 以及视图自行标记的阶段
+    1. 响应头 Server-Timing (浏览器开发者工具 Timing 面板可直接查看)
+    2. 超过 FACE_SLOW_REQUEST_MS 的请求写入慢请求日志
+    3. 按 FACE_PROFILE_SAMPLE_RATE 抽样开启 cProfile，结果为慢请求时保存 .prof 文件
+    """
+    def process_request(self, request):
+        timings = RequestTimings()
+        request._timings = timings
+        timings_var.set(timings)
+
+        request._profiler = None
+        rate = getattr(settings, 'FACE_PROFILE_SAMPLE_RATE', 0)
+        # cProfile 只能统计当前线程，异步模式下不抽样
+        # 已有请求在抽样时跳过本次，不排队等待
+        if rate and not iscoroutinefunction(self) and random.random() < rate and _profile_lock.acquire(blocking=False):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 其他工具 (如调试器/外部 profiler) 已占用
+                _profile_lock.release()
+            else:
+                request._profiler = profiler
+
+    def process_response(self, request, response):
+        timings = getattr(request, '_timings', None)
+        if timings is None:
+            return response
+        profiler = getattr(request, '_profiler', None)
+        if profiler:
+            profiler.disable()
+            _profile_lock.release()
+
+        total = timings.elapsed()
+        phases = dict(timings.phases)
+        other = total - sum(phases.values())
+        if getattr(settings, 'FACE_SERVER_TIMING', True):
+            response['Server-Timing'] = self._server_timing(timings, total, other)
+
+        if total * 1000 >= getattr(settings, 'FACE_SLOW_REQUEST_MS', 1000):
+            metrics.incr('slow_requests')
+            breakdown = ' '.join(
+                f"{name}={seconds * 1000:.0f}ms/{timings.counts[name]}" for name, seconds in sorted(phases.items())
+            )
+            logger.warning(
+                f"慢请求 {request.method} {request.path} {response.status_code} "
+                f"total={total * 1000:.0f}ms {breakdown} app={other * 1000:.0f}ms "
+                f"request_id={getattr(request, 'request_id', '-')}"
+            )
+            if profiler:
+                self._dump_profile(request, profiler)
+        return response
+
+    def _server_timing(self, timings, total, other):
+        parts = [
+            f'{name};dur={seconds * 1000:.1f};desc="{timings.counts[name]}x"'
+            for name, seconds in sorted(timings.phases.items())
+        ]
+        parts.append(f'app;dur={max(other, 0) * 1000:.1f}')
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+    def _dump_profile(self, request, profiler):
+        try:
+            directory = Path(settings.LOG_ROOT) / 'profiles'
+            directory.mkdir(parents=True, exist_ok=True)
+            name = request.path.strip('/').replace('/', '_') or 'root'
+            stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+            path = directory / f"{stamp}_{name}_{getattr(request, 'request_id', '')}.prof"
+            profiler.dump_stats(str(path))
+            # 只保留最近的若干个文件
+            files = sorted(directory.glob('*.prof'))
+            for old in files[:-getattr(settings, 'FACE_PROFILE_MAX_FILES', 200)]:
+                old.unlink(missing_ok=True)
+            logger.warning(f"慢请求 profile 已保存: {path} (python -m pstats 查看)")
+        except Exception as e:
+            log_system_error(f"保存 profile 失败: {e}")
+
+
+class DeviceAPIBypassMixin:
+    """
+    设备接口 (FACE_DEVICE_API_PREFIX) 跳过该中间件：
+    由 device_key_required 按密钥认证，不读写会话，也不做审计/消息处理
+    """
+    def __call__(self, request):
+        if is_device_api(request):
+            return self.get_response(request)
+        return super().__call__(request)
+
+
+class SessionMiddleware(DeviceAPIBypassMixin, _SessionMiddleware):
+    pass
+
+
+class AuthenticationMiddleware(DeviceAPIBypassMixin, _AuthenticationMiddleware):
+    pass
+
+
+class AuditlogMiddleware(DeviceAPIBypassMixin, _AuditlogMiddleware):
+    pass
+
+
+class MessageMiddleware(DeviceAPIBypassMixin, _MessageMiddleware):
+    pass
+
+
 class ExportAuditMiddleware(MiddlewareMixin):
     """
-    拦截导出操作并记录到 access.log
+    拦截导出操作并记录到业务日志 (access.jsonl)
+    1. import-export 原生导出 (POST .../export/)：响应生成后立即记录
+    2. 流式导出 (GET .../export/stream/)：数据全部发送完毕后记录行数和耗时
     """
+    def process_request(self, request):
+        request._export_started = time.monotonic()
+
     def process_response(self, request, response):
-        if request.method == 'POST' and '/export/' in request.path and response.status_code == 200:
-            if request.user.is_authenticated:
-                # 不再解析格式，简化逻辑
-                resource = "未知数据"
-                if 'person' in request.path:
-                    resource = "人员档案"
-                elif 'user' in request.path:
-                    resource = "用户列表"
-                
-                log_business(
-                    user=request.user,
-                    ip=get_client_ip(request),
-                    action="数据导出",
-                    obj=resource,
-                    detail="成功执行导出操作"
-                )
-        return response
\ No newline at end of file
+        if '/export/' not in request.path or response.status_code != 200:
+            return response
+        if not request.user.is_authenticated:
+            return response
+
+        export_stats = getattr(response, 'export_stats', None)
+        if export_stats is not None and response.streaming:
+            response.streaming_content = self._audit_stream(request, response.streaming_content, export_stats)
+        elif request.method == 'POST':
+            self._log(request, None)
+        return response
+
+    def _audit_stream(self, request, content, export_stats):
+        yield from content
+        self._log(request, export_stats['rows'])
+
+    def _log(self, request, rows):
+        # 不再解析格式，简化逻辑
+        resource = "未知数据"
+        if 'person' in request.path:
+            resource = "人员档案"
+        elif 'user' in request.path:
+            resource = "用户列表"
+
+        duration = time.monotonic() - getattr(request, '_export_started', time.monotonic())
+        detail = "成功执行导出操作"
+        if rows is not None:
+            detail += f"，共{rows}行"
+        detail += f"，耗时{duration:.2f}s"
+
+        log_business(
+            user=request.user,
+            ip=get_client_ip(request),
+            action="数据导出",
+            obj=resource,
+            detail=detail
+        )
@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='sync_status',
+            field=models.CharField(choices=[('pending', '待同步'), ('synced', '已同步'), ('failed', '同步失败')], default='pending', max_length=20, verbose_name='同步状态'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='sync_message',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='同步信息'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='sync_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='同步时间'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_person_sync_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='source_etag',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='源图片ETag'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='source_last_modified',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='源图片修改时间'),
+        ),
+    ]
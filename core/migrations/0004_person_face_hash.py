@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_person_source_validators'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='face_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='照片哈希'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='synced_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='已同步照片哈希'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='synced_user_info',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='已同步姓名'),
+        ),
+        migrations.AddField(
+            model_name='person',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最近成功同步'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_person_face_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_card', models.CharField(blank=True, default='', max_length=20, verbose_name='身份证号')),
+                ('score', models.FloatField(blank=True, null=True, verbose_name='匹配度')),
+                ('operator', models.CharField(blank=True, default='', max_length=150, verbose_name='操作人')),
+                ('ip', models.CharField(blank=True, default='', max_length=45, verbose_name='IP')),
+                ('scanned_at', models.DateTimeField(verbose_name='识别时间')),
+                ('latency_ms', models.PositiveIntegerField(blank=True, null=True, verbose_name='耗时(ms)')),
+                ('outcome', models.CharField(choices=[('match', '识别成功'), ('no_match', '无匹配'), ('busy', '服务繁忙')], max_length=16, verbose_name='结果')),
+                ('cached', models.BooleanField(default=False, verbose_name='命中缓存')),
+                ('person', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='scan_events', to='core.person', verbose_name='人员')),
+            ],
+            options={
+                'verbose_name': '识别记录',
+                'verbose_name_plural': '识别记录',
+                'ordering': ['-scanned_at'],
+                'indexes': [
+                    models.Index(fields=['scanned_at', 'outcome'], name='scan_time_outcome_idx'),
+                    models.Index(fields=['person', 'scanned_at'], name='scan_person_time_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='ScanHourlyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='小时')),
+                ('outcome', models.CharField(choices=[('match', '识别成功'), ('no_match', '无匹配'), ('busy', '服务繁忙')], max_length=16, verbose_name='结果')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='次数')),
+                ('persons', models.PositiveIntegerField(default=0, verbose_name='人数')),
+                ('total_latency_ms', models.BigIntegerField(default=0, verbose_name='总耗时(ms)')),
+            ],
+            options={
+                'verbose_name': '识别小时统计',
+                'verbose_name_plural': '识别小时统计',
+                'ordering': ['-hour'],
+                'constraints': [
+                    models.UniqueConstraint(fields=('hour', 'outcome'), name='scan_hourly_unique'),
+                ],
+            },
+        ),
+    ]
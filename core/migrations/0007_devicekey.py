@@ -0,0 +1,33 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_person_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeviceKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='设备名称')),
+                ('key_prefix', models.CharField(editable=False, max_length=8, verbose_name='密钥前缀')),
+                ('key_hash', models.CharField(editable=False, max_length=64, unique=True, verbose_name='密钥哈希')),
+                ('is_active', models.BooleanField(default=True, verbose_name='启用')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('last_used_at', models.DateTimeField(blank=True, null=True, verbose_name='最近使用')),
+                ('last_used_ip', models.CharField(blank=True, default='', max_length=45, verbose_name='最近使用IP')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='device_keys', to=settings.AUTH_USER_MODEL, verbose_name='归属用户')),
+            ],
+            options={
+                'verbose_name': '设备密钥',
+                'verbose_name_plural': '设备密钥',
+                'ordering': ['name'],
+            },
+        ),
+    ]
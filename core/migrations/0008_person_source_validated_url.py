@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_devicekey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='person',
+            name='source_validated_url',
+            field=models.CharField(blank=True, default='', max_length=500, verbose_name='校验信息对应URL'),
+        ),
+    ]
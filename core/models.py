@@ -1,3 +1,5 @@
+import hashlib
+import secrets
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
@@ -11,27 +13,167 @@ class User(AbstractUser):
         verbose_name = "系统用户"
         verbose_name_plural = verbose_name
 
+class PersonQuerySet(models.QuerySet):
+    def sync_dirty(self):
+        """照片或百度 user_info(姓名) 自上次成功同步后发生变化的人员"""
+        return self.exclude(face_image='').filter(
+            models.Q(face_hash='')
+            | ~models.Q(synced_hash=models.F('face_hash'))
+            | ~models.Q(synced_user_info=models.F('name'))
+        )
+
+
 class Person(models.Model):
+    SYNC_PENDING = 'pending'
+    SYNC_SUCCESS = 'synced'
+    SYNC_FAILED = 'failed'
+    SYNC_STATUS_CHOICES = (
+        (SYNC_PENDING, '待同步'),
+        (SYNC_SUCCESS, '已同步'),
+        (SYNC_FAILED, '同步失败'),
+    )
+
     name = models.CharField("姓名", max_length=50)
     class_name = models.CharField("班级", max_length=50, blank=True, null=True, default="")
     user_type = models.CharField("用户类型", max_length=50, blank=True, null=True, default="")
     id_card = models.CharField("身份证号", max_length=20, unique=True)
     face_image = models.ImageField("人脸照片", upload_to=face_upload_to, max_length=255)
     source_image_url = models.CharField("源图片URL", max_length=500, blank=True, default="")
+    source_etag = models.CharField("源图片ETag", max_length=255, blank=True, default="")
+    source_last_modified = models.CharField("源图片修改时间", max_length=64, blank=True, default="")
+    # ETag/修改时间所属的 URL，源图片URL 变更后不再发送条件请求
+    source_validated_url = models.CharField("校验信息对应URL", max_length=500, blank=True, default="")
+    sync_status = models.CharField("同步状态", max_length=20, choices=SYNC_STATUS_CHOICES, default=SYNC_PENDING)
+    sync_message = models.CharField("同步信息", max_length=255, blank=True, default="")
+    sync_time = models.DateTimeField("同步时间", blank=True, null=True)
+    face_hash = models.CharField("照片哈希", max_length=64, blank=True, default="")
+    synced_hash = models.CharField("已同步照片哈希", max_length=64, blank=True, default="")
+    synced_user_info = models.CharField("已同步姓名", max_length=50, blank=True, default="")
+    synced_at = models.DateTimeField("最近成功同步", blank=True, null=True)
     create_time = models.DateTimeField("创建时间", auto_now_add=True)
     update_time = models.DateTimeField("更新时间", auto_now=True)
 
+    objects = PersonQuerySet.as_manager()
+
     class Meta:
         verbose_name = "人员档案"
         verbose_name_plural = verbose_name
         ordering = ['-create_time']
+        # 后台列表按创建时间倒序分页，并按用户类型/班级/同步状态筛选；姓名搜索为前缀匹配
+        indexes = [
+            models.Index(fields=['-create_time'], name='person_create_idx'),
+            models.Index(fields=['user_type', '-create_time'], name='person_type_create_idx'),
+            models.Index(fields=['class_name', '-create_time'], name='person_class_create_idx'),
+            models.Index(fields=['sync_status', '-create_time'], name='person_sync_create_idx'),
+            models.Index(fields=['name'], name='person_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.id_card})"
 
+    @property
+    def needs_face_sync(self):
+        """照片或姓名与百度人脸库中的版本不一致 (照片哈希未知时视为需要同步)"""
+        if not self.face_image:
+            return False
+        return not self.face_hash or self.synced_hash != self.face_hash or self.synced_user_info != self.name
+
 class FaceScan(Person):
     """用于后台菜单显示的代理模型"""
     class Meta:
         proxy = True
         verbose_name = '人脸识别'
         verbose_name_plural = '人脸识别'
+
+
+class ScanEvent(models.Model):
+    """识别记录 (由 run_face_worker 从 Redis 缓冲区批量写入)"""
+    OUTCOME_MATCH = 'match'
+    OUTCOME_NO_MATCH = 'no_match'
+    OUTCOME_BUSY = 'busy'
+    OUTCOME_CHOICES = (
+        (OUTCOME_MATCH, '识别成功'),
+        (OUTCOME_NO_MATCH, '无匹配'),
+        (OUTCOME_BUSY, '服务繁忙'),
+    )
+
+    person = models.ForeignKey(
+        Person, verbose_name="人员", on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='scan_events', db_constraint=False,
+    )
+    id_card = models.CharField("身份证号", max_length=20, blank=True, default="")
+    score = models.FloatField("匹配度", null=True, blank=True)
+    operator = models.CharField("操作人", max_length=150, blank=True, default="")
+    ip = models.CharField("IP", max_length=45, blank=True, default="")
+    scanned_at = models.DateTimeField("识别时间")
+    latency_ms = models.PositiveIntegerField("耗时(ms)", null=True, blank=True)
+    outcome = models.CharField("结果", max_length=16, choices=OUTCOME_CHOICES)
+    cached = models.BooleanField("命中缓存", default=False)
+
+    class Meta:
+        verbose_name = "识别记录"
+        verbose_name_plural = verbose_name
+        ordering = ['-scanned_at']
+        indexes = [
+            # 按时间段统计/清理
+            models.Index(fields=['scanned_at', 'outcome'], name='scan_time_outcome_idx'),
+            # 某人的识别历史 (考勤)
+            models.Index(fields=['person', 'scanned_at'], name='scan_person_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.id_card or '未知'} @ {self.scanned_at:%Y-%m-%d %H:%M:%S}"
+
+
+class ScanHourlyStat(models.Model):
+    """按小时预聚合的识别统计，看板直接读取，明细清理后仍保留"""
+    hour = models.DateTimeField("小时")
+    outcome = models.CharField("结果", max_length=16, choices=ScanEvent.OUTCOME_CHOICES)
+    count = models.PositiveIntegerField("次数", default=0)
+    persons = models.PositiveIntegerField("人数", default=0)
+    total_latency_ms = models.BigIntegerField("总耗时(ms)", default=0)
+
+    class Meta:
+        verbose_name = "识别小时统计"
+        verbose_name_plural = verbose_name
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'outcome'], name='scan_hourly_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}:00 {self.get_outcome_display()} {self.count}"
+
+
+class DeviceKey(models.Model):
+    """
+    闸机/自助终端的接口密钥，识别记录和业务日志归属到绑定的系统用户
+    只保存密钥的 SHA-256，明文仅在创建或重置时显示一次
+    """
+    name = models.CharField("设备名称", max_length=100)
+    user = models.ForeignKey(User, verbose_name="归属用户", on_delete=models.CASCADE, related_name='device_keys')
+    key_prefix = models.CharField("密钥前缀", max_length=8, editable=False)
+    key_hash = models.CharField("密钥哈希", max_length=64, unique=True, editable=False)
+    is_active = models.BooleanField("启用", default=True)
+    created_at = models.DateTimeField("创建时间", auto_now_add=True)
+    last_used_at = models.DateTimeField("最近使用", null=True, blank=True)
+    last_used_ip = models.CharField("最近使用IP", max_length=45, blank=True, default="")
+
+    class Meta:
+        verbose_name = "设备密钥"
+        verbose_name_plural = verbose_name
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.key_prefix}…)"
+
+    @staticmethod
+    def hash_key(key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    def generate_key(self):
+        """生成新密钥并返回明文 (需随后 save)"""
+        key = secrets.token_urlsafe(32)
+        self.key_prefix = key[:8]
+        self.key_hash = self.hash_key(key)
+        return key
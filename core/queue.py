@@ -0,0 +1,155 @@
+import json
+import time
+from django_redis import get_redis_connection
+
+# =========================================================
+# Redis 持久化任务队列
+# =========================================================
+# 结构 (以 name=face_sync 为例):
+#   queue:face_sync:pending     ZSET  成员=任务键(如身份证号)，分值=可执行时间戳。ZADD NX 实现去重
+#   queue:face_sync:processing  ZSET  已被 worker 领取的任务，分值=租约到期时间 (worker 崩溃后自动回收)
+#   queue:face_sync:attempts    HASH  任务已失败次数
+#   queue:face_sync:dead        LIST  超过最大重试次数的任务 (死信)
+
+# 原子领取到期任务并放入 processing
+_CLAIM_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, item in ipairs(items) do
+    redis.call('ZREM', KEYS[1], item)
+    redis.call('ZADD', KEYS[2], ARGV[3], item)
+end
+return items
+"""
+
+# 回收租约过期的任务
+_REQUEUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, item in ipairs(items) do
+    redis.call('ZREM', KEYS[2], item)
+    redis.call('ZADD', KEYS[1], 'NX', ARGV[1], item)
+end
+return #items
+"""
+
+
+class QueueFull(Exception):
+    """队列积压超过上限"""
+
+
+def _decode(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class RedisJobQueue:
+    DEAD_LETTER_LIMIT = 1000
+
+    def __init__(self, name, max_attempts=5, backoff=10, backoff_max=1800, lease=300, max_pending=None):
+        self.name = name
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.lease = lease
+        self.pending_key = f"queue:{name}:pending"
+        self.processing_key = f"queue:{name}:processing"
+        self.attempts_key = f"queue:{name}:attempts"
+        self.dead_key = f"queue:{name}:dead"
+
+    @property
+    def redis(self):
+        return get_redis_connection('default')
+
+    # ---------------- 生产者 ----------------
+    def enqueue(self, key, delay=0):
+        """加入队列；同一任务键已在等待中时不会重复添加"""
+        return self.enqueue_many([key], delay=delay)
+
+    def enqueue_many(self, keys, delay=0):
+        keys = [k for k in keys if k]
+        if not keys:
+            return 0
+        run_at = time.time() + delay
+        return self.redis.zadd(self.pending_key, {k: run_at for k in keys}, nx=True)
+
+    def wait_for_capacity(self, timeout=600, interval=1.0):
+        """背压：积压任务超过 max_pending 时阻塞等待 worker 消化，超时抛出 QueueFull"""
+        if not self.max_pending:
+            return
+        deadline = time.monotonic() + timeout
+        while self.redis.zcard(self.pending_key) >= self.max_pending:
+            if time.monotonic() >= deadline:
+                raise QueueFull(f"队列 {self.name} 积压超过 {self.max_pending}")
+            time.sleep(interval)
+
+    # ---------------- 消费者 ----------------
+    def claim(self, batch=10):
+        now = time.time()
+        items = self.redis.eval(
+            _CLAIM_SCRIPT, 2, self.pending_key, self.processing_key, now, batch, now + self.lease
+        )
+        return [_decode(i) for i in items]
+
+    def requeue_stale(self):
+        return self.redis.eval(_REQUEUE_SCRIPT, 2, self.pending_key, self.processing_key, time.time())
+
+    def ack(self, key):
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.processing_key, key)
+        pipe.hdel(self.attempts_key, key)
+        pipe.execute()
+
+    def extend(self, key):
+        """长任务续租，避免执行中被 requeue_stale 回收"""
+        self.redis.zadd(self.processing_key, {key: time.time() + self.lease}, xx=True)
+
+    def release(self, key, delay=1):
+        """暂时无法处理 (如并发受限)，放回队列且不计失败次数"""
+        pipe = self.redis.pipeline()
+        pipe.zrem(self.processing_key, key)
+        pipe.zadd(self.pending_key, {key: time.time() + delay}, nx=True)
+        pipe.execute()
+
+    def fail(self, key, error=''):
+        """不可重试的失败，直接转入死信"""
+        self.redis.hset(self.attempts_key, key, self.max_attempts - 1)
+        return self.retry(key, error)
+
+    def retry(self, key, error=''):
+        """失败重试 (指数退避)；超过最大次数进入死信，返回是否还会重试"""
+        r = self.redis
+        attempts = r.hincrby(self.attempts_key, key, 1)
+        pipe = r.pipeline()
+        pipe.zrem(self.processing_key, key)
+        if attempts >= self.max_attempts:
+            pipe.hdel(self.attempts_key, key)
+            pipe.lpush(self.dead_key, json.dumps({
+                'key': key,
+                'error': str(error)[:500],
+                'attempts': attempts,
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            }, ensure_ascii=False))
+            pipe.ltrim(self.dead_key, 0, self.DEAD_LETTER_LIMIT - 1)
+            pipe.execute()
+            return False
+        delay = min(self.backoff * (2 ** (attempts - 1)), self.backoff_max)
+        pipe.zadd(self.pending_key, {key: time.time() + delay}, nx=True)
+        pipe.execute()
+        return True
+
+    # ---------------- 运维 ----------------
+    def stats(self):
+        pipe = self.redis.pipeline()
+        pipe.zcard(self.pending_key)
+        pipe.zcard(self.processing_key)
+        pipe.llen(self.dead_key)
+        pending, processing, dead = pipe.execute()
+        return {'pending': pending, 'processing': processing, 'dead': dead}
+
+    def dead_letters(self, limit=100):
+        return [json.loads(_decode(i)) for i in self.redis.lrange(self.dead_key, 0, limit - 1)]
+
+    def requeue_dead(self):
+        """把死信全部重新放回队列"""
+        items = self.dead_letters(self.DEAD_LETTER_LIMIT)
+        self.redis.delete(self.dead_key)
+        return self.enqueue_many([i['key'] for i in items])
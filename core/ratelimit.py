@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from . import metrics
+from .log_utils import log_system_error
+
+# =========================================================
+# 限流工具
+# =========================================================
+
+
+class RateLimiter:
+    """
+    进程内令牌桶限流器 (线程安全)
+    rate: 每秒令牌数；burst: 桶容量
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到拿到一个令牌，返回等待的秒数"""
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+# =========================================================
+# 百度接口共享限流 (Redis 令牌桶，所有 gunicorn worker 和后台 worker 共用配额)
+# =========================================================
+# 两个桶:
+#   ratelimit:baidu:total       速率 FACE_API_QPS，每次调用百度都要取令牌
+#   ratelimit:baidu:background  速率 FACE_API_BACKGROUND_QPS，后台同步额外取令牌
+# 后台任务只有在总桶剩余令牌多于 FACE_API_SEARCH_RESERVE 时才能取用，保证实时识别始终有余量。
+
+PRIORITY_SEARCH = 'search'
+PRIORITY_BACKGROUND = 'background'
+
+# KEYS: 各个桶; ARGV: 当前时间, 然后每个桶依次为 速率, 容量, 预留令牌数
+# 所有桶都满足时各扣一个令牌并返回 0，否则返回还需等待的秒数 (字符串，避免 Lua 数字被截断为整数)
+_BUCKET_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local tokens = {}
+for i, key in ipairs(KEYS) do
+    local rate = tonumber(ARGV[i * 3 - 1])
+    local capacity = tonumber(ARGV[i * 3])
+    local reserve = tonumber(ARGV[i * 3 + 1])
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local t = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    t = math.min(capacity, t + math.max(0, now - ts) * rate)
+    tokens[i] = t
+    if t < 1 + reserve then
+        wait = math.max(wait, (1 + reserve - t) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local t = tokens[i]
+    if wait == 0 then t = t - 1 end
+    redis.call('HSET', key, 'tokens', t, 'ts', now)
+    redis.call('EXPIRE', key, 60)
+end
+return tostring(wait)
+"""
+
+
+class RateLimitTimeout(Exception):
+    """等待令牌超过允许的时间"""
+
+
+class BaiduRateLimiter:
+    KEY_PREFIX = 'ratelimit:baidu'
+
+    def __init__(self):
+        self._fallback = {}
+        self._fallback_lock = threading.Lock()
+
+    def _buckets(self, priority):
+        qps = float(getattr(settings, 'FACE_API_QPS', 10))
+        burst = float(getattr(settings, 'FACE_API_BURST', None) or max(1, qps))
+        total = (f"{self.KEY_PREFIX}:total", qps, burst, 0)
+        if priority == PRIORITY_SEARCH:
+            return [total]
+        reserve = min(float(getattr(settings, 'FACE_API_SEARCH_RESERVE', 2)), burst - 1)
+        background_qps = float(getattr(settings, 'FACE_API_BACKGROUND_QPS', None) or qps * 0.6)
+        return [
+            (total[0], qps, burst, max(0, reserve)),
+            (f"{self.KEY_PREFIX}:background", background_qps, max(1, background_qps), 0),
+        ]
+
+    def _try_acquire(self, priority):
+        """尝试取令牌，返回需要等待的秒数 (0 表示已取得)"""
+        buckets = self._buckets(priority)
+        args = [time.time()]
+        for _, rate, capacity, reserve in buckets:
+            args += [rate, capacity, reserve]
+        try:
+            wait = get_redis_connection('default').eval(
+                _BUCKET_SCRIPT, len(buckets), *[b[0] for b in buckets], *args
+            )
+            return float(wait)
+        except Exception as e:
+            # Redis 不可用时退回进程内限流，不阻断业务
+            log_system_error(f"共享限流不可用，使用进程内限流: {e}")
+            self._local(priority, buckets[-1][1]).acquire()
+            return 0.0
+
+    def _local(self, priority, rate):
+        with self._fallback_lock:
+            limiter = self._fallback.get(priority)
+            if limiter is None:
+                limiter = self._fallback[priority] = RateLimiter(rate)
+            return limiter
+
+    def _record(self, priority, waited):
+        metrics.incr(f'ratelimit_{priority}_acquired')
+        if waited:
+            metrics.incr(f'ratelimit_{priority}_waited')
+            metrics.incr(f'ratelimit_{priority}_wait_ms', int(waited * 1000))
+
+    def acquire(self, priority=PRIORITY_SEARCH, timeout=None):
+        """
+        阻塞直到取得令牌，返回等待的秒数
+        timeout: 最长等待时间，预计超过时立即抛出 RateLimitTimeout (实时识别不应长时间排队)
+        """
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(priority)
+            if not wait:
+                self._record(priority, waited)
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                metrics.incr(f'ratelimit_{priority}_timeout')
+                raise RateLimitTimeout(f"百度接口请求过多，需等待 {wait:.1f}s")
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, priority=PRIORITY_SEARCH, timeout=None):
+        """异步版本：Redis 调用在线程池中执行，等待期间不阻塞事件循环"""
+        waited = 0.0
+        while True:
+            wait = await sync_to_async(self._try_acquire, thread_sensitive=False)(priority)
+            if not wait:
+                await sync_to_async(self._record, thread_sensitive=False)(priority, waited)
+                return waited
+            if timeout is not None and waited + wait > timeout:
+                await sync_to_async(metrics.incr, thread_sensitive=False)(f'ratelimit_{priority}_timeout')
+                raise RateLimitTimeout(f"百度接口请求过多，需等待 {wait:.1f}s")
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+baidu_limiter = BaiduRateLimiter()
@@ -0,0 +1,105 @@
+import datetime
+import json
+from django.db.models import Count, Sum
+from django_redis import get_redis_connection
+
+from .models import Person, ScanEvent, ScanHourlyStat
+from .log_utils import log_system_error
+
+# =========================================================
+# 识别记录：请求内只写入 Redis 缓冲区，由 run_face_worker 批量插入数据库
+# =========================================================
+BUFFER_KEY = 'scan_events:buffer'
+# worker 长时间未运行时缓冲区的上限，超出后丢弃最早的记录，避免 Redis 内存无限增长
+BUFFER_LIMIT = 200000
+
+
+def record_scans(events, latency=None):
+    """
+    追加识别记录 (每条为 {operator, ip, id_card, score, outcome, cached})
+    写入失败只记日志，不影响识别接口
+    """
+    if not events:
+        return
+    now = datetime.datetime.now().isoformat(timespec='milliseconds')
+    latency_ms = int(latency * 1000) if latency is not None else None
+    items = [json.dumps({**e, 'scanned_at': now, 'latency_ms': latency_ms}, ensure_ascii=False) for e in events]
+    try:
+        pipe = get_redis_connection('default').pipeline(transaction=False)
+        pipe.rpush(BUFFER_KEY, *items)
+        pipe.ltrim(BUFFER_KEY, -BUFFER_LIMIT, -1)
+        pipe.execute()
+    except Exception as e:
+        log_system_error(f"识别记录写入缓冲区失败: {e}")
+
+
+def _hour(dt):
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def flush_scan_buffer(batch=1000):
+    """取出一批缓冲记录并批量插入，返回 (插入条数, 涉及的小时集合)"""
+    r = get_redis_connection('default')
+    pipe = r.pipeline()
+    pipe.lrange(BUFFER_KEY, 0, batch - 1)
+    pipe.ltrim(BUFFER_KEY, batch, -1)
+    items, _ = pipe.execute()
+    if not items:
+        return 0, set()
+
+    events = []
+    for item in items:
+        try:
+            events.append(json.loads(item))
+        except ValueError:
+            continue
+    id_cards = {e['id_card'] for e in events if e.get('id_card')}
+    person_ids = dict(Person.objects.filter(id_card__in=id_cards).values_list('id_card', 'pk')) if id_cards else {}
+
+    objs = [
+        ScanEvent(
+            person_id=person_ids.get(e.get('id_card')),
+            id_card=e.get('id_card') or '',
+            score=e.get('score'),
+            operator=(e.get('operator') or '')[:150],
+            ip=(e.get('ip') or '')[:45],
+            scanned_at=datetime.datetime.fromisoformat(e['scanned_at']),
+            latency_ms=e.get('latency_ms'),
+            outcome=e['outcome'],
+            cached=bool(e.get('cached')),
+        )
+        for e in events
+    ]
+    try:
+        ScanEvent.objects.bulk_create(objs, batch_size=500)
+    except Exception:
+        # 插入失败时放回缓冲区，下次重试
+        r.rpush(BUFFER_KEY, *items)
+        raise
+    return len(objs), {_hour(o.scanned_at) for o in objs}
+
+
+def rollup_hours(hours):
+    """根据明细重新计算指定小时的统计 (幂等，可重复执行)"""
+    for hour in sorted(hours):
+        rows = (
+            ScanEvent.objects.filter(scanned_at__gte=hour, scanned_at__lt=hour + datetime.timedelta(hours=1))
+            .values('outcome')
+            .annotate(count=Count('id'), persons=Count('person', distinct=True), latency=Sum('latency_ms'))
+        )
+        for row in rows:
+            ScanHourlyStat.objects.update_or_create(
+                hour=hour,
+                outcome=row['outcome'],
+                defaults={
+                    'count': row['count'],
+                    'persons': row['persons'],
+                    'total_latency_ms': row['latency'] or 0,
+                },
+            )
+
+
+def recent_hours():
+    """当前小时和上一小时 (worker 每轮都会重算，保证跨小时的记录不遗漏)"""
+    current = _hour(datetime.datetime.now())
+    return {current, current - datetime.timedelta(hours=1)}
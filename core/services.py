@@ -1,81 +1,360 @@
-import requests
 import time
 import base64
 import os
+import tempfile
+import threading
+from urllib.parse import urlparse
+from asgiref.sync import sync_to_async
 from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.db import transaction
+from django_redis import get_redis_connection
 
 # 导入模型
 from .models import Person
 
 # 统一日志工具
 from .log_utils import log_business, log_system_error
+from . import http_client
+from .queue import RedisJobQueue
+from .imaging import normalize_image, make_thumbnails, content_hash
+from .ratelimit import baidu_limiter, RateLimitTimeout, PRIORITY_SEARCH, PRIORITY_BACKGROUND
+from .circuit import baidu_breaker, CircuitOpen
+from . import metrics
 
 # 全局线程池
-image_download_executor = ThreadPoolExecutor(max_workers=10)
+# 批量识别并发搜索线程池 (所有请求共享，控制对百度的并发)
+batch_search_executor = ThreadPoolExecutor(max_workers=getattr(settings, 'FACE_BATCH_CONCURRENCY', 8))
 
 class BaiduService:
+    # access_token 存放在 Redis (所有进程共享)，进程内再缓存一分钟以减少 Redis 读取。
+    # 剩余有效期不足 FACE_TOKEN_REFRESH_BEFORE 时由后台线程/worker 提前刷新，刷新过程持有分布式锁，
+    # 同一时刻只有一个进程向百度申请新 token。
+    TOKEN_CACHE_KEY = 'baidu:access_token'
+    TOKEN_LOCK_KEY = 'lock:baidu:access_token'
+    TOKEN_LOCAL_TTL = 60
     _access_token = None
     _token_expire = 0
+    _token_checked = 0
+    _token_lock = threading.Lock()
+    _token_refreshing = False
 
     @classmethod
-    def get_token(cls):
-        now = time.time()
-        if cls._access_token and now < cls._token_expire:
-            return cls._access_token
-        url = "https://aip.baidubce.com/oauth/2.0/token"
+    def _fetch_token(cls):
+        """向百度申请新 token，返回 {'token', 'expires_at'} 或 None"""
+        url = f"{settings.FACE_API_BASE_URL}/oauth/2.0/token"
         params = {
             "grant_type": "client_credentials", 
             "client_id": settings.FACE_API_KEY, 
             "client_secret": settings.FACE_SECRET_KEY
         }
         try:
-            resp = requests.post(url, params=params, timeout=5).json()
+            resp = http_client.post('token', url, params=params).json()
             if "access_token" in resp:
-                cls._access_token = resp["access_token"]
-                cls._token_expire = now + resp.get("expires_in", 2592000) - 60
-                return cls._access_token
+                metrics.incr('baidu_token_fetched')
+                return {
+                    'token': resp["access_token"],
+                    'expires_at': time.time() + resp.get("expires_in", 2592000) - 60,
+                }
+            log_system_error(f"Baidu Token Error: {resp.get('error_description') or resp}")
         except Exception as e:
             log_system_error(f"Baidu Token Error: {e}")
+        metrics.incr('baidu_token_failed')
         return None
 
+    @classmethod
+    def _remember(cls, shared):
+        cls._access_token = shared['token']
+        cls._token_expire = shared['expires_at']
+        cls._token_checked = time.time()
+
+    @staticmethod
+    def _needs_refresh(expires_at):
+        return expires_at - time.time() < getattr(settings, 'FACE_TOKEN_REFRESH_BEFORE', 86400)
+
+    @classmethod
+    def _load_shared_token(cls):
+        try:
+            shared = cache.get(cls.TOKEN_CACHE_KEY)
+        except Exception as e:
+            log_system_error(f"共享 Token 读取失败: {e}")
+            return None
+        return shared if shared and time.time() < shared['expires_at'] else None
+
+    @classmethod
+    def refresh_token(cls, force=False):
+        """
+        共享 token 不存在或即将过期时刷新 (force=True 时无条件刷新)，返回可用的 token
+        单进程内和跨进程都只有一个调用方真正请求百度，其余调用方等待后直接读取结果
+        """
+        with cls._token_lock:
+            shared = cls._load_shared_token()
+            if shared and not force and not cls._needs_refresh(shared['expires_at']):
+                cls._remember(shared)
+                return shared['token']
+            try:
+                lock = get_redis_connection('default').lock(cls.TOKEN_LOCK_KEY, timeout=15, blocking_timeout=10)
+                acquired = lock.acquire()
+            except Exception as e:
+                # Redis 不可用时退化为进程内刷新
+                log_system_error(f"Token 刷新锁不可用: {e}")
+                lock, acquired = None, True
+            if not acquired:
+                # 其他进程刷新超时，沿用当前仍有效的 token
+                shared = cls._load_shared_token() or shared
+                if shared:
+                    cls._remember(shared)
+                return shared['token'] if shared else None
+            try:
+                # 等锁期间可能已被其他进程刷新
+                latest = cls._load_shared_token()
+                if latest and (latest != shared or not force) and not cls._needs_refresh(latest['expires_at']):
+                    cls._remember(latest)
+                    return latest['token']
+                fetched = cls._fetch_token()
+                if fetched:
+                    try:
+                        cache.set(cls.TOKEN_CACHE_KEY, fetched, int(fetched['expires_at'] - time.time()))
+                    except Exception as e:
+                        log_system_error(f"共享 Token 写入失败: {e}")
+                    cls._remember(fetched)
+                    return fetched['token']
+                # 刷新失败但旧 token 仍在有效期内，继续使用，下次再试
+                if latest:
+                    cls._remember(latest)
+                    return latest['token']
+                return None
+            finally:
+                if lock is not None:
+                    try:
+                        lock.release()
+                    except Exception:
+                        pass
+
+    @classmethod
+    def _refresh_in_background(cls):
+        """提前刷新即将过期的 token，不阻塞当前请求"""
+        if cls._token_refreshing:
+            return
+        cls._token_refreshing = True
+
+        def run():
+            try:
+                cls.refresh_token()
+            except Exception as e:
+                log_system_error(f"Token 后台刷新失败: {e}")
+            finally:
+                cls._token_refreshing = False
+
+        threading.Thread(target=run, name='baidu-token-refresh', daemon=True).start()
+
+    @classmethod
+    def _local_token(cls):
+        """进程内缓存的 token (不做任何 IO)，需要刷新时在后台进行"""
+        now = time.time()
+        if cls._access_token and now < cls._token_expire and now - cls._token_checked < cls.TOKEN_LOCAL_TTL:
+            if cls._needs_refresh(cls._token_expire):
+                cls._refresh_in_background()
+            return cls._access_token
+        return None
+
+    @classmethod
+    def get_token(cls):
+        token = cls._local_token()
+        if token:
+            return token
+        shared = cls._load_shared_token()
+        if shared:
+            cls._remember(shared)
+            if cls._needs_refresh(shared['expires_at']):
+                cls._refresh_in_background()
+            return shared['token']
+        # 没有任何可用 token (首次启动或已过期)，只能同步获取
+        return cls.refresh_token()
+
+    @classmethod
+    def invalidate_token(cls, token):
+        """百度返回 token 无效时丢弃 (仅当缓存的仍是这个 token)"""
+        cls._access_token = None
+        try:
+            shared = cache.get(cls.TOKEN_CACHE_KEY)
+            if shared and shared['token'] == token:
+                cache.delete(cls.TOKEN_CACHE_KEY)
+        except Exception as e:
+            log_system_error(f"共享 Token 删除失败: {e}")
+
+    # 百度配额类错误：请求过多，不是"无匹配"
+    BUSY_ERROR_CODES = (4, 17, 18, 19)
+    # 百度服务端故障，计入熔断
+    SERVER_ERROR_CODES = (1, 2, 282000)
+    # access_token 无效/过期
+    TOKEN_ERROR_CODES = (110, 111)
+
+    @staticmethod
+    def _busy(msg):
+        metrics.incr('baidu_busy')
+        return {"error_msg": msg, "busy": True}
+
+    @classmethod
+    def _outcome(cls, resp):
+        code = resp.get('error_code')
+        if code == 0:
+            return 'ok'
+        if code in cls.BUSY_ERROR_CODES:
+            return 'busy'
+        if code in cls.SERVER_ERROR_CODES:
+            return 'server_error'
+        if code in cls.TOKEN_ERROR_CODES:
+            return 'token_error'
+        return 'client_error'
+
+    @classmethod
+    def _observe(cls, path, started, outcome):
+        metrics.observe('baidu_request_seconds', time.perf_counter() - started, endpoint=path)
+        metrics.incr('baidu_requests', endpoint=path, outcome=outcome)
+
+    @classmethod
+    def _check_response(cls, resp):
+        code = resp.get('error_code')
+        if code in cls.SERVER_ERROR_CODES:
+            baidu_breaker.record_failure(resp.get('error_msg'))
+        else:
+            baidu_breaker.record_success()
+        if code in cls.BUSY_ERROR_CODES:
+            metrics.incr('baidu_busy')
+            resp['busy'] = True
+        return resp
+
+    @classmethod
+    def _request_failed(cls, path, started, error):
+        cls._observe(path, started, 'exception')
+        baidu_breaker.record_failure(str(error))
+        log_system_error(f"Baidu API Error: {str(error)}")
+        return {"error_msg": str(error)}
+
+    @classmethod
+    def _finish(cls, path, started, resp):
+        cls._observe(path, started, cls._outcome(resp))
+        return cls._check_response(resp)
+
+    @staticmethod
+    def _api_url(path, token):
+        return f"{settings.FACE_API_BASE_URL}/rest/2.0/face/v3/{path}?access_token={token}"
+
+    @classmethod
+    def _call(cls, path, payload, endpoint='search', priority=PRIORITY_SEARCH):
+        """
+        调用百度人脸接口：熔断检查 -> 共享限流 -> 请求
+        实时识别最多排队 FACE_API_SEARCH_MAX_WAIT 秒，后台任务一直等到拿到令牌
+        """
+        for attempt in range(2):
+            token = cls.get_token()
+            if not token: return cls._busy("Token Error")
+            probing = False
+            try:
+                probing = baidu_breaker.allow()
+                timeout = getattr(settings, 'FACE_API_SEARCH_MAX_WAIT', 2) if priority == PRIORITY_SEARCH else None
+                baidu_limiter.acquire(priority, timeout=timeout)
+            except (CircuitOpen, RateLimitTimeout) as e:
+                if probing:
+                    baidu_breaker.release_probe()
+                return cls._busy(str(e))
+            url = cls._api_url(path, token)
+            started = time.perf_counter()
+            try:
+                resp = http_client.post(endpoint, url, json=payload).json()
+            except Exception as e:
+                return cls._request_failed(path, started, e)
+            cls._observe(path, started, cls._outcome(resp))
+            if resp.get('error_code') in cls.TOKEN_ERROR_CODES and attempt == 0:
+                # token 被提前作废 (如在控制台重置了密钥)，换新 token 重试一次；探测名额留给重试
+                cls.invalidate_token(token)
+                if probing:
+                    baidu_breaker.release_probe()
+                continue
+            return cls._check_response(resp)
+
     @classmethod
     def search_face(cls, image_base64):
         """人脸搜索"""
-        token = cls.get_token()
-        if not token: return {"error_msg": "Token Error"}
-        url = f"https://aip.baidubce.com/rest/2.0/face/v3/search?access_token={token}"
         data = {
             "group_id_list": settings.FACE_GROUP_ID, 
             "image": image_base64, 
             "image_type": "BASE64"
         }
+        return cls._call('search', data)
+
+    @classmethod
+    def multi_search(cls, image_base64, max_face_num=10):
+        """多人脸搜索 (一张图最多识别 10 张脸)"""
+        data = {
+            "group_id_list": settings.FACE_GROUP_ID,
+            "image": image_base64,
+            "image_type": "BASE64",
+            "max_face_num": min(max_face_num, 10),
+        }
+        return cls._call('multi-search', data)
+
+    @classmethod
+    def detect_faces(cls, image_base64, max_face_num=120):
+        """人脸检测，仅返回人脸框 (一张图最多 120 张脸)"""
+        data = {
+            "image": image_base64,
+            "image_type": "BASE64",
+            "max_face_num": min(max_face_num, 120),
+        }
+        return cls._call('detect', data)
+
+    @classmethod
+    async def asearch_face(cls, image_base64):
+        """
+        人脸搜索 (异步版本，等待百度响应和限流期间不占用 worker)
+        熔断/限流/指标均为同步 Redis 调用，放到线程池执行，避免一次慢往返阻塞事件循环
+        """
+        token = cls._local_token()
+        if not token:
+            token = await sync_to_async(cls.get_token, thread_sensitive=False)()
+        if not token:
+            return await sync_to_async(cls._busy, thread_sensitive=False)("Token Error")
+        probing = False
         try:
-            return requests.post(url, json=data, timeout=10).json()
+            probing = await baidu_breaker.aallow()
+            await baidu_limiter.aacquire(PRIORITY_SEARCH, timeout=getattr(settings, 'FACE_API_SEARCH_MAX_WAIT', 2))
+        except (CircuitOpen, RateLimitTimeout) as e:
+            if probing:
+                await baidu_breaker.arelease_probe()
+            return await sync_to_async(cls._busy, thread_sensitive=False)(str(e))
+        url = cls._api_url('search', token)
+        data = {
+            "group_id_list": settings.FACE_GROUP_ID, 
+            "image": image_base64, 
+            "image_type": "BASE64"
+        }
+        started = time.perf_counter()
+        try:
+            resp = await http_client.apost('search', url, json=data)
+            resp = resp.json()
         except Exception as e:
-            log_system_error(f"Baidu API Error: {str(e)}")
-            return {"error_msg": str(e)}
+            return await sync_to_async(cls._request_failed, thread_sensitive=False)('search', started, e)
+        if resp.get('error_code') in cls.TOKEN_ERROR_CODES:
+            # 丢弃失效 token，下一次请求重新获取
+            await sync_to_async(cls.invalidate_token, thread_sensitive=False)(token)
+        return await sync_to_async(cls._finish, thread_sensitive=False)('search', started, resp)
 
     @classmethod
     def sync_face(cls, person):
-        """同步人员图片到百度人脸库"""
+        """同步人员图片到百度人脸库 (后台优先级，不占用实时识别的配额)"""
         if not person.face_image or not os.path.exists(person.face_image.path):
             return False, "本地图片文件不存在"
 
-        token = cls.get_token()
-        if not token: return False, "无法获取百度Token"
-
         try:
             with open(person.face_image.path, "rb") as f:
                 image_base64 = base64.b64encode(f.read()).decode("utf8")
         except Exception as e:
             return False, f"图片读取失败: {e}"
 
-        url_add = f"https://aip.baidubce.com/rest/2.0/face/v3/faceset/user/add?access_token={token}"
-        url_update = f"https://aip.baidubce.com/rest/2.0/face/v3/faceset/user/update?access_token={token}"
-        
         payload = {
             "group_id": settings.FACE_GROUP_ID,
             "user_id": person.id_card,
@@ -84,64 +363,282 @@ class BaiduService:
             "image_type": "BASE64",
             "action_type": "REPLACE"
         }
-        headers = {'Content-Type': 'application/json'}
+
+        resp = cls._call('faceset/user/add', payload, endpoint='sync', priority=PRIORITY_BACKGROUND)
+        if resp.get("error_code") == 0:
+            log_business("System", "127.0.0.1", "同步百度", person.name, "新增成功")
+            return True, "新增成功"
+
+        if resp.get("error_code") == 223105:
+            resp_up = cls._call('faceset/user/update', payload, endpoint='sync', priority=PRIORITY_BACKGROUND)
+            if resp_up.get("error_code") == 0:
+                log_business("System", "127.0.0.1", "同步百度", person.name, "更新成功")
+                return True, "更新成功"
+
+            err_msg = resp_up.get('error_msg')
+            log_system_error(f"百度更新失败 [{person.name}]: {err_msg}")
+            return False, f"更新失败: {err_msg}"
+
+        err_msg = resp.get('error_msg')
+        log_system_error(f"百度新增失败 [{person.name}]: {err_msg}")
+        return False, f"百度API错误: {err_msg}"
+
+
+class FaceSearchService:
+    """
+    人脸搜索入口，按 FACE_SEARCH_BACKEND 选择后端:
+      baidu            仅调用百度
+      local            仅查本地特征索引
+      local-then-baidu 本地命中且分数达标则直接返回，否则回退百度
+    本地结果均按 FACE_LOCAL_MIN_SCORE 过滤，不达标视为未匹配 (与百度 222207 一致)
+    """
+    LOCAL_NOT_FOUND = {'error_code': 222207, 'error_msg': 'match user is not found', 'source': 'local'}
+
+    @classmethod
+    def search(cls, image_bytes, image_base64=None):
+        """image_base64 为空时，仅在需要调用百度时才做一次 base64 编码"""
+        backend = getattr(settings, 'FACE_SEARCH_BACKEND', 'baidu')
+        if backend == 'baidu':
+            return BaiduService.search_face(image_base64 or cls._encode(image_bytes))
 
         try:
-            resp = requests.post(url_add, json=payload, headers=headers, timeout=10).json()
-            if resp.get("error_code") == 0:
-                log_business("System", "127.0.0.1", "同步百度", person.name, "新增成功")
-                return True, "新增成功"
-            
-            if resp.get("error_code") == 223105:
-                resp_up = requests.post(url_update, json=payload, headers=headers, timeout=10).json()
-                if resp_up.get("error_code") == 0:
-                    log_business("System", "127.0.0.1", "同步百度", person.name, "更新成功")
-                    return True, "更新成功"
-                
-                err_msg = resp_up.get('error_msg')
-                log_system_error(f"百度更新失败 [{person.name}]: {err_msg}")
-                return False, f"更新失败: {err_msg}"
-                
-            err_msg = resp.get('error_msg')
-            log_system_error(f"百度新增失败 [{person.name}]: {err_msg}")
-            return False, f"百度API错误: {err_msg}"
-            
+            from .face_index import search_local
+            res = cls._filter_local(search_local(image_bytes))
         except Exception as e:
-            log_system_error(f"百度同步异常 [{person.name}]: {e}")
-            return False, str(e)
+            log_system_error(f"本地人脸索引查询失败: {e}")
+            res = {"error_msg": f"本地索引错误: {e}"}
 
+        if backend == 'local' or res.get('error_code') == 0:
+            return res
+        return BaiduService.search_face(image_base64 or cls._encode(image_bytes))
+
+    @classmethod
+    async def asearch(cls, image_bytes, image_base64=None):
+        """异步版本：百度走异步 HTTP，本地索引计算放到线程池"""
+        backend = getattr(settings, 'FACE_SEARCH_BACKEND', 'baidu')
+        if backend == 'baidu':
+            return await BaiduService.asearch_face(image_base64 or cls._encode(image_bytes))
 
-class ImageDownloadService:
-    @staticmethod
-    def _download_worker(person_id, url):
         try:
-            person = Person.objects.get(pk=person_id)
-            
-            resp = requests.get(url, timeout=10)
-            if resp.status_code == 200:
-                img_content = ContentFile(resp.content)
-                # 直接保存，不再需要 Auditlog 的 context wrapper
-                person.face_image.save(f"{person.id_card}.jpg", img_content, save=True)
-                
-                # 记录到 access.log
-                log_business(
-                    user="System", 
-                    ip="127.0.0.1", 
-                    action="自动下载", 
-                    obj=person.name, 
-                    detail=f"图片下载成功"
-                )
-            else:
-                log_system_error(f"图片下载失败 HTTP {resp.status_code}: {person.name}")
-                
+            from .face_index import search_local
+            res = cls._filter_local(await sync_to_async(search_local, thread_sensitive=False)(image_bytes))
         except Exception as e:
-            log_system_error(f"图片下载异常: {e}")
+            log_system_error(f"本地人脸索引查询失败: {e}")
+            res = {"error_msg": f"本地索引错误: {e}"}
+
+        if backend == 'local' or res.get('error_code') == 0:
+            return res
+        return await BaiduService.asearch_face(image_base64 or cls._encode(image_bytes))
+
+    @classmethod
+    def _filter_local(cls, res):
+        """去掉低于 FACE_LOCAL_MIN_SCORE 的本地候选，全部不达标时返回未匹配"""
+        min_score = getattr(settings, 'FACE_LOCAL_MIN_SCORE', 80)
+        user_list = [u for u in res['result']['user_list'] if u['score'] >= min_score]
+        if not user_list:
+            return dict(cls.LOCAL_NOT_FOUND)
+        return {**res, 'result': {**res['result'], 'user_list': user_list}}
+
+    @classmethod
+    def batch_search(cls, images):
+        """
+        批量识别，返回每张人脸的 {image_index, location, user_id, score, error}
+          单张合影：baidu 后端优先百度 multi-search (一次请求最多 10 张脸)；
+                    人脸数达到上限或 local-then-baidu 后端时改为 detect 定位 + 裁剪 + 并发单人搜索 (按后端切换)
+                    local 后端没有人脸检测能力，合影按单张图片搜索，不调用百度
+          多张图片：每张图片并发单人搜索
+        """
+        if len(images) == 1:
+            return cls._search_group_photo(images[0])
+        results = list(batch_search_executor.map(cls.search, images))
+        return [cls._face_result(i, None, res) for i, res in enumerate(results)]
+
+    @classmethod
+    def _search_group_photo(cls, image_bytes):
+        backend = getattr(settings, 'FACE_SEARCH_BACKEND', 'baidu')
+        if backend == 'local':
+            return [cls._face_result(0, None, cls.search(image_bytes))]
+
+        image_base64 = cls._encode(image_bytes)
+        if backend == 'baidu':
+            res = BaiduService.multi_search(image_base64)
+            if res.get('error_code') != 0:
+                return [cls._face_result(0, None, res)]
+
+            face_list = (res.get('result') or {}).get('face_list', [])
+            if len(face_list) < 10:
+                return [
+                    cls._face_result(0, face.get('location'), {'error_code': 0, 'result': face})
+                    for face in face_list
+                ]
+            # multi-search 已达 10 张脸上限，可能还有更多人脸
+
+        max_faces = getattr(settings, 'FACE_BATCH_MAX_FACES', 60)
+        detected = BaiduService.detect_faces(image_base64, max_faces)
+        if detected.get('error_code') != 0:
+            return [cls._face_result(0, None, detected)]
+        locations = [f['location'] for f in (detected.get('result') or {}).get('face_list', [])]
+        from .imaging import crop_faces
+        crops = crop_faces(image_bytes, locations)
+        results = batch_search_executor.map(cls.search, crops)
+        return [cls._face_result(0, loc, r) for loc, r in zip(locations, results)]
 
     @staticmethod
-    def trigger_download(person_id, url):
+    def _face_result(image_index, location, res):
+        user_list = (res.get('result') or {}).get('user_list', []) if res.get('error_code') == 0 else []
+        top = user_list[0] if user_list else None
+        return {
+            'image_index': image_index,
+            'location': location,
+            'user_id': top['user_id'] if top else None,
+            'score': round(top['score'], 1) if top else None,
+            'error': None if res.get('error_code') == 0 else res.get('error_msg'),
+        }
+
+    @staticmethod
+    def _encode(image_bytes):
+        return base64.b64encode(image_bytes).decode('ascii')
+
+
+class DownloadError(Exception):
+    def __init__(self, msg, retryable=True):
+        super().__init__(msg)
+        self.retryable = retryable
+
+
+class HostBusy(Exception):
+    """目标主机并发已满，稍后再试"""
+
+
+class ImageDownloadService:
+    """
+    源图片下载：任务存放在 Redis 队列 (按人员ID去重、重启不丢失)，由 run_face_worker 消费。
+    支持失败指数退避重试、按主机限制并发、条件请求 (ETag/Last-Modified) 跳过未变化的图片、流式写盘。
+    """
+    queue = RedisJobQueue(
+        'image_download',
+        max_attempts=getattr(settings, 'FACE_DOWNLOAD_MAX_ATTEMPTS', 5),
+        backoff=getattr(settings, 'FACE_DOWNLOAD_RETRY_BACKOFF', 30),
+        max_pending=getattr(settings, 'FACE_DOWNLOAD_MAX_PENDING', 20000),
+    )
+    CHUNK_SIZE = 64 * 1024
+    _host_slots = {}
+    _host_lock = threading.Lock()
+
+    @classmethod
+    def _host_slot(cls, url):
+        host = urlparse(url).hostname or ''
+        with cls._host_lock:
+            slot = cls._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(getattr(settings, 'FACE_DOWNLOAD_PER_HOST', 4))
+                cls._host_slots[host] = slot
+            return slot
+
+    @classmethod
+    def download(cls, person_id):
+        """
+        下载并保存一个人员的源图片，返回结果说明
+        失败抛出 DownloadError；同一主机并发已满时抛出 HostBusy
+        """
+        person = Person.objects.filter(pk=person_id).first()
+        if not person or not person.source_image_url:
+            return "人员不存在或无源图片URL，跳过"
+
+        slot = cls._host_slot(person.source_image_url)
+        if not slot.acquire(blocking=False):
+            raise HostBusy(person.source_image_url)
+        try:
+            return cls._download(person)
+        finally:
+            slot.release()
+
+    @classmethod
+    def _download(cls, person):
+        headers = {}
+        if person.face_image and person.source_validated_url == person.source_image_url:
+            # 已有照片且 URL 未变时发送条件请求，源图未变化则服务器返回 304
+            if person.source_etag:
+                headers['If-None-Match'] = person.source_etag
+            if person.source_last_modified:
+                headers['If-Modified-Since'] = person.source_last_modified
+
+        try:
+            resp = http_client.get('download', person.source_image_url, headers=headers, stream=True)
+        except Exception as e:
+            raise DownloadError(f"图片下载异常: {e}")
+
+        with resp:
+            if resp.status_code == 304:
+                return "源图片未变化"
+            if resp.status_code != 200:
+                # 4xx (超时/限流除外) 重试也没有意义
+                retryable = resp.status_code >= 500 or resp.status_code in (408, 429)
+                raise DownloadError(f"图片下载失败 HTTP {resp.status_code}: {person.name}", retryable)
+
+            max_bytes = getattr(settings, 'FACE_DOWNLOAD_MAX_BYTES', 20 * 1024 * 1024)
+            with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as tmp:
+                size = 0
+                try:
+                    for chunk in resp.iter_content(cls.CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise DownloadError(f"图片超过 {max_bytes // 1024 // 1024}MB: {person.name}", retryable=False)
+                        tmp.write(chunk)
+                except DownloadError:
+                    raise
+                except Exception as e:
+                    raise DownloadError(f"图片下载中断: {e}")
+                tmp.seek(0)
+                try:
+                    # 摆正、去元数据、限制分辨率并统一为 JPEG
+                    data = normalize_image(tmp)
+                except Exception as e:
+                    raise DownloadError(f"图片无法解析 [{person.name}]: {e}", retryable=False)
+
+            etag = resp.headers.get('ETag', '')
+            last_modified = resp.headers.get('Last-Modified', '')
+
+        person.source_etag = etag[:255]
+        person.source_last_modified = last_modified[:64]
+        person.source_validated_url = person.source_image_url
+        # 内容未变化时 post_save 不会再触发百度同步
+        person.face_hash = content_hash(data)
+        # 直接保存，不再需要 Auditlog 的 context wrapper
+        person.face_image.save(f"{person.id_card}.jpg", ContentFile(data), save=True)
+        make_thumbnails(person.face_image.storage, person.face_image.name, data)
+
+        # 记录到业务日志
+        log_business(
+            user="System", 
+            ip="127.0.0.1", 
+            action="自动下载", 
+            obj=person.name, 
+            detail=f"图片下载成功"
+        )
+        return "下载成功"
+
+    @classmethod
+    def trigger_download(cls, person_id, url):
         if person_id and url:
-            transaction.on_commit(
-                lambda: image_download_executor.submit(
-                    ImageDownloadService._download_worker, person_id, url
-                )
-            )
\ No newline at end of file
+            cls.trigger_download_many([(person_id, url)])
+
+    @classmethod
+    def trigger_download_many(cls, jobs):
+        """批量提交下载任务 [(person_id, url), ...]，事务提交后一次性入队"""
+        ids = [str(pk) for pk, url in jobs if pk and url]
+        if not ids:
+            return
+
+        def enqueue_all():
+            try:
+                cls.queue.enqueue_many(ids)
+            except Exception as e:
+                log_system_error(f"下载任务入队失败: {e}")
+
+        transaction.on_commit(enqueue_all)
+
+    @classmethod
+    def wait_for_capacity(cls, timeout=600):
+        """背压：下载队列积压过多时阻塞，供批量导入在每块写入前调用"""
+        cls.queue.wait_for_capacity(timeout=timeout)
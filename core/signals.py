@@ -1,11 +1,19 @@
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
 # 1. 修改导入：从 django 原生信号导入 user_login_failed，不再引用 axes
 from django.contrib.auth.signals import user_logged_in, user_login_failed
 from .utils import get_client_ip
-from .log_utils import log_business
-from .models import Person
-from .services import BaiduService
+from .log_utils import log_business, log_system_error
+from .models import Person, User, DeviceKey
+from . import devices
+from .tasks import enqueue_face_sync
+from .face_index import local_index_enabled, get_index
+from .cache import SearchResultCache, PersonProfileCache
+from .timing import db_execute_wrapper
+from .imaging import normalize_image, make_thumbnails, content_hash, file_hash
 
 # ==================== 监听登录事件 ====================
 @receiver(user_logged_in)
@@ -35,12 +43,98 @@ def log_login_failed(sender, credentials, request, **kwargs):
     )
 
 
+# ==================== 请求计时：数据库耗时 ====================
+@receiver(connection_created)
+def install_db_timing(sender, connection, **kwargs):
+    # 每个新建的数据库连接都挂上计时包装 (不在请求内时直接跳过)
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+# ==================== 业务逻辑：照片标准化 ====================
+@receiver(pre_save, sender=Person)
+def normalize_face_image(sender, instance, **kwargs):
+    """后台上传的新照片：保存前标准化并生成缩略图 (下载的照片在 ImageDownloadService 中处理)"""
+    face_image = instance.face_image
+    if not face_image or face_image._committed:
+        return
+    try:
+        face_image.open('rb')
+        data = normalize_image(face_image.read())
+    except Exception as e:
+        # 无法解析的图片保持原样，交由后续流程报错 (哈希在 mark_face_sync_pending 中按原文件计算)
+        log_system_error(f"照片标准化失败 [{instance.id_card}]: {e}")
+        instance.face_hash = ''
+        return
+    instance.face_hash = content_hash(data)
+    face_image.save(f"{instance.id_card}.jpg", ContentFile(data), save=False)
+    try:
+        make_thumbnails(face_image.storage, face_image.name, data)
+    except Exception as e:
+        log_system_error(f"缩略图生成失败 [{instance.id_card}]: {e}")
+
+
 # ==================== 业务逻辑：同步人脸到百度 ====================
+@receiver(pre_save, sender=Person)
+def mark_face_sync_pending(sender, instance, **kwargs):
+    if instance.face_image and not instance.face_hash:
+        # 早期数据没有照片哈希，补算一次
+        try:
+            instance.face_hash = file_hash(instance.face_image)
+        except Exception as e:
+            log_system_error(f"照片哈希计算失败 [{instance.id_card}]: {e}")
+    # 只改了班级/用户类型等字段时保持原同步状态
+    if instance.needs_face_sync:
+        instance.sync_status = Person.SYNC_PENDING
+
+
 @receiver(post_save, sender=Person)
 def sync_face_on_save(sender, instance, created, **kwargs):
-    if instance.face_image and hasattr(instance.face_image, 'path'):
+    if instance.needs_face_sync:
+        # 仅入队，由 run_face_worker 进程异步调用百度接口；事务提交后再入队，避免 worker 读到旧数据
+        id_card = instance.id_card
+        transaction.on_commit(lambda: enqueue_face_sync([id_card]))
+
+
+@receiver(post_delete, sender=Person)
+def remove_face_index_on_delete(sender, instance, **kwargs):
+    if local_index_enabled():
         try:
-            # 仅触发同步，日志在 Service 内部记录
-            BaiduService.sync_face(instance)
-        except Exception:
-            pass
\ No newline at end of file
+            get_index().remove(instance.id_card)
+        except Exception as e:
+            log_system_error(f"本地人脸索引删除失败 [{instance.id_card}]: {e}")
+
+
+@receiver(post_save, sender=Person)
+@receiver(post_delete, sender=Person)
+def invalidate_search_cache(sender, instance, **kwargs):
+    # 人员信息变化后，缓存中的识别结果(姓名/照片等)已过期
+    SearchResultCache.invalidate_person(instance.id_card)
+
+
+@receiver(post_save, sender=Person)
+def refresh_profile_cache(sender, instance, **kwargs):
+    # 事务提交后写入最新资料，避免缓存未提交的数据
+    transaction.on_commit(lambda: PersonProfileCache.refresh(instance))
+
+
+@receiver(post_delete, sender=Person)
+def delete_profile_cache(sender, instance, **kwargs):
+    id_card = instance.id_card
+    transaction.on_commit(lambda: PersonProfileCache.delete(id_card))
+
+
+# ==================== 设备密钥缓存 ====================
+@receiver(post_save, sender=DeviceKey)
+@receiver(post_delete, sender=DeviceKey)
+def invalidate_device_key(sender, instance, **kwargs):
+    devices.invalidate(instance.key_hash)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_device_keys(sender, instance, created, **kwargs):
+    # 用户停用/修改后，缓存中的设备密钥(含用户信息)立即失效
+    if created:
+        return
+    for key_hash in DeviceKey.objects.filter(user=instance).values_list('key_hash', flat=True):
+        devices.invalidate(key_hash)
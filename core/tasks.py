@@ -0,0 +1,85 @@
+import datetime
+import time
+from django.conf import settings
+
+from .models import Person
+from .queue import RedisJobQueue
+from .services import BaiduService
+from .log_utils import log_system_error
+from .face_index import local_index_enabled, index_person
+from .imaging import file_hash
+from . import metrics
+
+# =========================================================
+# 后台任务：人脸同步
+# =========================================================
+# post_save 只负责入队，由 `manage.py run_face_worker` 进程调用百度接口
+
+face_sync_queue = RedisJobQueue(
+    'face_sync',
+    max_attempts=getattr(settings, 'FACE_SYNC_MAX_ATTEMPTS', 5),
+    backoff=getattr(settings, 'FACE_SYNC_RETRY_BACKOFF', 10),
+)
+
+
+def enqueue_face_sync(id_cards):
+    """批量入队 (按身份证号去重)"""
+    try:
+        return face_sync_queue.enqueue_many(list(id_cards))
+    except Exception as e:
+        log_system_error(f"人脸同步入队失败: {e}")
+        return 0
+
+
+def ensure_face_hash(person):
+    """早期数据没有照片哈希时按文件补算并写回"""
+    if person.face_image and not person.face_hash:
+        person.face_hash = file_hash(person.face_image)
+        Person.objects.filter(pk=person.pk).update(face_hash=person.face_hash)
+    return person.face_hash
+
+
+def run_face_sync(person):
+    """执行一次同步并记录同步状态；成功时记下本次上传的照片哈希和姓名"""
+    started = time.perf_counter()
+    try:
+        ensure_face_hash(person)
+        ok, msg = BaiduService.sync_face(person)
+    except Exception as e:
+        ok, msg = False, str(e)
+    result = 'success' if ok else 'failed'
+    metrics.observe('face_sync_seconds', time.perf_counter() - started, result=result)
+    metrics.incr('face_sync', result=result)
+    now = datetime.datetime.now()
+    fields = {
+        'sync_status': Person.SYNC_SUCCESS if ok else Person.SYNC_FAILED,
+        'sync_message': str(msg)[:255],
+        'sync_time': now,
+    }
+    if ok:
+        fields.update(synced_hash=person.face_hash, synced_user_info=person.name, synced_at=now)
+    Person.objects.filter(pk=person.pk).update(**fields)
+    return ok, msg
+
+
+def handle_face_sync(id_card):
+    """队列处理函数：返回 (是否成功, 信息)"""
+    person = Person.objects.filter(id_card=id_card).first()
+    if not person or not person.face_image:
+        # 人员已删除或尚无照片，无需重试
+        return True, "人员不存在或无照片，跳过"
+    try:
+        ensure_face_hash(person)
+    except Exception as e:
+        return False, f"照片读取失败: {e}"
+    if not person.needs_face_sync:
+        # 入队后已有一次同步覆盖了当前照片和姓名 (如连续保存)
+        Person.objects.filter(pk=person.pk, sync_status=Person.SYNC_PENDING).update(sync_status=Person.SYNC_SUCCESS)
+        metrics.incr('face_sync', result='skipped')
+        return True, "照片与姓名未变化，跳过"
+    if local_index_enabled():
+        try:
+            index_person(person)
+        except Exception as e:
+            log_system_error(f"本地人脸索引更新失败 [{person.name}]: {e}")
+    return run_face_sync(person)
@@ -0,0 +1,169 @@
+import base64
+import json
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from .models import User, Person, DeviceKey
+from .circuit import CircuitBreaker
+from .ratelimit import RateLimitTimeout
+from .services import BaiduService, FaceSearchService
+
+
+class PersonAdminSmokeTest(TestCase):
+    """后台人员档案列表页可正常渲染 (自定义模板与 import-export 模板不能互相继承成环)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        Person.objects.create(name='张三', id_card='110101200001010011', class_name='一班', user_type='学生')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_changelist_renders(self):
+        response = self.client.get(reverse('admin:core_person_changelist'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reverse('admin:core_person_stream_import'))
+        self.assertContains(response, reverse('admin:core_person_stream_export'))
+        self.assertContains(response, reverse('admin:core_person_queue_status'))
+        # import-export 原有的导入/导出按钮仍然保留
+        self.assertContains(response, reverse('admin:core_person_import'))
+        self.assertContains(response, reverse('admin:core_person_export'))
+        self.assertContains(response, '张三')
+
+    def test_queue_status_requires_permissions(self):
+        from django.contrib.auth.models import Permission
+        url = reverse('admin:core_person_queue_status')
+        staff = User.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        staff.user_permissions.add(Permission.objects.get(codename='view_person'))
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url, {'queue': 'face_sync'}).status_code, 403)
+
+    def test_stream_export_follows_changelist_filters(self):
+        Person.objects.create(name='李四', id_card='110101200001010022', class_name='二班', user_type='学生')
+        response = self.client.get(reverse('admin:core_person_stream_export'), {'format': 'csv', 'class_name': '二班'})
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('李四', content)
+        self.assertNotIn('张三', content)
+
+
+@override_settings(FACE_SEARCH_MAX_BYTES=2 * 1024 * 1024)
+class FaceSearchUploadLimitTest(TestCase):
+    """识别接口按自身上限读取请求体，全局 DATA_UPLOAD_MAX_MEMORY_SIZE 保持默认"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        patcher = mock.patch('core.views.FaceSearchService.search', return_value={'error_code': 222207, 'error_msg': 'match user is not found'})
+        self.search = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_json_base64_under_limit_is_accepted(self):
+        # 1.95MB 图片的 base64 超过默认 2.5MB 全局上限，但在接口上限内
+        image = b'\xff' * int(1.95 * 1024 * 1024)
+        body = json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(image).decode()})
+        response = self.client.post(reverse('api_search_face'), body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.search.call_args.args[0], image)
+
+    def test_raw_body_over_limit_is_rejected(self):
+        response = self.client.post(reverse('api_search_face'), b'\xff' * int(2.6 * 1024 * 1024), content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 413)
+        self.search.assert_not_called()
+
+    def test_batch_rejects_non_string_images(self):
+        for images in ([123, {'a': 1}], 'not-a-list'):
+            response = self.client.post(reverse('api_search_batch'), json.dumps({'images': images}), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(FACE_SEARCH_BACKEND='local', FACE_LOCAL_MIN_SCORE=80)
+class LocalSearchThresholdTest(TestCase):
+    """local 后端同样按 FACE_LOCAL_MIN_SCORE 过滤，未达标视为未匹配"""
+
+    def _search(self, scores):
+        res = {'error_code': 0, 'error_msg': 'SUCCESS', 'source': 'local',
+               'result': {'user_list': [{'user_id': str(i), 'score': s} for i, s in enumerate(scores)]}}
+        with mock.patch('core.face_index.search_local', return_value=res):
+            return FaceSearchService.search(b'img')
+
+    def test_below_threshold_is_not_found(self):
+        res = self._search([62.5, 40])
+        self.assertEqual(res['error_code'], 222207)
+
+    def test_keeps_only_candidates_above_threshold(self):
+        res = self._search([91, 85, 30])
+        self.assertEqual([u['score'] for u in res['result']['user_list']], [91, 85])
+
+    @override_settings(FACE_INDEX_EMBEDDER='')
+    def test_missing_embedder_is_improperly_configured(self):
+        from .face_index import check_embedder_configured
+        with self.assertRaises(ImproperlyConfigured):
+            check_embedder_configured()
+
+
+class DeviceKeyAdminTest(TestCase):
+    """设备密钥明文只在创建/重置后的响应中显示一次，不进入 messages"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _assert_key_shown_once(self, response, device):
+        self.assertEqual(response.status_code, 200)
+        key = response.context['device_keys'][0][1]
+        self.assertEqual(DeviceKey.hash_key(key), device.key_hash)
+        self.assertContains(response, key)
+        self.assertIn('no-store', response['Cache-Control'])
+        self.assertEqual(list(response.context['messages']), [])
+        self.assertNotContains(self.client.get(reverse('admin:core_devicekey_changelist')), key)
+
+    def test_add_shows_key(self):
+        response = self.client.post(reverse('admin:core_devicekey_add'), {'name': '东门闸机', 'user': self.admin.pk, 'is_active': 'on'})
+        self._assert_key_shown_once(response, DeviceKey.objects.get(name='东门闸机'))
+
+    def test_regenerate_shows_key(self):
+        device = DeviceKey(name='西门闸机', user=self.admin)
+        device.generate_key()
+        device.save()
+        response = self.client.post(reverse('admin:core_devicekey_changelist'), {
+            'action': 'regenerate_keys', '_selected_action': [device.pk],
+        })
+        device.refresh_from_db()
+        self._assert_key_shown_once(response, device)
+
+
+class CircuitProbeTest(TestCase):
+    """半开状态下探测请求若在限流排队中超时，探测名额须归还"""
+
+    def setUp(self):
+        self.breaker = CircuitBreaker('test_probe', failure_threshold=1, cooldown=30)
+        self.breaker.redis.delete(self.breaker.state_key, self.breaker.failures_key, self.breaker.probe_key)
+        self.breaker.record_failure('boom')
+        # 冷却结束
+        self.breaker.redis.hset(self.breaker.state_key, 'until', 0)
+        patcher = mock.patch('core.services.baidu_breaker', self.breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_limit_timeout_releases_probe(self):
+        with mock.patch.object(BaiduService, 'get_token', return_value='token'), \
+                mock.patch('core.services.baidu_limiter.acquire', side_effect=RateLimitTimeout('排队超时')):
+            res = BaiduService.search_face('aW1n')
+        self.assertTrue(res.get('busy'))
+        self.assertFalse(self.breaker.redis.exists(self.breaker.probe_key))
+        # 下一个请求仍可作为探测请求放行
+        self.assertTrue(self.breaker.allow())
@@ -0,0 +1,79 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import redis
+
+# =========================================================
+# 请求内分阶段计时 (由 RequestTimingMiddleware 创建，供 Server-Timing / 慢请求日志使用)
+# =========================================================
+# 各阶段自行累加耗时:
+#   db     所有数据库查询 (connection_created 时安装 execute_wrapper)
+#   http   对外 HTTP 请求 (core.http_client)
+#   cache  Redis 读写 (django-redis 连接池，含会话、缓存、指标、队列)
+#   其他   视图中通过 timed('decode') 等自行标记
+# 不在请求内 (worker/命令) 时 contextvar 为空，计时代码直接跳过。
+
+timings_var = ContextVar('request_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+
+    def add(self, phase, seconds, count=1):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + count
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+@contextmanager
+def timed(phase):
+    timings = timings_var.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    timings = timings_var.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add('db', time.perf_counter() - started)
+
+
+# ---------------- Redis 连接计时 ----------------
+def _instrument_connection(connection):
+    """在连接实例上包装收发方法 (不生成子类，connection_class 为工厂函数时同样适用，如 fakeredis)"""
+    send_packed_command, read_response = connection.send_packed_command, connection.read_response
+
+    def timed_send_packed_command(*args, **kwargs):
+        with timed('cache'):
+            return send_packed_command(*args, **kwargs)
+
+    def timed_read_response(*args, **kwargs):
+        with timed('cache'):
+            return read_response(*args, **kwargs)
+
+    connection.send_packed_command = timed_send_packed_command
+    connection.read_response = timed_read_response
+    return connection
+
+
+class TimedConnectionPool(redis.ConnectionPool):
+    """CACHES OPTIONS CONNECTION_POOL_CLASS 使用，统计请求内 Redis 耗时"""
+    def make_connection(self):
+        return _instrument_connection(super().make_connection())
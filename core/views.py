@@ -1,12 +1,27 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import admin
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
 import json
+import base64
+import binascii
+import functools
+import hmac
+import time
+from asgiref.sync import iscoroutinefunction, sync_to_async
 
-from .services import BaiduService
-from .models import Person, FaceScan
+from .services import FaceSearchService, ImageDownloadService
+from .tasks import face_sync_queue
+from .circuit import baidu_breaker
+from . import metrics
+from .cache import SearchResultCache, PersonProfileCache
+from .models import FaceScan, ScanEvent
+from .scans import record_scans
+from .devices import authenticate_device, DeviceAuthError
+from .timing import timed
 from .utils import get_client_ip
 from .log_utils import log_business, log_system_error
 
@@ -20,62 +35,450 @@ def face_search_view(request):
         'user': request.user,
         'opts': FaceScan._meta,
         'app_label': 'core',
+        'upload_max_dimension': settings.FACE_UPLOAD_MAX_DIMENSION,
+        'upload_quality': settings.FACE_UPLOAD_QUALITY,
+        'upload_max_bytes': settings.FACE_SEARCH_MAX_BYTES,
+        'kiosk': {
+            'max_rps': settings.FACE_KIOSK_MAX_RPS,
+            'change_ratio': settings.FACE_KIOSK_CHANGE_RATIO,
+            'pixel_delta': settings.FACE_KIOSK_PIXEL_DELTA,
+            'timeout_ms': settings.FACE_KIOSK_TIMEOUT_MS,
+            'result_hold_ms': settings.FACE_KIOSK_RESULT_HOLD_MS,
+        },
+        'kiosk_autostart': request.GET.get('kiosk') == '1',
     }
     return render(request, 'admin/face_search.html', context)
 
+def _search_result(response):
+    # 各返回分支通过 response.search_result 标记结果，其余按状态码归类
+    result = getattr(response, 'search_result', None)
+    if result:
+        return result
+    return 'error' if response.status_code >= 500 else 'rejected'
+
+def instrument_search(view_name):
+    """记录识别接口端到端耗时和结果 (match / no_match / cached / busy / rejected / error)"""
+    def decorator(view):
+        def record(started, response):
+            elapsed = time.perf_counter() - started
+            result = _search_result(response)
+            metrics.observe('search_request_seconds', elapsed, view=view_name, result=result)
+            metrics.incr('search_requests', view=view_name, result=result)
+            record_scans(getattr(response, 'scan_events', None), elapsed)
+
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                started = time.perf_counter()
+                response = await view(request, *args, **kwargs)
+                # 指标和识别记录写 Redis，放到线程池避免一次慢往返阻塞事件循环上的其他请求
+                await sync_to_async(record, thread_sensitive=False)(started, response)
+                return response
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                started = time.perf_counter()
+                response = view(request, *args, **kwargs)
+                record(started, response)
+                return response
+        return wrapper
+    return decorator
+
+def _scan_event(user, client_ip, outcome, id_card='', score=None, cached=False):
+    """识别记录 (由 instrument_search 补充耗时后写入缓冲区)"""
+    return {
+        'operator': getattr(user, 'username', '') or str(user or ''),
+        'ip': client_ip,
+        'id_card': id_card or '',
+        'score': score,
+        'outcome': outcome,
+        'cached': cached,
+    }
+
+def _too_large(max_bytes, what='图片'):
+    return JsonResponse({'status': 'error', 'msg': f'{what}不能超过 {max_bytes // 1024} KB'}, status=413)
+
+def _body_limit(max_bytes):
+    # 兼容 base64 的约 4/3 膨胀，另留少量 JSON/multipart 包装余量
+    return max_bytes * 4 // 3 + 1024
+
+def _read_body(request, max_bytes):
+    """
+    按接口自身上限读取请求体
+    request.body 受全局 DATA_UPLOAD_MAX_MEMORY_SIZE 约束 (默认 2.5MB)，识别接口的 base64 请求体会超出；
+    全局上限保持默认，这里直接读取请求流，最多读到本接口上限，超出时抛 RequestDataTooBig
+    """
+    limit = _body_limit(max_bytes)
+    body = request.read(limit + 1)
+    if len(body) > limit:
+        raise RequestDataTooBig('请求体超过接口上限')
+    return body
+
+@timed('decode')
+def _read_image(request):
+    """
+    按 Content-Type 读取图片，返回 (图片字节, 原始base64或None, 错误响应)
+      multipart/form-data       字段 image 为图片文件 (推荐)
+      application/octet-stream  请求体即图片字节 (也接受 image/*)
+      application/json          {"image": "data:image/jpeg;base64,..."} (兼容旧客户端)
+    """
+    content_type = request.content_type or ''
+    if content_type == 'multipart/form-data':
+        upload = request.FILES.get('image')
+        if upload is None:
+            return None, None, JsonResponse({'status': 'error', 'msg': '缺少图片文件'}, status=400)
+        if upload.size > settings.FACE_SEARCH_MAX_BYTES:
+            return None, None, _too_large(settings.FACE_SEARCH_MAX_BYTES)
+        return upload.read(), None, None
+
+    body = _read_body(request, settings.FACE_SEARCH_MAX_BYTES)
+    if content_type == 'application/octet-stream' or content_type.startswith('image/'):
+        return body, None, None
+
+    data = json.loads(body)
+    raw_image = data.get('image', '')
+    if ';base64,' in raw_image:
+        image_base64 = raw_image.split(';base64,')[1]
+    else:
+        image_base64 = raw_image
+    try:
+        return base64.b64decode(image_base64), image_base64, None
+    except (binascii.Error, ValueError):
+        return None, None, JsonResponse({'status': 'error', 'msg': '图片数据格式错误'}, status=400)
+
+def _check_body_size(request):
+    max_bytes = settings.FACE_SEARCH_MAX_BYTES
+    if int(request.META.get('CONTENT_LENGTH') or 0) > _body_limit(max_bytes):
+        return _too_large(max_bytes)
+    return None
+
+def _cached_response(user, client_ip, image_bytes):
+    """摄像头短时间内重复触发：直接返回缓存的匹配结果"""
+    cached = SearchResultCache.get(image_bytes)
+    if not cached:
+        return None
+    log_business(
+        user=user,
+        ip=client_ip,
+        action="人脸识别",
+        obj=cached['name'],
+        detail=f"识别成功(缓存)，身份证：{cached['id_card']}，匹配度: {cached['score']}%"
+    )
+    response = JsonResponse({'status': 'success', 'data': cached})
+    response.search_result = 'cached'
+    response.scan_events = [_scan_event(user, client_ip, ScanEvent.OUTCOME_MATCH, cached['id_card'], cached['score'], cached=True)]
+    return response
+
+def _top_match(res):
+    if res.get('error_code') == 0:
+        user_list = res.get('result', {}).get('user_list', [])
+        if user_list:
+            return user_list[0]
+    return None
+
+def _match_response(user, client_ip, image_bytes, top, person):
+    name = person['name'] if person else "未知"
+    score = round(top['score'], 1)
+
+    # 记录业务日志：人脸识别成功
+    log_business(
+        user=user,
+        ip=client_ip,
+        action="人脸识别",
+        obj=name,
+        detail=f"识别成功，身份证：{top['user_id']}，匹配度: {score}%"
+    )
+
+    result = {
+        'name': name,
+        'class_name': person['class_name'] if person else '',
+        'user_type': person['user_type'] if person else '',
+        'id_card': top['user_id'],
+        'score': score,
+        'photo_url': person['photo_url'] if person else ''
+    }
+    if person:
+        SearchResultCache.set(image_bytes, result)
+    response = JsonResponse({'status': 'success', 'data': result})
+    response.search_result = 'match'
+    response.scan_events = [_scan_event(user, client_ip, ScanEvent.OUTCOME_MATCH, top['user_id'], score)]
+    return response
+
+def _busy_response(user, client_ip, res):
+    # 百度限流/熔断：不是"无匹配"，提示前端稍后重试
+    log_system_error(f"人脸识别服务繁忙: {res.get('error_msg')}")
+    response = JsonResponse({'status': 'busy', 'msg': '识别服务繁忙，请稍后重试'}, status=503)
+    response['Retry-After'] = '1'
+    response.search_result = 'busy'
+    response.scan_events = [_scan_event(user, client_ip, ScanEvent.OUTCOME_BUSY)]
+    return response
+
+def _no_match_response(user, client_ip, res):
+    # 记录业务日志：识别失败（但属于正常业务流程）
+    log_business(
+        user=user,
+        ip=client_ip,
+        action="人脸识别",
+        obj="未知人员",
+        detail=f"识别无匹配: {res.get('error_msg')}"
+    )
+    response = JsonResponse({'status': 'fail', 'msg': '未找到匹配人员'})
+    response.search_result = 'no_match'
+    response.scan_events = [_scan_event(user, client_ip, ScanEvent.OUTCOME_NO_MATCH)]
+    return response
+
+def device_key_required(view):
+    """
+    设备接口认证：校验设备密钥，通过后 request.user 为密钥绑定的用户 (业务日志/识别记录按该用户归属)
+    该路径不经过会话和登录中间件，失败返回 401，同一 IP 失败过多返回 429
+    """
+    def reject(e):
+        return JsonResponse({'status': 'error', 'msg': str(e)}, status=e.status)
+
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                device = await sync_to_async(authenticate_device)(request)
+            except DeviceAuthError as e:
+                return reject(e)
+            request.user, request.device = device.user, device
+            return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                device = authenticate_device(request)
+            except DeviceAuthError as e:
+                return reject(e)
+            request.user, request.device = device.user, device
+            return view(request, *args, **kwargs)
+    return wrapper
+
 @csrf_exempt
+@instrument_search('single')
 @staff_member_required(login_url='/admin/login/')
 def api_search_face(request):
+    return _search_face(request, request.user)
+
+@csrf_exempt
+@instrument_search('device')
+@device_key_required
+def api_device_search(request):
+    """闸机/自助终端识别接口：设备密钥认证，不读写会话"""
+    return _search_face(request, request.user)
+
+def _search_face(request, user):
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'msg': '仅支持POST'}, status=405)
+    error = _check_body_size(request)
+    if error:
+        return error
     
     try:
-        data = json.loads(request.body)
-        raw_image = data.get('image', '')
-        if ';base64,' in raw_image:
-            image_base64 = raw_image.split(';base64,')[1]
-        else:
-            image_base64 = raw_image
-        
-        res = BaiduService.search_face(image_base64)
+        image_bytes, image_base64, error = _read_image(request)
+        if error:
+            return error
+        if len(image_bytes) > settings.FACE_SEARCH_MAX_BYTES:
+            return _too_large(settings.FACE_SEARCH_MAX_BYTES)
+
         client_ip = get_client_ip(request)
+        cached = _cached_response(user, client_ip, image_bytes)
+        if cached:
+            return cached
+
+        res = FaceSearchService.search(image_bytes, image_base64)
+        top = _top_match(res)
+        if top:
+            person = PersonProfileCache.get(top['user_id'])
+            return _match_response(user, client_ip, image_bytes, top, person)
+        if res.get('busy'):
+            return _busy_response(user, client_ip, res)
+        return _no_match_response(user, client_ip, res)
         
-        if res.get('error_code') == 0:
-            user_list = res.get('result', {}).get('user_list', [])
-            if user_list:
-                top = user_list[0]
-                person = Person.objects.filter(id_card=top['user_id']).first()
-                name = person.name if person else "未知"
-                score = round(top['score'], 1)
-                
-                # 记录业务日志：人脸识别成功
-                log_business(
-                    user=request.user,
-                    ip=client_ip,
-                    action="人脸识别",
-                    obj=name,
-                    detail=f"识别成功，身份证：{top['user_id']}，匹配度: {score}%"
-                )
-                
-                return JsonResponse({'status': 'success', 'data': {
-                    'name': name,
-                    'class_name': person.class_name if person else '',
-                    'user_type': person.user_type if person else '',
-                    'id_card': top['user_id'],
-                    'score': score,
-                    'photo_url': person.face_image.url if person and person.face_image else ''
-                }})
-        
-        # 记录业务日志：识别失败（但属于正常业务流程）
+    except RequestDataTooBig:
+        # 未带 Content-Length (分块上传) 的超大请求体在读取时才能发现
+        return _too_large(settings.FACE_SEARCH_MAX_BYTES)
+    except Exception as e:
+        log_system_error(f"API Exception: {e}")
+        return JsonResponse({'status': 'error', 'msg': '系统内部错误'}, status=500)
+
+@csrf_exempt
+@instrument_search('single_async')
+@staff_member_required(login_url='/admin/login/')
+async def api_search_face_async(request):
+    """
+    异步版本 (需 ASGI 部署)：等待百度响应期间不占用 worker，
+    单个进程即可同时处理大量识别请求
+    """
+    return await _asearch_face(request, await request.auser())
+
+@csrf_exempt
+@instrument_search('device_async')
+@device_key_required
+async def api_device_search_async(request):
+    """设备接口的异步版本"""
+    return await _asearch_face(request, request.user)
+
+async def _asearch_face(request, user):
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'msg': '仅支持POST'}, status=405)
+    error = _check_body_size(request)
+    if error:
+        return error
+
+    try:
+        image_bytes, image_base64, error = _read_image(request)
+        if error:
+            return error
+        if len(image_bytes) > settings.FACE_SEARCH_MAX_BYTES:
+            return _too_large(settings.FACE_SEARCH_MAX_BYTES)
+
+        client_ip = get_client_ip(request)
+        # 结果缓存、业务日志均为同步 Redis/文件 I/O，在线程池中执行
+        cached = await sync_to_async(_cached_response, thread_sensitive=False)(user, client_ip, image_bytes)
+        if cached:
+            return cached
+
+        res = await FaceSearchService.asearch(image_bytes, image_base64)
+        top = _top_match(res)
+        if top:
+            person = await PersonProfileCache.aget(top['user_id'])
+            return await sync_to_async(_match_response, thread_sensitive=False)(user, client_ip, image_bytes, top, person)
+        if res.get('busy'):
+            return await sync_to_async(_busy_response, thread_sensitive=False)(user, client_ip, res)
+        return await sync_to_async(_no_match_response, thread_sensitive=False)(user, client_ip, res)
+
+    except RequestDataTooBig:
+        return _too_large(settings.FACE_SEARCH_MAX_BYTES)
+    except Exception as e:
+        log_system_error(f"API Exception: {e}")
+        return JsonResponse({'status': 'error', 'msg': '系统内部错误'}, status=500)
+
+@timed('decode')
+def _read_images(request):
+    """批量识别读取多张图片：multipart 字段 images (可多个)，或 JSON {"images": [base64, ...]}"""
+    if request.content_type == 'multipart/form-data':
+        return [f.read() for f in request.FILES.getlist('images') or request.FILES.getlist('image')]
+    data = json.loads(_read_body(request, settings.FACE_BATCH_MAX_BYTES))
+    images = data.get('images') or ([data['image']] if data.get('image') else [])
+    if not isinstance(images, list) or not all(isinstance(i, str) for i in images):
+        raise ValueError('images 须为 base64 字符串数组')
+    return [base64.b64decode(i.split(';base64,')[-1]) for i in images]
+
+@csrf_exempt
+@instrument_search('batch')
+@staff_member_required(login_url='/admin/login/')
+def api_search_batch(request):
+    """
+    批量识别 (合影点名/多张图片)
+    一张合影：返回图中每张人脸的识别结果和人脸框；多张图片：每张图片返回一个结果
+    """
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'msg': '仅支持POST'}, status=405)
+
+    max_bytes = settings.FACE_SEARCH_MAX_BYTES
+    max_images = settings.FACE_BATCH_MAX_IMAGES
+    max_total = settings.FACE_BATCH_MAX_BYTES
+    if int(request.META.get('CONTENT_LENGTH') or 0) > _body_limit(max_total):
+        return _too_large(max_total, '图片总大小')
+    try:
+        try:
+            images = _read_images(request)
+        except (binascii.Error, ValueError):
+            return JsonResponse({'status': 'error', 'msg': '图片数据格式错误'}, status=400)
+        if not images:
+            return JsonResponse({'status': 'error', 'msg': '缺少图片'}, status=400)
+        if len(images) > max_images:
+            return JsonResponse({'status': 'error', 'msg': f'一次最多识别 {max_images} 张图片'}, status=400)
+        if any(len(i) > max_bytes for i in images):
+            return _too_large(max_bytes)
+        if sum(len(i) for i in images) > max_total:
+            return _too_large(max_total, '图片总大小')
+
+        faces = FaceSearchService.batch_search(images)
+
+        # 一次性批量解析所有匹配到的身份证号
+        profiles = PersonProfileCache.get_many([f['user_id'] for f in faces if f['user_id']])
+        client_ip = get_client_ip(request)
+        matched, scan_events = [], []
+        for face in faces:
+            scan_events.append(_scan_event(
+                request.user, client_ip,
+                ScanEvent.OUTCOME_MATCH if face['user_id'] else ScanEvent.OUTCOME_NO_MATCH,
+                face['user_id'], face['score'],
+            ))
+            person = profiles.get(face['user_id']) if face['user_id'] else None
+            face.update({
+                'id_card': face.pop('user_id'),
+                'matched': bool(person),
+                'name': person['name'] if person else '',
+                'class_name': person['class_name'] if person else '',
+                'user_type': person['user_type'] if person else '',
+                'photo_url': person['photo_url'] if person else '',
+            })
+            if person:
+                matched.append(person['name'])
+
         log_business(
             user=request.user,
             ip=client_ip,
-            action="人脸识别",
-            obj="未知人员",
-            detail=f"识别无匹配: {res.get('error_msg')}"
+            action="批量识别",
+            obj=f"{len(images)}张图片",
+            detail=f"检测人脸{len(faces)}张，匹配{len(matched)}人: {'、'.join(matched)}"
         )
-        return JsonResponse({'status': 'fail', 'msg': '未找到匹配人员'})
-        
+        response = JsonResponse({'status': 'success', 'data': {
+            'face_num': len(faces),
+            'matched_num': len(matched),
+            'faces': faces,
+        }})
+        response.search_result = 'match' if matched else 'no_match'
+        response.scan_events = scan_events
+        return response
+
+    except RequestDataTooBig:
+        return _too_large(max_total, '图片总大小')
     except Exception as e:
         log_system_error(f"API Exception: {e}")
-        return JsonResponse({'status': 'error', 'msg': '系统内部错误'}, status=500)
\ No newline at end of file
+        return JsonResponse({'status': 'error', 'msg': '系统内部错误'}, status=500)
+
+@staff_member_required(login_url='/admin/login/')
+def api_search_stats(request):
+    """搜索结果缓存命中统计"""
+    return JsonResponse({'status': 'success', 'data': SearchResultCache.stats()})
+
+
+def _metrics_authorized(request):
+    """Bearer Token (FACE_METRICS_TOKEN) 或已登录的后台管理员"""
+    token = getattr(settings, 'FACE_METRICS_TOKEN', '')
+    auth = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and auth.startswith('Bearer ') and hmac.compare_digest(auth[7:].strip(), token):
+        return True
+    return request.user.is_authenticated and request.user.is_staff
+
+def _collect_gauges():
+    """抓取时现场读取的瞬时值"""
+    gauges = []
+    for name, queue in (('face_sync', face_sync_queue), ('image_download', ImageDownloadService.queue)):
+        for state, value in queue.stats().items():
+            gauges.append(('queue_jobs', {'queue': name, 'state': state}, value))
+    state, _ = baidu_breaker.state()
+    for candidate in (baidu_breaker.CLOSED, baidu_breaker.OPEN, baidu_breaker.HALF_OPEN):
+        gauges.append(('circuit_state', {'circuit': 'baidu', 'state': candidate}, int(candidate == state)))
+    counters = metrics.get_counters()
+    for cache_name in ('search_cache', 'profile_cache'):
+        hits, misses = counters.get(f'{cache_name}_hit', 0), counters.get(f'{cache_name}_miss', 0)
+        ratio = hits / (hits + misses) if hits + misses else 0
+        gauges.append(('cache_hit_ratio', {'cache': cache_name}, round(ratio, 4)))
+    return gauges
+
+def metrics_view(request):
+    """Prometheus 抓取接口 (所有 worker 的指标已在 Redis 中汇总)"""
+    if not _metrics_authorized(request):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    try:
+        body = metrics.render_prometheus(_collect_gauges())
+    except Exception as e:
+        log_system_error(f"指标导出失败: {e}")
+        return HttpResponse('metrics unavailable', status=503, content_type='text/plain')
+    return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')